@@ -1,13 +1,26 @@
+# First, so the startup report's clock starts before the app's imports
+from utils.startup import startup_report, warm_up, warm_up_in_background
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 import os
+import asyncio
 import logging
 from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 # Import routers
-from app.routers import chat, properties, documents
+from app.routers import chat, properties, documents, admin
+from services.render_executor import get_render_executor, shutdown_render_executor
+from services.document_jobs import get_document_job_queue
+from services.openai_service import get_openai_client
+from services.property_service import PropertyService
+from services.workbook_importer import WorkbookImporter
+from utils.deadline import DeadlineMiddleware
+from utils.metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from utils.tracing import TracingMiddleware
 
 # Load environment variables
 load_dotenv()
@@ -29,19 +42,59 @@ async def lifespan(app: FastAPI):
     if not os.getenv("OPENAI_API_KEY"):
         logger.warning("OPENAI_API_KEY not set - AI features will not work")
     
+    # Load what the first requests would otherwise load (the listing store, the OpenAI SDK)
+    # concurrently, before the worker reports ready. Spawning the render workers with their templates
+    # and stylesheets takes longest, so by default it carries on after the worker is ready (a render
+    # arriving first starts a worker itself); RENDER_WARM_UP=wait holds readiness for it, off skips it
+    render_executor = get_render_executor()
+    render_warm_up = os.getenv("RENDER_WARM_UP", "background").lower()
+    steps = {"listings": PropertyService().warm_up}
+    if render_warm_up == "wait":
+        steps["render_pool"] = render_executor.warm_up
+    if os.getenv("OPENAI_API_KEY"):
+        steps["openai_client"] = get_openai_client
+    await warm_up(steps)
+    logger.info(f"Document rendering on {render_executor.max_workers} {render_executor.mode} workers")
+    
+    document_job_queue = get_document_job_queue()
+    await document_job_queue.start()
+    
+    # Load historical deal models in the background so startup isn't held up (app/server.py imports
+    # them once before starting its workers instead)
+    import_task = None
+    workbook_import_dir = os.getenv("WORKBOOK_IMPORT_DIR")
+    if workbook_import_dir and os.getenv("WORKBOOK_IMPORT_ON_STARTUP", "true").lower() == "true":
+        import_task = asyncio.create_task(WorkbookImporter().import_directory(workbook_import_dir))
+    
+    startup_report.mark_ready()
+    
+    background_warm_up = None
+    if render_warm_up == "background":
+        background_warm_up = warm_up_in_background({"render_pool": render_executor.warm_up})
+    
     yield
     
     # Shutdown logic
     logger.info("Shutting down RETS AI Backend...")
+    if background_warm_up is not None:
+        background_warm_up.cancel()
+    if import_task is not None:
+        import_task.cancel()
+    await document_job_queue.stop()
+    shutdown_render_executor()
 
 # Create FastAPI app
 app = FastAPI(
     title="RETS AI Backend",
     description="Real Estate AI Assistant Backend API",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Added first, so it is innermost: CORS headers still go on its 504s, and metrics and tracing see its outcomes
+app.add_middleware(DeadlineMiddleware)
+
 # Configure CORS
 cors_origins = os.getenv("CORS_ORIGINS", '["http://localhost:3000"]')
 if isinstance(cors_origins, str):
@@ -55,11 +108,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 # Include routers
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(properties.router, prefix="/api/properties", tags=["properties"])
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"], include_in_schema=False)
 
 @app.get("/")
 async def root():
@@ -75,9 +131,16 @@ async def health_check():
     """Health check endpoint."""
     return {
         "status": "healthy",
-        "timestamp": "2024-01-01T00:00:00Z"
+        "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics."""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+startup_report.mark_imports_done()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,79 @@
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from fastapi.responses import Response
+from datetime import datetime
+from io import BytesIO
+from typing import Optional
+import asyncio
+import hmac
+import logging
+import os
+import zipfile
+
+from utils.profiler import ProfilerBusy, profile
+from utils.startup import startup_report
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+MAX_PROFILE_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints are disabled unless ADMIN_TOKEN is set, and then require it."""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.post("/profile", dependencies=[Depends(require_admin)])
+async def profile_worker(
+    seconds: float = Query(10, gt=0, description="How long to sample for"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="Sampling interval in milliseconds"),
+    memory: bool = Query(False, description="Also diff tracemalloc snapshots taken at the start and end"),
+    memory_frames: int = Query(10, ge=1, le=50, description="Traceback depth recorded per allocation"),
+):
+    """Profile this worker process for a few seconds while it keeps serving traffic.
+
+    Returns the sampled stacks in collapsed format (flamegraph.pl, speedscope), or,
+    with ``memory``, a ZIP holding the stacks and the allocation diff. One session
+    runs per worker at a time.
+    """
+
+    if seconds > MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Profiles are limited to {MAX_PROFILE_SECONDS:g} seconds")
+
+    try:
+        logger.info(f"Profiling worker {os.getpid()} for {seconds:g}s (memory={memory})")
+        stacks, allocations, samples = await asyncio.to_thread(
+            profile, seconds, interval_ms / 1000, memory, memory_frames
+        )
+
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Profiling error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to profile worker"
+        )
+
+    name = f"profile_{os.getpid()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    headers = {"X-Profile-Samples": str(samples)}
+
+    if allocations is None:
+        headers["Content-Disposition"] = f'attachment; filename="{name}.collapsed"'
+        return Response(content=stacks, media_type="text/plain", headers=headers)
+
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(f"{name}.collapsed", stacks)
+        archive.writestr(f"{name}_allocations.txt", allocations)
+
+    headers["Content-Disposition"] = f'attachment; filename="{name}.zip"'
+    return Response(content=buffer.getvalue(), media_type="application/zip", headers=headers)
+
+@router.get("/startup", dependencies=[Depends(require_admin)])
+async def startup_times():
+    """How long this worker took to import the app, warm up (per step) and become ready, in seconds."""
+    return startup_report.as_dict()
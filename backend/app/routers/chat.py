@@ -1,11 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from typing import List, Dict, Any
 import logging
+import math
 
 from models.chat import ChatRequest, ChatResponse, ChatAction
 from models.property import PropertySearchFilters
 from services.openai_service import OpenAIService
 from services.property_service import PropertyService
+from services.upstream_scheduler import UpstreamRejected
+from utils.metrics import stage
+from utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +22,23 @@ def get_openai_service() -> OpenAIService:
 def get_property_service() -> PropertyService:
     return PropertyService()
 
+def get_client_id(http_request: Request) -> str:
+    """Who a request counts against for fair queueing of OpenAI calls."""
+    return http_request.headers.get("X-User-Id") or (http_request.client.host if http_request.client else "anonymous")
+
+def _rejected(error: UpstreamRejected) -> HTTPException:
+    return HTTPException(
+        status_code=error.status_code,
+        detail=str(error),
+        headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    )
+
 @router.post("/", response_model=Dict[str, Any])
 async def process_chat_message(
     request: ChatRequest,
     openai_service: OpenAIService = Depends(get_openai_service),
-    property_service: PropertyService = Depends(get_property_service)
+    property_service: PropertyService = Depends(get_property_service),
+    client_id: str = Depends(get_client_id)
 ):
     """Process chat message and return appropriate response with actions."""
     
@@ -32,7 +48,8 @@ async def process_chat_message(
         # Process message with OpenAI
         ai_result = await openai_service.process_message(
             request.message, 
-            request.conversation_history
+            request.conversation_history,
+            user=client_id
         )
         
         # Handle different actions
@@ -42,17 +59,18 @@ async def process_chat_message(
         }
         
         if ai_result.action == ChatAction.SEARCH_PROPERTIES:
-            # Extract additional filters from the message
-            additional_filters = openai_service.parse_search_query(request.message)
-            
-            # Combine AI extracted filters with parsed filters
-            combined_filters = {}
-            if ai_result.extracted_filters:
-                combined_filters.update(ai_result.extracted_filters)
-            combined_filters.update(additional_filters)
-            
-            # Create PropertySearchFilters object
-            search_filters = PropertySearchFilters(**combined_filters)
+            with stage("filter_parse"):
+                # Extract additional filters from the message
+                additional_filters = openai_service.parse_search_query(request.message)
+                
+                # Combine AI extracted filters with parsed filters
+                combined_filters = {}
+                if ai_result.extracted_filters:
+                    combined_filters.update(ai_result.extracted_filters)
+                combined_filters.update(additional_filters)
+                
+                # Create PropertySearchFilters object
+                search_filters = PropertySearchFilters(**combined_filters)
             
             # Search for properties
             search_result = await property_service.search_properties(
@@ -60,7 +78,8 @@ async def process_chat_message(
                 search_filters
             )
             
-            response_data["data"] = search_result.dict()
+            with stage("serialization"), span("serialize search result"):
+                response_data["data"] = search_result.model_dump()
             response_data["searchFilters"] = combined_filters
             
         elif ai_result.action == ChatAction.GENERATE_UNDERWRITING:
@@ -73,6 +92,9 @@ async def process_chat_message(
         
         return response_data
         
+    except UpstreamRejected as e:
+        logger.warning(f"Chat request shed: {e}")
+        raise _rejected(e)
     except Exception as e:
         logger.error(f"Chat processing error: {e}")
         raise HTTPException(
@@ -103,6 +125,8 @@ async def test_chat(
                 "confidence": result.confidence
             }
         }
+    except UpstreamRejected as e:
+        raise _rejected(e)
     except Exception as e:
         logger.error(f"Chat test error: {e}")
         raise HTTPException(
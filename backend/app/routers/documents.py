@@ -1,12 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from fastapi.responses import StreamingResponse
-from typing import Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse, FileResponse, Response
+from typing import AsyncIterator, BinaryIO, Dict, Any, List, Optional, Tuple
+from contextlib import aclosing
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import json
 import logging
-from io import BytesIO
+import os
 
-from models.document import DocumentGenerationRequest, DocumentType
-from services.document_service import DocumentService
+from models.document import (
+    DocumentGenerationRequest, DocumentType, DocumentJob, DocumentJobRequest, DocumentJobStatus,
+    RenderedDocument, PortfolioRequest, BulkLOIRequest, BulkLOIFormat
+)
+from models.property import Property
+from services.document_jobs import DocumentJobQueue, get_document_job_queue, TERMINAL_STATUSES
+from services.document_service import DocumentService, MEDIA_TYPES
 from services.property_service import PropertyService
+from utils.file_response import DocumentResponse, RangeNotSatisfiable, parse_range
+from utils.zip_stream import stream_zip
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +30,9 @@ def get_document_service() -> DocumentService:
 def get_property_service() -> PropertyService:
     return PropertyService()
 
+def get_job_queue() -> DocumentJobQueue:
+    return get_document_job_queue()
+
 @router.post("/generate", response_model=Dict[str, Any])
 async def generate_document(
     request: DocumentGenerationRequest,
@@ -66,9 +80,11 @@ async def generate_document(
 
 @router.get("/download")
 async def download_document(
+    request: Request,
     type: str = Query(..., description="Document type (underwriting or loi)"),
     propertyId: str = Query(..., description="Property ID"),
     offerPrice: Optional[float] = Query(None, description="Offer price for LOI"),
+    mode: str = Query("values", description="Underwriting workbook mode (values or formulas)"),
     document_service: DocumentService = Depends(get_document_service),
     property_service: PropertyService = Depends(get_property_service)
 ):
@@ -84,6 +100,12 @@ async def download_document(
                 detail="Invalid document type. Must be 'underwriting' or 'loi'"
             )
         
+        if mode not in ["values", "formulas"]:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid mode. Must be 'values' or 'formulas'"
+            )
+        
         # Get property details
         property = await property_service.get_property_by_id(propertyId)
         if not property:
@@ -92,23 +114,62 @@ async def download_document(
                 detail="Property not found"
             )
         
-        # Generate document
-        if type == "underwriting":
-            document_buffer, filename = await document_service.generate_underwriting_document(property)
-            media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            
-        elif type == "loi":
-            document_buffer, filename = await document_service.generate_loi_document(
-                property, 
-                offerPrice
+        # Render the document, or reuse an identical earlier render
+        render = lambda: document_service.render_document(
+            property,
+            type,
+            offerPrice,
+            live_formulas=(type == "underwriting" and mode == "formulas")
+        )
+        document = await render()
+        
+        # Hot documents stream straight from the cached bytes, others from the cached file. The file is
+        # opened before any status is sent; if another worker's sweep evicted it since, render it again
+        content, file = await document_service.open_document(document)
+        if content is None and file is None:
+            document = await render()
+            content, file = await document_service.open_document(document)
+            if content is None and file is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Document not found"
+                )
+        
+        headers = {
+            "ETag": f'"{document.digest}"',
+            # Metadata read back from the disk tier carries pydantic's own UTC tzinfo, which usegmt rejects
+            "Last-Modified": format_datetime(document.last_modified.astimezone(timezone.utc), usegmt=True),
+            "Cache-Control": "private, no-cache",
+        }
+        
+        if _not_modified(request, document):
+            _close(file)
+            return Response(status_code=304, headers=headers)
+        
+        headers["Content-Disposition"] = f"attachment; filename={document.filename}"
+        
+        # Honour Range only while the client's validator still matches (If-Range)
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if if_range is not None and if_range.strip() != headers["ETag"]:
+            range_header = None
+        
+        try:
+            byte_range = parse_range(range_header, document.size)
+        except RangeNotSatisfiable:
+            _close(file)
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{document.size}"}
             )
-            media_type = "application/pdf"
         
-        # Return file as streaming response
-        return StreamingResponse(
-            BytesIO(document_buffer.getvalue()),
-            media_type=media_type,
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        return DocumentResponse(
+            content=content,
+            file=file,
+            size=document.size,
+            byte_range=byte_range,
+            media_type=document.media_type,
+            headers=headers
         )
         
     except HTTPException:
@@ -120,6 +181,248 @@ async def download_document(
             detail="Failed to download document"
         )
 
+def _close(file: Optional[BinaryIO]):
+    if file is not None:
+        file.close()
+
+def _not_modified(request: Request, document: RenderedDocument) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against a rendered document."""
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in candidates or f'"{document.digest}"' in candidates
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return document.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    
+    return False
+
+@router.post("/portfolio")
+async def download_portfolio_document(
+    request: PortfolioRequest,
+    document_service: DocumentService = Depends(get_document_service),
+    property_service: PropertyService = Depends(get_property_service)
+):
+    """Download one underwriting workbook comparing many properties."""
+    
+    try:
+        if request.property_ids:
+            properties = await property_service.get_properties_by_ids(request.property_ids)
+        elif request.search:
+            search_result = await property_service.search_properties(
+                request.search.query,
+                request.search.filters
+            )
+            properties = search_result.properties
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail="Provide propertyIds or a search"
+            )
+        
+        if not properties:
+            raise HTTPException(
+                status_code=404,
+                detail="No matching properties found"
+            )
+        
+        logger.info(f"Downloading portfolio document for {len(properties)} properties")
+        
+        document_buffer, filename = await document_service.generate_portfolio_document(
+            properties,
+            request.assumptions,
+            request.include_details
+        )
+        
+        return DocumentResponse(
+            content=document_buffer.getbuffer(),
+            size=document_buffer.getbuffer().nbytes,
+            media_type=MEDIA_TYPES["underwriting"],
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Portfolio document error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to generate portfolio document"
+        )
+
+@router.post("/loi/bulk")
+async def download_bulk_loi(
+    request: BulkLOIRequest,
+    document_service: DocumentService = Depends(get_document_service),
+    property_service: PropertyService = Depends(get_property_service)
+):
+    """Download LOIs for many offers at once, as a ZIP or as one merged PDF.
+    
+    The LOIs render in parallel. The ZIP is streamed, with each LOI added as soon as
+    it finishes; the merged PDF is sent once all of them have rendered.
+    """
+    
+    try:
+        property_ids = [offer.property_id for offer in request.offers]
+        properties = {
+            property.id: property
+            for property in await property_service.get_properties_by_ids(list(dict.fromkeys(property_ids)))
+        }
+        
+        missing = [property_id for property_id in property_ids if property_id not in properties]
+        if missing:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Properties not found: {', '.join(missing)}"
+            )
+        
+        offers = [(properties[offer.property_id], offer.offer_price) for offer in request.offers]
+        logger.info(f"Downloading {len(offers)} LOIs as {request.format.value}")
+        
+        if request.format == BulkLOIFormat.PDF:
+            document_buffer, filename = await document_service.generate_merged_loi_document(offers)
+            return DocumentResponse(
+                content=document_buffer.getbuffer(),
+                size=document_buffer.getbuffer().nbytes,
+                media_type=MEDIA_TYPES["loi"],
+                headers={"Content-Disposition": f"attachment; filename={filename}"}
+            )
+        
+        filename = f"LOIs_{len(offers)}_Properties_{datetime.now().strftime('%Y%m%d')}.zip"
+        return StreamingResponse(
+            stream_zip(_loi_zip_entries(document_service, offers)),
+            media_type="application/zip",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk LOI error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to generate LOI documents"
+        )
+
+async def _loi_zip_entries(
+    document_service: DocumentService,
+    offers: List[Tuple[Property, Optional[float]]]
+) -> AsyncIterator[Tuple[str, bytes]]:
+    """ZIP entries for each LOI in the order they finish, then a list of any that failed."""
+    
+    width = len(str(len(offers)))
+    failures = []
+    
+    async with aclosing(document_service.render_loi_batch(offers)) as outcomes:
+        async for index, outcome in outcomes:
+            property, _ = offers[index]
+            if isinstance(outcome, Exception):
+                failures.append(f"{index + 1}. {property.address} ({property.id}): {outcome}")
+            else:
+                document, content = outcome
+                # Number entries by request position so they sort in the order asked for
+                yield f"{index + 1:0{width}d}_{document.filename}", content
+    
+    if failures:
+        yield "errors.txt", "\n".join(failures).encode()
+
+@router.post("/jobs", response_model=DocumentJob, status_code=202)
+async def submit_document_job(
+    request: DocumentJobRequest,
+    job_queue: DocumentJobQueue = Depends(get_job_queue)
+):
+    """Queue a document for background rendering and return its job."""
+    
+    logger.info(f"Queueing {request.type.value} document job for property {request.property_id}")
+    return await job_queue.submit(request)
+
+@router.get("/jobs/{job_id}", response_model=DocumentJob)
+async def get_document_job(
+    job_id: str,
+    job_queue: DocumentJobQueue = Depends(get_job_queue)
+):
+    """Poll the status of a document job."""
+    
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found"
+        )
+    
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def stream_document_job_events(
+    job_id: str,
+    job_queue: DocumentJobQueue = Depends(get_job_queue)
+):
+    """Subscribe to status changes of a document job as server-sent events."""
+    
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found"
+        )
+    
+    async def event_stream():
+        current = job
+        while current is not None:
+            yield f"data: {json.dumps(current.model_dump(mode='json', by_alias=True))}\n\n"
+            if current.status in TERMINAL_STATUSES:
+                break
+            
+            previous_status = current.status
+            current = await job_queue.wait_for_update(job_id, previous_status, timeout=15)
+            
+            # Keep idle connections alive between status changes
+            while current is not None and current.status == previous_status:
+                yield ": keep-alive\n\n"
+                current = await job_queue.wait_for_update(job_id, previous_status, timeout=15)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@router.get("/jobs/{job_id}/result")
+async def download_document_job_result(
+    job_id: str,
+    job_queue: DocumentJobQueue = Depends(get_job_queue)
+):
+    """Download the rendered file of a completed document job."""
+    
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found"
+        )
+    
+    if job.status == DocumentJobStatus.FAILED:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Document job failed: {job.error}"
+        )
+    
+    if job.status != DocumentJobStatus.COMPLETED:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Document job is {job.status.value}"
+        )
+    
+    path = job_queue.result_path(job)
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=410,
+            detail="Document result has expired"
+        )
+    
+    return FileResponse(path, media_type=job.media_type, filename=job.filename)
+
 @router.get("/health")
 async def documents_health():
     """Documents service health check."""
@@ -156,7 +459,7 @@ async def test_document_generation(
         )
         
         return {
-            "test_property": test_property.dict(),
+            "test_property": test_property.model_dump(),
             "underwriting_generated": bool(underwriting_data),
             "loi_generated": bool(loi_data),
             "underwriting_cap_rate": underwriting_data.get("analysis", {}).get("calculations", {}).get("capRate"),
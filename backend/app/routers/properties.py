@@ -1,14 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import List, Optional
+import os
 import logging
 
 from models.property import Property, PropertySearchFilters, PropertySearchResult
+from models.document import WorkbookImportReport
 from services.property_service import PropertyService
+from services.listing_cache import listing_json_cache
+from services.workbook_importer import WorkbookImporter
+from utils.metrics import stage
+from utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _json_response(content: bytes) -> Response:
+    # Results are assembled from the cached JSON of validated listings, so they
+    # are sent as-is instead of being validated again against the response model
+    return Response(content=content, media_type="application/json")
+
 # Dependency injection
 def get_property_service() -> PropertyService:
     return PropertyService()
@@ -32,22 +43,24 @@ async def search_properties(
         logger.info(f"Searching properties with query: {query}")
         
         # Create filters object
-        filters = PropertySearchFilters(
-            minPrice=min_price,
-            maxPrice=max_price,
-            location=location,
-            minCapRate=min_cap_rate,
-            maxCapRate=max_cap_rate,
-            propertyType=property_type,
-            minUnits=min_units,
-            maxUnits=max_units
-        )
+        with stage("filter_parse"):
+            filters = PropertySearchFilters(
+                minPrice=min_price,
+                maxPrice=max_price,
+                location=location,
+                minCapRate=min_cap_rate,
+                maxCapRate=max_cap_rate,
+                propertyType=property_type,
+                minUnits=min_units,
+                maxUnits=max_units
+            )
         
-        # Search properties
-        result = await property_service.search_properties(query, filters)
+        # Search properties, straight to the listings' JSON
+        total_count, properties_json = await property_service.search_listings_json(query, filters)
         
-        logger.info(f"Found {result.total_count} properties")
-        return result
+        logger.info(f"Found {total_count} properties")
+        with stage("serialization"), span("serialize search result"):
+            return _json_response(listing_json_cache.wrap_search_result(properties_json, total_count, query))
         
     except Exception as e:
         logger.error(f"Property search error: {e}")
@@ -64,8 +77,8 @@ async def get_all_properties(
     
     try:
         # Return all properties (mock data)
-        result = await property_service.search_properties("", None)
-        return result.properties
+        _, properties_json = await property_service.search_listings_json("", None)
+        return _json_response(properties_json)
         
     except Exception as e:
         logger.error(f"Get all properties error: {e}")
@@ -74,6 +87,29 @@ async def get_all_properties(
             detail="Failed to get properties"
         )
 
+@router.post("/import", response_model=WorkbookImportReport)
+async def import_workbooks():
+    """Import every underwriting workbook in WORKBOOK_IMPORT_DIR as a searchable property."""
+    
+    directory = os.getenv("WORKBOOK_IMPORT_DIR")
+    if not directory:
+        raise HTTPException(
+            status_code=400,
+            detail="WORKBOOK_IMPORT_DIR is not configured"
+        )
+    
+    try:
+        return await WorkbookImporter().import_directory(directory)
+        
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Workbook import error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to import workbooks"
+        )
+
 @router.get("/{property_id}", response_model=Property)
 async def get_property_by_id(
     property_id: str,
@@ -122,7 +158,7 @@ async def test_property_search(
         return {
             "test_query": test_query,
             "result_count": result.total_count,
-            "sample_properties": [p.dict() for p in result.properties[:2]]
+            "sample_properties": [p.model_dump() for p in result.properties[:2]]
         }
         
     except Exception as e:
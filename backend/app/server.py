@@ -0,0 +1,102 @@
+"""Production server: one worker process per core, sharing the listing store.
+
+    python -m app.server --port 8000
+
+Before the workers start, this process builds the listing store (the mock
+listings plus any workbooks in WORKBOOK_IMPORT_DIR) and publishes it as a
+snapshot in LISTING_SNAPSHOT_DIR. Workers map that snapshot instead of each
+holding their own copy, and rendered documents are shared through the on-disk
+document cache (``python -m benchmarks.shared_documents`` renders through one
+worker and downloads through the others to check it). Budgets that are per
+process (render pool, OpenAI quota, concurrency and per-user limit, in-memory
+document cache) are treated as totals for the server and split between the
+workers, so neither the host nor the OpenAI account is oversubscribed. Each
+worker keeps at least one of everything, so with more workers than a limit
+allows the effective total is one per worker.
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+from dotenv import load_dotenv
+import uvicorn
+
+load_dotenv()
+
+logging.basicConfig(
+    level=getattr(logging, os.getenv("LOG_LEVEL", "INFO")),
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+logger = logging.getLogger(__name__)
+
+def worker_count() -> int:
+    """WEB_CONCURRENCY if set, else one worker per core."""
+    return int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+
+def _divide(name: str, default: float, workers: int, minimum: float = 1):
+    # The configured value is the total for the server; each worker gets its share. 0 (unlimited) stays 0
+    configured = os.getenv(name)
+    total = float(configured) if configured else default
+    if total:
+        os.environ[name] = str(int(max(total // workers, minimum)))
+
+def configure_workers(workers: int):
+    _divide("RENDER_WORKERS", os.cpu_count() or 1, workers)
+    _divide("OPENAI_RPM", 500, workers)
+    _divide("OPENAI_TPM", 40000, workers)
+    _divide("OPENAI_MAX_CONCURRENCY", 16, workers)
+    # A user's requests may land on any worker, so the per-user cap is split too
+    _divide("OPENAI_PER_USER_LIMIT", 4, workers)
+    _divide("DOCUMENT_CACHE_MEMORY_BYTES", 64 * 1024 * 1024, workers, 8 * 1024 * 1024)
+    os.environ.setdefault("LISTING_JSON_CACHE_SIZE", "20000")
+    os.environ.setdefault("LISTING_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "rets-listings"))
+
+def publish_listings():
+    """Build the listing store once and publish it as the first snapshot generation."""
+    from data.mock_properties import MOCK_PROPERTIES
+    from services.listing_snapshot import get_listing_snapshot_store
+    from services.workbook_importer import WorkbookImporter
+
+    listings = {property.id: property for property in MOCK_PROPERTIES}
+    assumptions = {}
+    workbook_import_dir = os.getenv("WORKBOOK_IMPORT_DIR")
+    if workbook_import_dir:
+        report = WorkbookImporter().extract_directory(workbook_import_dir)
+        for result in report.results:
+            if result.error:
+                logger.warning(f"Could not import {result.path}: {result.error}")
+                continue
+            listings[result.property.id] = result.property
+            if result.assumptions is not None:
+                assumptions[result.property.id] = result.assumptions
+        logger.info(f"Imported {report.imported} workbooks from {workbook_import_dir} ({report.failed} failed)")
+        # Done here once for every worker
+        os.environ["WORKBOOK_IMPORT_ON_STARTUP"] = "false"
+
+    get_listing_snapshot_store().publish(list(listings.values()), assumptions)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with one worker process per core")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=None, help="Defaults to WEB_CONCURRENCY or the core count")
+    args = parser.parse_args()
+
+    workers = args.workers or worker_count()
+    configure_workers(workers)
+    publish_listings()
+
+    logger.info(f"Starting {workers} workers on {args.host}:{args.port}")
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        proxy_headers=True,
+        log_level=os.getenv("LOG_LEVEL", "INFO").lower()
+    )
+
+if __name__ == "__main__":
+    main()
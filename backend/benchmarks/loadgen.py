@@ -0,0 +1,147 @@
+"""Closed-loop load generator for the running app.
+
+A fixed number of virtual users each send a request, wait for the whole
+response, then wait for their next slot; slots are spaced so that together
+they aim at ``--rps``. When the app slows down the offered load drops with it,
+as it does for real users, and the achieved rate is reported next to the target.
+
+    python -m benchmarks.mock_openai --port 8100 &
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=mock uvicorn app.main:app --port 8000 &
+    python -m benchmarks.loadgen --rps 20 --users 40 --duration 60
+"""
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+import httpx
+import orjson
+
+DEFAULT_MESSAGES = [
+    "Find apartments in Seattle under $10M",
+    "Show me properties in Bellevue between $5M and $8M with 5-6% cap rate",
+    "Search for apartments in Tacoma",
+    "Run an underwriting analysis for property 2",
+    "Draft an LOI for property 3",
+    "What can you help me with?",
+]
+
+PERCENTILES = (50, 90, 95, 99)
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(percent / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+async def _user(
+    client: httpx.AsyncClient,
+    url: str,
+    messages,
+    interval: float,
+    start_at: float,
+    deadline: float,
+    latencies: List[float],
+    outcomes: Counter
+):
+    next_send = start_at
+    while True:
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if time.perf_counter() >= deadline:
+            return
+
+        started = time.perf_counter()
+        try:
+            response = await client.post(url, json={"message": next(messages)})
+            await response.aread()
+            outcomes[str(response.status_code)] += 1
+            if response.status_code < 400:
+                latencies.append(time.perf_counter() - started)
+        except httpx.HTTPError as e:
+            outcomes[type(e).__name__] += 1
+
+        # Closed loop: the next request waits for this one; a slow response pushes the schedule back
+        next_send = max(next_send + interval, time.perf_counter())
+
+async def run(
+    url: str,
+    rps: float,
+    users: int,
+    duration: float,
+    messages: List[str],
+    timeout: float
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    message_cycle = itertools.cycle(messages)
+    interval = users / rps
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+        # Users start staggered across one interval, so requests arrive evenly rather than in bursts
+        await asyncio.gather(*(
+            _user(client, url, message_cycle, interval, start + interval * index / users, deadline, latencies, outcomes)
+            for index in range(users)
+        ))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    completed = sum(outcomes.values())
+    return {
+        "target_rps": rps,
+        "achieved_rps": completed / elapsed if elapsed else 0.0,
+        "requests": completed,
+        "duration": elapsed,
+        "outcomes": dict(outcomes),
+        "latency": {
+            **{f"p{p}": percentile(latencies, p) for p in PERCENTILES},
+            "min": latencies[0] if latencies else 0.0,
+            "max": latencies[-1] if latencies else 0.0,
+            "mean": statistics.fmean(latencies) if latencies else 0.0,
+        },
+    }
+
+def print_report(report: Dict[str, Any]):
+    print(f"requests     {report['requests']} in {report['duration']:.1f}s")
+    print(f"throughput   {report['achieved_rps']:.2f} rps (target {report['target_rps']:g})")
+    print(f"outcomes     {', '.join(f'{k}: {v}' for k, v in sorted(report['outcomes'].items()))}")
+    latency = report["latency"]
+    print("latency      " + "  ".join(
+        f"{name} {latency[name] * 1000:.1f}ms" for name in ["min", *(f"p{p}" for p in PERCENTILES), "max"]
+    ))
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Drive the chat endpoint at a target request rate.")
+    parser.add_argument("--url", default="http://localhost:8000/api/chat/")
+    parser.add_argument("--rps", type=float, default=10, help="Target requests per second")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users (max requests in flight)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to send requests for")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument("--messages", help="JSON file with a list of chat messages to cycle through")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    messages = DEFAULT_MESSAGES
+    if args.messages:
+        with open(args.messages, "rb") as f:
+            messages = orjson.loads(f.read())
+
+    report = asyncio.run(run(args.url, args.rps, args.users, args.duration, messages, args.timeout))
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+
+    return 0 if report["requests"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""A local OpenAI-compatible chat completions server for load testing.
+
+Speaks ``POST /v1/chat/completions`` (plain and streamed, with legacy
+``functions`` or ``tools``) closely enough for the openai client, with no
+upstream spend or rate limits. Point the backend at it with:
+
+    python -m benchmarks.mock_openai --port 8100 --latency-ms 600 --tokens-per-second 50
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=mock uvicorn app.main:app
+
+Responses are deterministic: the same request always gets the same answer.
+By default the answer is derived from the last user message with the same
+keywords the app's fallback parser uses; ``--script`` replaces that with a
+JSON list of rules, the first whose ``match`` regex matches the message
+winning:
+
+    [{"match": "underwriting", "function_call": {"name": "process_real_estate_request",
+      "arguments": {"action": "generate_underwriting", "message": "On it.", "property_id": "1"}}},
+     {"content": "Happy to help."}]
+
+A rule may also set ``latency_ms`` and ``tokens_per_second``, or ``error``
+(an HTTP status) to script failures. Latency jitter and random errors
+(``--error-rate``) come from a seeded generator, so runs are reproducible.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+
+ERROR_TYPES = {
+    400: "invalid_request_error",
+    401: "authentication_error",
+    429: "rate_limit_exceeded",
+    500: "server_error",
+    503: "service_unavailable",
+}
+
+def count_tokens(text: str) -> int:
+    # Roughly four characters per token, as for English with cl100k
+    return max(1, len(text) // 4)
+
+def _last_user_message(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user" and isinstance(message.get("content"), str):
+            return message["content"]
+    return ""
+
+def default_reply(message: str) -> Dict[str, Any]:
+    """Answer the app's function schema from keywords in the user's message."""
+    lower = message.lower()
+    property_id = re.search(r"property\s*#?\s*(\w+)", lower)
+
+    if any(keyword in lower for keyword in ["underwriting", "analysis", "financials"]):
+        arguments = {
+            "action": "generate_underwriting",
+            "message": "I'll prepare the underwriting analysis for that property.",
+            "property_id": property_id.group(1) if property_id else "1",
+        }
+    elif any(keyword in lower for keyword in ["loi", "letter of intent", "offer"]):
+        arguments = {
+            "action": "generate_loi",
+            "message": "I'll draft a letter of intent for that property.",
+            "property_id": property_id.group(1) if property_id else "1",
+        }
+    elif any(keyword in lower for keyword in ["find", "search", "show", "properties", "apartments"]):
+        filters: Dict[str, Any] = {}
+        location = re.search(r"\b(?:in|near|around)\s+([a-z]+)", lower)
+        if location:
+            filters["location"] = location.group(1)
+        if "apartment" in lower:
+            filters["property_type"] = "apartment"
+        arguments = {
+            "action": "search_properties",
+            "message": "Here are the properties that match your criteria.",
+            "search_filters": filters,
+        }
+    else:
+        return {"content": "I can search listings, prepare underwriting analyses and draft letters of intent."}
+
+    return {"function_call": {"name": "process_real_estate_request", "arguments": arguments}}
+
+class MockSettings:
+    def __init__(
+        self,
+        latency_ms: float = 500,
+        jitter_ms: float = 100,
+        tokens_per_second: float = 50,
+        error_rate: float = 0.0,
+        error_statuses: Optional[List[int]] = None,
+        script: Optional[List[Dict[str, Any]]] = None,
+        seed: int = 0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses or [429, 500]
+        self.script = [
+            {**rule, "pattern": re.compile(rule["match"], re.IGNORECASE) if rule.get("match") else None}
+            for rule in script or []
+        ]
+        self.random = random.Random(seed)
+
+    def reply_for(self, message: str) -> Dict[str, Any]:
+        for rule in self.script:
+            if rule["pattern"] is None or rule["pattern"].search(message):
+                return rule
+        return default_reply(message)
+
+def _error(status: int, message: str) -> Response:
+    headers = {"Retry-After": "1"} if status == 429 else None
+    body = {"error": {"message": message, "type": ERROR_TYPES.get(status, "server_error"), "code": None, "param": None}}
+    return Response(orjson.dumps(body), status_code=status, media_type="application/json", headers=headers)
+
+def _completion_id(body: Dict[str, Any]) -> str:
+    return "chatcmpl-" + hashlib.sha256(orjson.dumps(body.get("messages", []))).hexdigest()[:24]
+
+def _reply_message(reply: Dict[str, Any], use_tools: bool, completion_id: str) -> Dict[str, Any]:
+    message: Dict[str, Any] = {"role": "assistant", "content": reply.get("content")}
+    function_call = reply.get("function_call")
+    if function_call is not None:
+        call = {"name": function_call["name"], "arguments": orjson.dumps(function_call.get("arguments", {})).decode()}
+        if use_tools:
+            message["tool_calls"] = [{"id": f"call_{completion_id[9:]}", "type": "function", "function": call}]
+        else:
+            message["function_call"] = call
+    return message
+
+def _finish_reason(message: Dict[str, Any]) -> str:
+    if message.get("tool_calls"):
+        return "tool_calls"
+    return "function_call" if message.get("function_call") else "stop"
+
+def _message_text(message: Dict[str, Any]) -> str:
+    if message.get("function_call"):
+        return message["function_call"]["arguments"]
+    if message.get("tool_calls"):
+        return message["tool_calls"][0]["function"]["arguments"]
+    return message.get("content") or ""
+
+def create_app(settings: MockSettings) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI", docs_url=None, redoc_url=None)
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "gpt-4", "object": "model", "created": 0, "owned_by": "mock"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = orjson.loads(await request.body())
+        model = body.get("model", "gpt-4")
+        message_text = _last_user_message(body.get("messages", []))
+        reply = settings.reply_for(message_text)
+
+        latency_ms = reply.get("latency_ms", settings.latency_ms)
+        tokens_per_second = reply.get("tokens_per_second", settings.tokens_per_second)
+        jitter = settings.random.uniform(-settings.jitter_ms, settings.jitter_ms) if settings.jitter_ms else 0
+        await asyncio.sleep(max(latency_ms + jitter, 0) / 1000)
+
+        if reply.get("error"):
+            return _error(int(reply["error"]), reply.get("content") or "Scripted error")
+        if settings.error_rate and settings.random.random() < settings.error_rate:
+            status = settings.random.choice(settings.error_statuses)
+            return _error(status, "Simulated upstream error")
+
+        completion_id = _completion_id(body)
+        use_tools = "tools" in body and "functions" not in body
+        message = _reply_message(reply, use_tools, completion_id)
+        completion_text = _message_text(message)
+        prompt_tokens = sum(count_tokens(str(m.get("content") or "")) for m in body.get("messages", []))
+        completion_tokens = count_tokens(completion_text)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        seconds_per_token = 1 / tokens_per_second if tokens_per_second else 0
+
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream(completion_id, model, message, completion_text, seconds_per_token),
+                media_type="text/event-stream"
+            )
+
+        await asyncio.sleep(completion_tokens * seconds_per_token)
+        return Response(orjson.dumps({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "logprobs": None, "finish_reason": _finish_reason(message)}],
+            "usage": usage,
+        }), media_type="application/json")
+
+    return app
+
+async def _stream(
+    completion_id: str,
+    model: str,
+    message: Dict[str, Any],
+    text: str,
+    seconds_per_token: float
+) -> AsyncIterator[bytes]:
+    created = int(time.time())
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> bytes:
+        return b"data: " + orjson.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}],
+        }) + b"\n\n"
+
+    # The first delta carries the role and, for calls, the function name; then the text in token-sized pieces
+    first: Dict[str, Any] = {"role": "assistant"}
+    if message.get("function_call"):
+        first["function_call"] = {"name": message["function_call"]["name"], "arguments": ""}
+    elif message.get("tool_calls"):
+        call = message["tool_calls"][0]
+        first["tool_calls"] = [{"index": 0, "id": call["id"], "type": "function", "function": {"name": call["function"]["name"], "arguments": ""}}]
+    else:
+        first["content"] = ""
+    yield chunk(first)
+
+    for start in range(0, len(text), 4):
+        piece = text[start:start + 4]
+        if message.get("function_call"):
+            delta = {"function_call": {"arguments": piece}}
+        elif message.get("tool_calls"):
+            delta = {"tool_calls": [{"index": 0, "function": {"arguments": piece}}]}
+        else:
+            delta = {"content": piece}
+        if seconds_per_token:
+            await asyncio.sleep(seconds_per_token)
+        yield chunk(delta)
+
+    yield chunk({}, _finish_reason(message))
+    yield b"data: [DONE]\n\n"
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Serve a local OpenAI-compatible chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=500, help="Time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="Uniform +/- jitter on the time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="Completion token rate; 0 for instant")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-statuses", default="429,500", help="Comma-separated statuses random failures use")
+    parser.add_argument("--script", help="JSON file of scripted response rules")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for jitter and random errors")
+    args = parser.parse_args(argv)
+
+    script = None
+    if args.script:
+        with open(args.script, "rb") as f:
+            script = orjson.loads(f.read())
+
+    settings = MockSettings(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_statuses=[int(status) for status in args.error_statuses.split(",") if status],
+        script=script,
+        seed=args.seed
+    )
+
+    import uvicorn
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
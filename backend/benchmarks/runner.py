@@ -0,0 +1,320 @@
+"""Benchmarks for the backend's hot paths, with regression tracking.
+
+Run from the backend directory:
+
+    python -m benchmarks.runner --output results.json
+    python -m benchmarks.runner --compare baseline.json --threshold 0.2
+
+Search benchmarks run over synthetic listings at each of ``--sizes``; document
+and end-to-end benchmarks run against the mock data through the real ASGI app,
+with OpenAI stubbed out and the services' simulated delays removed. With
+``--compare`` the run exits non-zero when any benchmark's median is more than
+``--threshold`` slower than in the baseline.
+"""
+
+import argparse
+import asyncio
+import inspect
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+import orjson
+
+# Configure the app before it is imported: no real OpenAI key, and throwaway cache directories
+_scratch = tempfile.mkdtemp(prefix="rets-bench-")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("DOCUMENT_CACHE_DIR", os.path.join(_scratch, "documents"))
+os.environ.setdefault("DOCUMENT_RESULT_DIR", os.path.join(_scratch, "results"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+from openai.types.chat import ChatCompletion
+
+from benchmarks.synthetic import generate_listings
+from data.mock_properties import MOCK_PROPERTIES
+from models.document import UnderwritingAssumptions
+from models.property import PropertySearchFilters
+from services import document_service, property_service
+from services.document_service import DocumentService
+from services.listing_snapshot import ListingSnapshotStore
+from services.openai_service import OpenAIService
+from services.property_service import PropertyService
+from services.underwriting import calculate_underwriting
+from utils.excel_generator import ExcelGenerator
+from utils.pdf_generator import PDFGenerator
+
+DEFAULT_SIZES = "1000,100000,1000000"
+
+SEARCH_QUERY = "apartments in seattle $2,000,000 - $20,000,000 with 4.5 - 7 cap rate"
+SEARCH_FILTERS = PropertySearchFilters(
+    location="seattle",
+    minPrice=2_000_000,
+    maxPrice=20_000_000,
+    minCapRate=4.5,
+    propertyType="apartment",
+    minUnits=10
+)
+
+class _InstantAsyncio:
+    """Stands in for ``asyncio`` in service modules so simulated delays take no time."""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(asyncio, name)
+
+    @staticmethod
+    def sleep(delay: float, result: Any = None):
+        return asyncio.sleep(0, result)
+
+def remove_simulated_delays():
+    for module in (property_service, document_service):
+        module.asyncio = _InstantAsyncio()
+
+class _StubCompletions:
+    def __init__(self, arguments: Dict[str, Any]):
+        self.response = ChatCompletion.model_validate({
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4",
+            "choices": [{
+                "index": 0,
+                "finish_reason": "function_call",
+                "logprobs": None,
+                "message": {
+                    "role": "assistant",
+                    "content": None,
+                    "function_call": {
+                        "name": "process_real_estate_request",
+                        "arguments": orjson.dumps(arguments).decode(),
+                    },
+                },
+            }],
+            "usage": {"prompt_tokens": 420, "completion_tokens": 60, "total_tokens": 480},
+        })
+
+    async def create(self, **kwargs: Any) -> ChatCompletion:
+        return self.response
+
+class StubOpenAIClient:
+    """Answers every chat completion with the same function call, instantly."""
+
+    def __init__(self, arguments: Dict[str, Any]):
+        self.chat = SimpleNamespace(completions=_StubCompletions(arguments))
+
+def stub_openai_service() -> OpenAIService:
+    service = OpenAIService()
+    service.client = StubOpenAIClient({
+        "action": "search_properties",
+        "message": "Here are apartment buildings in Seattle.",
+        "search_filters": {"location": "seattle", "property_type": "apartment"},
+    })
+    return service
+
+class Benchmark:
+    def __init__(self, name: str, fn: Callable, repeat: int, warmup: int = 1):
+        self.name = name
+        self.fn = fn
+        self.repeat = repeat
+        self.warmup = warmup
+
+    async def run(self) -> Dict[str, Any]:
+        timings = []
+        for index in range(self.warmup + self.repeat):
+            start = time.perf_counter()
+            result = self.fn()
+            if inspect.isawaitable(result):
+                await result
+            elapsed = time.perf_counter() - start
+            if index >= self.warmup:
+                timings.append(elapsed)
+
+        timings.sort()
+        return {
+            "runs": len(timings),
+            "min": timings[0],
+            "median": statistics.median(timings),
+            "mean": statistics.fmean(timings),
+            "p95": timings[min(int(len(timings) * 0.95), len(timings) - 1)],
+        }
+
+# Benchmarks run per store size, as named by search_benchmark_name
+SEARCH_BENCHMARKS = ("_apply_filters", "search_properties", "search_listings_json", "snapshot_search_listings_json")
+
+def search_benchmark_name(benchmark: str, size: int) -> str:
+    return f"search.{benchmark}[{size}]"
+
+def search_benchmarks(size: int, repeat: int) -> List[Benchmark]:
+    service = PropertyService()
+    service.properties = generate_listings(size)
+    # The same listings in a shared snapshot, as served by app/server.py's workers
+    shared = PropertyService()
+    shared.snapshots = ListingSnapshotStore(tempfile.mkdtemp(dir=_scratch))
+    shared.snapshots.publish(service.properties)
+    # Fewer runs on big stores, where one run is already long
+    repeat = max(3, repeat // max(size // 100_000, 1))
+
+    runs = {
+        "_apply_filters": lambda: service._apply_filters(service.properties, SEARCH_FILTERS),
+        "search_properties": lambda: service.search_properties(SEARCH_QUERY, SEARCH_FILTERS),
+        "search_listings_json": lambda: service.search_listings_json(SEARCH_QUERY, SEARCH_FILTERS),
+        "snapshot_search_listings_json": lambda: shared.search_listings_json(SEARCH_QUERY, SEARCH_FILTERS),
+    }
+    return [Benchmark(search_benchmark_name(name, size), runs[name], repeat) for name in SEARCH_BENCHMARKS]
+
+async def component_benchmarks(repeat: int) -> List[Benchmark]:
+    property_svc = PropertyService()
+    openai_svc = stub_openai_service()
+    documents = DocumentService()
+    property = MOCK_PROPERTIES[0]
+    assumptions = UnderwritingAssumptions()
+    analysis = calculate_underwriting(property, assumptions)
+    loi_details = await documents.generate_loi_details(property)
+    excel = ExcelGenerator()
+    pdf = PDFGenerator()
+
+    return [
+        Benchmark("parse.property_service.parse_search_query", lambda: property_svc.parse_search_query(SEARCH_QUERY), repeat * 10),
+        Benchmark("parse.openai_service.parse_search_query", lambda: openai_svc.parse_search_query(SEARCH_QUERY), repeat * 10),
+        Benchmark("underwriting.generate_underwriting_analysis", lambda: documents.generate_underwriting_analysis(property, assumptions), repeat * 10),
+        Benchmark("render.generate_underwriting_excel", lambda: excel.generate_underwriting_excel(property, analysis), repeat),
+        Benchmark("render.generate_formula_excel", lambda: ExcelGenerator().generate_formula_excel(property, assumptions), repeat),
+        Benchmark("render.generate_loi_pdf", lambda: pdf.generate_loi_pdf(property, loi_details), repeat),
+    ]
+
+def e2e_benchmarks(client: httpx.AsyncClient, repeat: int) -> List[Benchmark]:
+    property_id = MOCK_PROPERTIES[0].id
+    offer_prices = iter(range(1_000_000, 2_000_000_000, 1_000))
+
+    async def request(method: str, url: str, **kwargs: Any):
+        response = await client.request(method, url, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def uncached_loi():
+        # A new offer price each time, so the document cache never answers
+        await request("GET", "/api/documents/download", params={
+            "type": "loi", "propertyId": property_id, "offerPrice": next(offer_prices)
+        })
+
+    return [
+        Benchmark("e2e.GET /api/properties/search", lambda: request(
+            "GET", "/api/properties/search", params={"query": SEARCH_QUERY, "location": "seattle"}
+        ), repeat * 5),
+        Benchmark("e2e.GET /api/properties/", lambda: request("GET", "/api/properties/"), repeat * 5),
+        Benchmark("e2e.POST /api/chat/", lambda: request(
+            "POST", "/api/chat/", json={"message": "Show me apartments in Seattle under $10M"}
+        ), repeat * 5),
+        Benchmark("e2e.POST /api/documents/generate", lambda: request(
+            "POST", "/api/documents/generate", json={"type": "underwriting", "propertyId": property_id}
+        ), repeat * 5),
+        Benchmark("e2e.GET /api/documents/download[underwriting,cached]", lambda: request(
+            "GET", "/api/documents/download", params={"type": "underwriting", "propertyId": property_id}
+        ), repeat * 5),
+        Benchmark("e2e.GET /api/documents/download[loi,uncached]", uncached_loi, repeat),
+    ]
+
+async def run_benchmarks(benchmarks: List[Benchmark], pattern: Optional[str], results: Dict[str, Any]):
+    for benchmark in benchmarks:
+        if pattern and pattern not in benchmark.name:
+            continue
+        results[benchmark.name] = await benchmark.run()
+        print(f"{benchmark.name:<60} {_ms(results[benchmark.name]['median']):>12}", file=sys.stderr)
+
+async def run(sizes: List[int], repeat: int, pattern: Optional[str]) -> Dict[str, Any]:
+    remove_simulated_delays()
+    results: Dict[str, Any] = {}
+
+    for size in sizes:
+        # Building a store is slow, so skip sizes none of whose benchmarks match
+        if pattern and not any(pattern in search_benchmark_name(name, size) for name in SEARCH_BENCHMARKS):
+            continue
+        await run_benchmarks(search_benchmarks(size, repeat), pattern, results)
+
+    await run_benchmarks(await component_benchmarks(repeat), pattern, results)
+
+    from app.main import app
+    from app.routers import chat
+
+    app.dependency_overrides[chat.get_openai_service] = stub_openai_service
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            await run_benchmarks(e2e_benchmarks(client, repeat), pattern, results)
+
+    return results
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.3f} ms"
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print each benchmark against the baseline and return the names that regressed."""
+    regressions = []
+    print(f"{'benchmark':<60} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<60} {'-':>12} {_ms(result['median']):>12} {'new':>8}")
+            continue
+
+        change = result["median"] / previous["median"] - 1 if previous["median"] else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<60} {_ms(previous['median']):>12} {_ms(result['median']):>12} {change:>+8.1%}{flag}")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the backend's hot paths.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated synthetic listing counts for search benchmarks")
+    parser.add_argument("--repeat", type=int, default=10, help="Base number of timed runs per benchmark")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed median slowdown before failing, as a fraction")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = asyncio.run(run(sizes, args.repeat, args.filter))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+
+    if args.compare:
+        with open(args.compare, "rb") as f:
+            baseline = orjson.loads(f.read())["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Check that app.server's workers share rendered documents.
+
+Starts ``python -m app.server`` with several workers and a fresh document
+cache, renders a document through one worker and downloads it again through
+each of the others. Every connection first asks ``/api/admin/startup`` which
+worker it reached; the kernel spreads new connections between the workers, so
+opening a few is enough to reach them all. The check passes when every worker
+answers 200 with the first render's ETag (it served the cached file instead of
+rendering its own copy, which would carry a different digest) and 304 to
+If-None-Match.
+
+    python -m benchmarks.shared_documents --workers 2
+"""
+
+import argparse
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+import httpx
+
+DOWNLOAD = "/api/documents/download"
+
+def _wait_ready(process: subprocess.Popen, base_url: str, timeout: float):
+    started = time.perf_counter()
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode} before becoming ready")
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError(f"Server not ready after {timeout:g}s")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+
+def check(workers: int, port: int, timeout: float, params: Dict[str, str]) -> List[str]:
+    """Run the check and return the problems found (empty when documents are shared)."""
+
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env["ADMIN_TOKEN"] = secrets.token_hex(16)
+    scratch = tempfile.mkdtemp(prefix="rets-shared-documents-")
+    env["DOCUMENT_CACHE_DIR"] = os.path.join(scratch, "documents")
+    env["LISTING_SNAPSHOT_DIR"] = os.path.join(scratch, "listings")
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    admin = {"X-Admin-Token": env["ADMIN_TOKEN"]}
+    problems = []
+    try:
+        _wait_ready(process, base_url, timeout)
+
+        rendered_by = None
+        etag = None
+        checked = set()
+        for _ in range(workers * 20):
+            if len(checked) == workers - 1 and rendered_by is not None:
+                break
+            # A new client is a new connection, which may land on another worker
+            with httpx.Client(base_url=base_url, timeout=timeout) as client:
+                pid = client.get("/api/admin/startup", headers=admin).json()["pid"]
+                if rendered_by is None:
+                    response = client.get(DOWNLOAD, params=params)
+                    if response.status_code != 200:
+                        problems.append(f"worker {pid}: first render answered {response.status_code}")
+                        break
+                    rendered_by, etag = pid, response.headers["etag"]
+                    print(f"worker {pid}: rendered {etag}")
+                    continue
+                if pid == rendered_by or pid in checked:
+                    continue
+                checked.add(pid)
+
+                response = client.get(DOWNLOAD, params=params)
+                if response.status_code != 200:
+                    problems.append(f"worker {pid}: download answered {response.status_code}")
+                elif response.headers["etag"] != etag:
+                    problems.append(f"worker {pid}: rendered its own copy ({response.headers['etag']})")
+                revalidated = client.get(DOWNLOAD, params=params, headers={"If-None-Match": etag})
+                if revalidated.status_code != 304:
+                    problems.append(f"worker {pid}: If-None-Match answered {revalidated.status_code}")
+                print(f"worker {pid}: download {response.status_code}, revalidation {revalidated.status_code}")
+
+        if rendered_by is not None and len(checked) < workers - 1:
+            problems.append(f"only reached {len(checked) + 1} of {workers} workers")
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    return problems
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check that app.server's workers share rendered documents.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for the server and each request")
+    parser.add_argument("--type", default="underwriting", choices=["underwriting", "loi"])
+    parser.add_argument("--property-id", default="1")
+    args = parser.parse_args(argv)
+
+    if args.workers < 2:
+        parser.error("--workers must be at least 2")
+
+    problems = check(args.workers, args.port, args.timeout, {"type": args.type, "propertyId": args.property_id})
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if not problems:
+        print(f"OK: {args.workers} workers served one shared render")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
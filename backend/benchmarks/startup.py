@@ -0,0 +1,90 @@
+"""Boot-to-ready time of an API worker.
+
+Starts the app in a fresh process, polls /health until it answers, and stops
+it again, a few times over. uvicorn only accepts connections once the lifespan
+warm-up has finished, so the first answer is the moment the worker is ready.
+The worker's own startup report (imports, warm-up steps) is fetched as well.
+
+    python -m benchmarks.startup --runs 5
+"""
+
+import argparse
+import os
+import secrets
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+import httpx
+import orjson
+
+def boot_once(port: int, timeout: float, env: Dict[str, str]) -> Dict[str, Any]:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    started = time.perf_counter()
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        with httpx.Client(base_url=base_url, timeout=1.0) as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Server exited with status {process.returncode} before becoming ready")
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"Server not ready after {timeout:g}s")
+                try:
+                    if client.get("/health").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+            ready = time.perf_counter() - started
+            response = client.get("/api/admin/startup", headers={"X-Admin-Token": env["ADMIN_TOKEN"]})
+            report = response.json() if response.status_code == 200 else None
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    return {"boot_to_ready": ready, "worker": report}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure how long an API worker takes to become ready.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for one boot")
+    parser.add_argument("--output", help="Write the runs as JSON to this file")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env["ADMIN_TOKEN"] = env.get("ADMIN_TOKEN") or secrets.token_hex(16)
+
+    runs = []
+    for index in range(args.runs):
+        run = boot_once(args.port, args.timeout, env)
+        runs.append(run)
+        line = f"run {index + 1}: ready in {run['boot_to_ready']:.2f}s"
+        worker = run["worker"]
+        if worker is not None:
+            steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in worker["steps"].items())
+            line += f" (imports {worker['imports']:.2f}s, warm-up {worker['warmUp']:.2f}s: {steps})"
+        print(line)
+
+    times = sorted(run["boot_to_ready"] for run in runs)
+    print(f"boot to ready  min {times[0]:.2f}s  median {statistics.median(times):.2f}s  max {times[-1]:.2f}s")
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(orjson.dumps({"runs": runs}, option=orjson.OPT_INDENT_2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
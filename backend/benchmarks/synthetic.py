@@ -0,0 +1,92 @@
+from typing import List
+import numpy as np
+from models.property import Property, PropertyType, Coordinates
+
+# (city, state, ZIP prefix, latitude, longitude)
+CITIES = [
+    ("Seattle", "WA", "981", 47.6062, -122.3321),
+    ("Bellevue", "WA", "980", 47.6101, -122.2015),
+    ("Tacoma", "WA", "984", 47.2529, -122.4443),
+    ("Portland", "OR", "972", 45.5152, -122.6784),
+    ("Spokane", "WA", "992", 47.6588, -117.4260),
+    ("Boise", "ID", "837", 43.6150, -116.2023),
+    ("San Diego", "CA", "921", 32.7157, -117.1611),
+    ("Denver", "CO", "802", 39.7392, -104.9903),
+]
+
+STREETS = ["Pine St", "Thomas St", "Pontius Ave N", "Broadway E", "Main St", "Oak Ave", "2nd Ave", "Lake Dr"]
+
+AMENITIES = [
+    ["Parking", "Laundry"],
+    ["Parking", "Laundry", "Storage"],
+    ["Elevator", "Gym", "Rooftop Deck"],
+    ["Parking"],
+    [],
+]
+
+PROPERTY_TYPES = [
+    PropertyType.APARTMENT.value,
+    PropertyType.APARTMENT.value,
+    PropertyType.APARTMENT.value,
+    PropertyType.MIXED_USE.value,
+    PropertyType.RETAIL.value,
+    PropertyType.OFFICE.value,
+]
+
+_FIELDS = set(Property.model_fields)
+
+def _listing(values: dict) -> Property:
+    # What model_construct does, minus its per-field bookkeeping
+    listing = Property.__new__(Property)
+    object.__setattr__(listing, "__dict__", values)
+    object.__setattr__(listing, "__pydantic_fields_set__", _FIELDS)
+    object.__setattr__(listing, "__pydantic_extra__", None)
+    object.__setattr__(listing, "__pydantic_private__", None)
+    return listing
+
+def generate_listings(count: int, seed: int = 42) -> List[Property]:
+    """Deterministic synthetic listings shaped like the mock data.
+
+    Every random field is drawn for all listings at once, listings skip
+    validation, and nested objects and repeated strings are shared, so a million
+    listings fit in memory and build in about ten seconds.
+    """
+    rng = np.random.default_rng(seed)
+    coordinates = [Coordinates.model_construct(lat=lat, lng=lng) for _, _, _, lat, lng in CITIES]
+
+    cities = rng.integers(0, len(CITIES), count).tolist()
+    units = rng.integers(4, 121, count)
+    prices = np.round(units * rng.uniform(150_000, 400_000, count), -3).tolist()
+    square_footage = (units * rng.integers(600, 1101, count)).tolist()
+    units = units.tolist()
+    street_numbers = rng.integers(100, 10_000, count).tolist()
+    streets = rng.integers(0, len(STREETS), count).tolist()
+    zip_suffixes = rng.integers(0, 100, count).tolist()
+    cap_rates = np.round(rng.uniform(3.5, 8.5, count), 2).tolist()
+    property_types = rng.integers(0, len(PROPERTY_TYPES), count).tolist()
+    years_built = rng.integers(1900, 2024, count).tolist()
+    amenities = rng.integers(0, len(AMENITIES), count).tolist()
+
+    listings = []
+    for index in range(count):
+        city, state, zip_prefix, _, _ = CITIES[cities[index]]
+        listings.append(_listing({
+            "id": f"syn-{index}",
+            "price": prices[index],
+            "address": f"{street_numbers[index]} {STREETS[streets[index]]}",
+            "city": city,
+            "state": state,
+            "zip_code": f"{zip_prefix}{zip_suffixes[index]:02d}",
+            "image_url": "",
+            "units": units[index],
+            "cap_rate": cap_rates[index],
+            "property_type": PROPERTY_TYPES[property_types[index]],
+            "year_built": years_built[index],
+            "square_footage": square_footage[index],
+            "lot_size": None,
+            "description": None,
+            "amenities": AMENITIES[amenities[index]],
+            "coordinates": coordinates[cities[index]],
+        }))
+
+    return listings
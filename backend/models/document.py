@@ -2,11 +2,18 @@ from pydantic import BaseModel, Field
 from typing import Dict, List, Optional
 from datetime import datetime
 from enum import Enum
+from models.property import Property, PropertySearchFilters
 
 class DocumentType(str, Enum):
     UNDERWRITING = "underwriting"
     LOI = "loi"
 
+# OperatingExpenses fields, in the order the documents list them
+EXPENSE_CATEGORIES = ["management", "maintenance", "insurance", "taxes", "utilities", "other"]
+
+# Years covered by a CashFlowProjection
+PROJECTION_YEARS = 10
+
 class OperatingExpenses(BaseModel):
     management: float
     maintenance: float
@@ -15,6 +22,28 @@ class OperatingExpenses(BaseModel):
     utilities: float
     other: float
 
+    @property
+    def total(self) -> float:
+        return self.management + self.maintenance + self.insurance + self.taxes + self.utilities + self.other
+
+class UnderwritingAssumptions(BaseModel):
+    down_payment_percentage: float = Field(0.25, alias="downPaymentPercentage")
+    interest_rate: float = Field(6.5, alias="interestRate")
+    loan_term: int = Field(30, alias="loanTerm")
+    rent_to_price_ratio: float = Field(0.01, alias="rentToPriceRatio")
+    vacancy: float = 5.0
+    management_rate: float = Field(0.08, alias="managementRate")
+    maintenance_rate: float = Field(0.12, alias="maintenanceRate")
+    insurance_rate: float = Field(0.06, alias="insuranceRate")
+    tax_rate: float = Field(0.15, alias="taxRate")
+    utilities_rate: float = Field(0.05, alias="utilitiesRate")
+    other_rate: float = Field(0.04, alias="otherRate")
+    rent_growth: float = Field(0.03, alias="rentGrowth")
+    expense_growth: float = Field(0.02, alias="expenseGrowth")
+
+    class Config:
+        allow_population_by_field_name = True
+
 class UnderwritingCalculations(BaseModel):
     gross_rental_income: float = Field(..., alias="grossRentalIncome")
     net_operating_income: float = Field(..., alias="netOperatingIncome")
@@ -28,6 +57,19 @@ class UnderwritingCalculations(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
+class CashFlowProjection(BaseModel):
+    """Year-by-year operating projection; every list is aligned with ``years``."""
+    years: List[int]
+    rental_income: List[float] = Field(..., alias="rentalIncome")
+    operating_expenses: List[float] = Field(..., alias="operatingExpenses")
+    net_operating_income: List[float] = Field(..., alias="netOperatingIncome")
+    debt_service: List[float] = Field(..., alias="debtService")
+    cash_flow: List[float] = Field(..., alias="cashFlow")
+    cumulative_cash_flow: List[float] = Field(..., alias="cumulativeCashFlow")
+
+    class Config:
+        allow_population_by_field_name = True
+
 class UnderwritingAnalysis(BaseModel):
     property_id: str = Field(..., alias="propertyId")
     property_address: str = Field(..., alias="propertyAddress")
@@ -41,6 +83,7 @@ class UnderwritingAnalysis(BaseModel):
     vacancy: float
     operating_expenses: OperatingExpenses = Field(..., alias="operatingExpenses")
     calculations: UnderwritingCalculations
+    projection: CashFlowProjection
 
     class Config:
         allow_population_by_field_name = True
@@ -66,4 +109,85 @@ class DocumentGenerationRequest(BaseModel):
     additional_data: Optional[Dict] = Field(None, alias="additionalData")
 
     class Config:
-        allow_population_by_field_name = True
\ No newline at end of file
+        allow_population_by_field_name = True
+
+class DocumentJobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class DocumentJobRequest(BaseModel):
+    type: DocumentType
+    property_id: str = Field(..., alias="propertyId")
+    offer_price: Optional[float] = Field(None, alias="offerPrice")
+    priority: int = Field(5, ge=0, le=9)  # 0 runs first
+
+    class Config:
+        allow_population_by_field_name = True
+
+class DocumentJob(BaseModel):
+    id: str
+    type: DocumentType
+    property_id: str = Field(..., alias="propertyId")
+    offer_price: Optional[float] = Field(None, alias="offerPrice")
+    priority: int
+    status: DocumentJobStatus = DocumentJobStatus.QUEUED
+    created_at: datetime = Field(..., alias="createdAt")
+    started_at: Optional[datetime] = Field(None, alias="startedAt")
+    completed_at: Optional[datetime] = Field(None, alias="completedAt")
+    filename: Optional[str] = None
+    media_type: Optional[str] = Field(None, alias="mediaType")
+    error: Optional[str] = None
+    result_url: Optional[str] = Field(None, alias="resultUrl")
+
+    class Config:
+        allow_population_by_field_name = True
+
+class RenderedDocument(BaseModel):
+    key: str
+    digest: str
+    filename: str
+    media_type: str
+    size: int
+    last_modified: datetime
+
+class PortfolioSearch(BaseModel):
+    query: str = ""
+    filters: Optional[PropertySearchFilters] = None
+
+class PortfolioRequest(BaseModel):
+    property_ids: Optional[List[str]] = Field(None, alias="propertyIds", max_length=100)
+    search: Optional[PortfolioSearch] = None
+    include_details: bool = Field(False, alias="includeDetails")
+    assumptions: Optional[UnderwritingAssumptions] = None
+
+    class Config:
+        allow_population_by_field_name = True
+
+class BulkLOIFormat(str, Enum):
+    ZIP = "zip"
+    PDF = "pdf"
+
+class BulkLOIOffer(BaseModel):
+    property_id: str = Field(..., alias="propertyId")
+    offer_price: Optional[float] = Field(None, alias="offerPrice", gt=0)
+
+    class Config:
+        allow_population_by_field_name = True
+
+class BulkLOIRequest(BaseModel):
+    offers: List[BulkLOIOffer] = Field(..., min_length=1, max_length=100)
+    format: BulkLOIFormat = BulkLOIFormat.ZIP
+
+class WorkbookImportResult(BaseModel):
+    path: str
+    property: Optional[Property] = None
+    assumptions: Optional[UnderwritingAssumptions] = None
+    error: Optional[str] = None
+
+class WorkbookImportReport(BaseModel):
+    directory: str
+    imported: int
+    failed: int
+    results: List[WorkbookImportResult]
@@ -0,0 +1,63 @@
+import os
+from typing import Optional, Tuple
+from models.property import Property
+from models.document import UnderwritingAnalysis, UnderwritingAssumptions
+from utils.cache import LRUCache, stable_hash, property_version
+from utils.metrics import register_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AnalysisCache:
+    """Process-wide cache of computed underwriting analyses.
+
+    Entries are keyed on (property id, property version, assumptions hash), so a
+    changed listing or a different set of assumptions never reuses a stale result.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def key_for(
+        self,
+        property: Property,
+        assumptions: UnderwritingAssumptions
+    ) -> Tuple[str, str, str]:
+        return (property.id, property_version(property), stable_hash(assumptions))
+
+    def get(
+        self,
+        property: Property,
+        assumptions: UnderwritingAssumptions
+    ) -> Optional[UnderwritingAnalysis]:
+        return self._cache.get(self.key_for(property, assumptions))
+
+    def put(
+        self,
+        property: Property,
+        assumptions: UnderwritingAssumptions,
+        analysis: UnderwritingAnalysis
+    ):
+        self._cache.put(self.key_for(property, assumptions), analysis)
+
+    def invalidate_property(self, property_id: str) -> int:
+        """Drop all cached analyses for a listing."""
+        dropped = self._cache.discard_where(lambda key: key[0] == property_id)
+        if dropped:
+            logger.info(f"Invalidated {dropped} cached analyses for property {property_id}")
+        return dropped
+
+    def clear(self):
+        self._cache.clear()
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+# Shared by every DocumentService instance in this process
+analysis_cache = AnalysisCache(maxsize=int(os.getenv("ANALYSIS_CACHE_SIZE", "256")))
+register_cache("analysis", analysis_cache)
@@ -0,0 +1,278 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timezone
+from typing import BinaryIO, List, Optional
+from models.document import RenderedDocument
+from utils.cache import LRUCache
+from utils.metrics import register_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the Excel/PDF layouts change so previously rendered files are not reused
+TEMPLATE_VERSION = "2"
+
+class DocumentCache:
+    """Content-addressed store of rendered documents with a memory and a disk tier.
+
+    A render key (hash of template version, document type, property version,
+    assumptions and offer price) maps to the SHA-256 digest of the rendered bytes.
+    Bytes live under ``objects/<digest>`` on disk and the hottest ones are also
+    kept in memory, bounded by ``memory_bytes``. The digest doubles as the ETag.
+
+    The disk tier is bounded by ``disk_bytes``: once a store pushes it over,
+    the least recently used objects are removed until it is back under 90% of
+    the limit, along with the keys that pointed at them. Render keys change
+    every day, so without this the directory would only ever grow.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        memory_bytes: Optional[int] = None,
+        disk_bytes: Optional[int] = None
+    ):
+        self.directory = directory or os.getenv(
+            "DOCUMENT_CACHE_DIR",
+            os.path.join(tempfile.gettempdir(), "rets-document-cache")
+        )
+        memory_bytes = memory_bytes or int(os.getenv("DOCUMENT_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+        self.disk_bytes = disk_bytes or int(os.getenv("DOCUMENT_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+
+        self._documents = LRUCache(maxsize=4096)
+        self._contents = LRUCache(maxsize=4096, max_weight=memory_bytes, weigh=len)
+        # Disk I/O runs in worker threads, so the memory tier is guarded by a lock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Bytes under objects/ as of the last sweep plus what this process stored since; None until first needed
+        self._disk_usage: Optional[int] = None
+        self._sweep_lock = threading.Lock()
+
+        os.makedirs(os.path.join(self.directory, "keys"), exist_ok=True)
+        os.makedirs(os.path.join(self.directory, "objects"), exist_ok=True)
+
+    @staticmethod
+    def render_key(
+        document_type: str,
+        property_version: str,
+        assumptions_hash: Optional[str] = None,
+        offer_price: Optional[float] = None,
+        variant: str = "values"
+    ) -> str:
+        # Documents embed the render date (LOI date, closing date, filename), so it is part of the key
+        parts = [
+            TEMPLATE_VERSION,
+            document_type,
+            variant,
+            property_version,
+            assumptions_hash or "",
+            offer_price,
+            date.today().isoformat(),
+        ]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Optional[RenderedDocument]:
+        """Return metadata for a previously rendered document, if any."""
+
+        with self._lock:
+            document = self._documents.get(key)
+            # Another worker sharing the directory may have evicted the object since
+            if document is not None and (
+                document.digest in self._contents or os.path.exists(self.object_path(document))
+            ):
+                self.hits += 1
+                return document
+
+        try:
+            with open(self._key_path(key), "r") as f:
+                document = RenderedDocument.model_validate_json(f.read())
+        except FileNotFoundError:
+            document = None
+
+        if document is None or not os.path.exists(self.object_path(document)):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._documents.put(key, document)
+            self.hits += 1
+        return document
+
+    def peek(self, document: RenderedDocument) -> Optional[bytes]:
+        """Return the document bytes only if they are already held in memory."""
+        with self._lock:
+            return self._contents.get(document.digest)
+
+    def read(self, document: RenderedDocument) -> Optional[bytes]:
+        """Return the document bytes from memory, falling back to disk."""
+
+        with self._lock:
+            content = self._contents.get(document.digest)
+        if content is not None:
+            return content
+
+        object_path = self.object_path(document)
+        try:
+            with open(object_path, "rb") as f:
+                content = f.read()
+            # The sweep evicts by modification time, so a read counts as a use
+            os.utime(object_path)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            self._contents.put(document.digest, content)
+        return content
+
+    def open_file(self, document: RenderedDocument) -> Optional[BinaryIO]:
+        """Open the document's file on disk for reading, or return None if it has been evicted.
+
+        Once open, the bytes stay readable even if a sweep removes the file.
+        """
+
+        object_path = self.object_path(document)
+        try:
+            file = open(object_path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(object_path)
+        except FileNotFoundError:
+            pass
+        return file
+
+    def store(self, key: str, content: bytes, filename: str, media_type: str) -> RenderedDocument:
+        """Store rendered bytes under their digest and map key to them."""
+
+        digest = hashlib.sha256(content).hexdigest()
+        document = RenderedDocument(
+            key=key,
+            digest=digest,
+            filename=filename,
+            media_type=media_type,
+            size=len(content),
+            last_modified=datetime.now(timezone.utc).replace(microsecond=0)
+        )
+
+        object_path = self.object_path(document)
+        written = 0
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            self._write_atomic(object_path, content)
+            written = len(content)
+        self._write_atomic(self._key_path(key), document.model_dump_json().encode("utf-8"))
+
+        with self._lock:
+            self._documents.put(key, document)
+            self._contents.put(digest, content)
+
+        self._account(written)
+        return document
+
+    def _account(self, written: int):
+        with self._sweep_lock:
+            if self._disk_usage is None:
+                self._disk_usage = self._object_usage()
+            else:
+                self._disk_usage += written
+            if self._disk_usage > self.disk_bytes:
+                self._disk_usage = self._sweep()
+
+    def _object_usage(self) -> int:
+        total = 0
+        for entry in self._object_entries():
+            try:
+                total += entry.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def _object_entries(self):
+        objects_dir = os.path.join(self.directory, "objects")
+        for shard in os.scandir(objects_dir):
+            if shard.is_dir():
+                yield from (entry for entry in os.scandir(shard.path) if not entry.name.endswith(".partial"))
+
+    def _sweep(self) -> int:
+        """Evict the least recently used objects until the disk tier is under 90% of its limit.
+
+        Other workers share the directory, so usage is recounted from disk
+        rather than trusted from this process's own tally. Returns the new usage.
+        """
+
+        objects = []
+        for entry in self._object_entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            objects.append((stat.st_mtime, stat.st_size, entry.path))
+
+        usage = sum(size for _, size, _ in objects)
+        target = int(self.disk_bytes * 0.9)
+        evicted = set()
+        for _, size, path in sorted(objects):
+            if usage <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            usage -= size
+            evicted.add(os.path.basename(path))
+
+        if evicted:
+            keys = self._remove_keys(evicted)
+            with self._lock:
+                for digest in evicted:
+                    self._contents.pop(digest)
+                for key in keys:
+                    self._documents.pop(key)
+            logger.info(f"Evicted {len(evicted)} rendered documents from {self.directory}")
+        return usage
+
+    def _remove_keys(self, digests: set) -> List[str]:
+        # Keys are small, but one is left behind for every render; drop those whose object is gone
+        removed = []
+        for entry in os.scandir(os.path.join(self.directory, "keys")):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, "r") as f:
+                    digest = json.loads(f.read()).get("digest")
+            except (FileNotFoundError, ValueError):
+                continue
+            if digest in digests:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+                removed.append(entry.name[:-len(".json")])
+        return removed
+
+    def object_path(self, document: RenderedDocument) -> str:
+        return os.path.join(self.directory, "objects", document.digest[:2], document.digest)
+
+    def _key_path(self, key: str) -> str:
+        return os.path.join(self.directory, "keys", f"{key}.json")
+
+    def _write_atomic(self, path: str, data: bytes):
+        fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".partial")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(partial_path, path)
+
+_document_cache: Optional[DocumentCache] = None
+
+def get_document_cache() -> DocumentCache:
+    """Return the process-wide document cache, creating it on first use."""
+    global _document_cache
+    if _document_cache is None:
+        _document_cache = DocumentCache()
+        register_cache("document", _document_cache)
+    return _document_cache
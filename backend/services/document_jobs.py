@@ -0,0 +1,352 @@
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from models.document import DocumentJob, DocumentJobRequest, DocumentJobStatus, DocumentType
+from services.document_service import DocumentService
+from services.property_service import PropertyService
+from utils.cache import stable_hash
+from utils.tracing import current_traceparent, span
+import logging
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = (DocumentJobStatus.COMPLETED, DocumentJobStatus.FAILED)
+
+# How often a subscriber re-reads the record of a job another process is rendering
+RECORD_POLL_INTERVAL = 0.5
+
+class DocumentJobQueue:
+    """Background document rendering with status polling and a shared result store.
+
+    Jobs are rendered by a fixed number of worker tasks in priority order. A job
+    identical to one that is still queued or running is not rendered twice: the
+    caller gets the in-flight job back instead. Finished results are written to
+    ``result_dir`` and removed, along with their job records, after ``result_ttl``.
+
+    Each job's record is also written as JSON next to its result, and an
+    in-flight job claims a marker under ``inflight/``, so the workers of
+    app.server, which share ``result_dir``, see each other's jobs: a job can be
+    polled, streamed and downloaded through any worker, and is deduplicated
+    across all of them. Jobs run on the worker that accepted them.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        result_dir: Optional[str] = None,
+        result_ttl: Optional[int] = None
+    ):
+        self.concurrency = concurrency or int(os.getenv("DOCUMENT_JOB_CONCURRENCY", "4"))
+        self.result_dir = result_dir or os.getenv(
+            "DOCUMENT_RESULT_DIR",
+            os.path.join(tempfile.gettempdir(), "rets-documents")
+        )
+        self.result_ttl = timedelta(seconds=result_ttl or int(os.getenv("DOCUMENT_RESULT_TTL", "3600")))
+
+        self._jobs: Dict[str, DocumentJob] = {}
+        self._inflight: Dict[Tuple, str] = {}
+        self._updates: Dict[str, asyncio.Event] = {}
+        # Workers run outside the submitting request's context, so each job carries its trace
+        self._traceparents: Dict[str, Optional[str]] = {}
+        # Created up front so jobs submitted before start() are queued rather than lost
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._tasks = []
+
+        os.makedirs(os.path.join(self.result_dir, "inflight"), exist_ok=True)
+
+    async def start(self):
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"document-job-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._cleanup_loop(), name="document-job-cleanup"))
+        logger.info(f"Document job queue started with {self.concurrency} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, request: DocumentJobRequest) -> DocumentJob:
+        """Queue a document render, or return the identical job already in flight."""
+
+        key = self._job_key(request)
+        existing_id = self._inflight.get(key)
+        if existing_id is not None:
+            logger.info(f"Deduplicated document job onto in-flight job {existing_id}")
+            return self._jobs[existing_id]
+
+        job = DocumentJob(
+            id=uuid.uuid4().hex,
+            type=request.type,
+            propertyId=request.property_id,
+            offerPrice=request.offer_price,
+            priority=request.priority,
+            createdAt=datetime.now()
+        )
+        await asyncio.to_thread(self._write_record, job)
+        existing = await asyncio.to_thread(self._claim, key, job.id)
+        if existing is not None:
+            # Another worker is already rendering it
+            await asyncio.to_thread(self._remove_results, [self._record_path(job.id)])
+            logger.info(f"Deduplicated document job onto in-flight job {existing.id}")
+            return existing
+
+        self._jobs[job.id] = job
+        self._inflight[key] = job.id
+        self._updates[job.id] = asyncio.Event()
+        self._traceparents[job.id] = current_traceparent()
+
+        await self._queue.put((request.priority, next(self._sequence), job.id))
+
+        return job
+
+    async def get(self, job_id: str) -> Optional[DocumentJob]:
+        """Return a job accepted by this process or, failing that, by another worker."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = await asyncio.to_thread(self._read_record, job_id)
+        return job
+
+    def result_path(self, job: DocumentJob) -> str:
+        extension = "xlsx" if job.type == DocumentType.UNDERWRITING else "pdf"
+        return os.path.join(self.result_dir, f"{job.id}.{extension}")
+
+    async def wait_for_update(
+        self,
+        job_id: str,
+        seen_status: DocumentJobStatus,
+        timeout: float
+    ) -> Optional[DocumentJob]:
+        """Wait until the job's status differs from ``seen_status`` (or timeout elapses) and return it.
+
+        The caller passes the status it last saw rather than relying on the
+        wake-up alone, so a change made while it was busy elsewhere (say,
+        suspended writing to a client) is returned at once instead of missed.
+        """
+
+        job = self._jobs.get(job_id)
+        if job is None:
+            return await self._poll_record(job_id, seen_status, timeout)
+
+        event = self._updates.get(job_id)
+        if job.status != seen_status or event is None:
+            return job
+
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        return self._jobs.get(job_id)
+
+    async def _poll_record(
+        self,
+        job_id: str,
+        seen_status: DocumentJobStatus,
+        timeout: float
+    ) -> Optional[DocumentJob]:
+        # Another worker owns the job and can't signal this process, so watch its record instead
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await asyncio.to_thread(self._read_record, job_id)
+            time_left = deadline - time.monotonic()
+            if job is None or job.status != seen_status or time_left <= 0:
+                return job
+            await asyncio.sleep(min(RECORD_POLL_INTERVAL, time_left))
+
+    def _job_key(self, request: DocumentJobRequest) -> Tuple:
+        return (request.type.value, request.property_id, request.offer_price)
+
+    async def _update(self, job: DocumentJob, **changes) -> DocumentJob:
+        updated = job.model_copy(update=changes)
+        self._jobs[job.id] = updated
+
+        # Wake current subscribers and arm a fresh event for the next change
+        event = self._updates.get(job.id)
+        if event is not None:
+            self._updates[job.id] = asyncio.Event()
+            event.set()
+
+        await asyncio.to_thread(self._write_record, updated)
+        return updated
+
+    def _record_path(self, job_id: str) -> str:
+        return os.path.join(self.result_dir, f"{job_id}.json")
+
+    def _marker_path(self, key: Tuple) -> str:
+        return os.path.join(self.result_dir, "inflight", stable_hash(list(key)))
+
+    def _write_record(self, job: DocumentJob):
+        self._write_result(self._record_path(job.id), job.model_dump_json(by_alias=True).encode("utf-8"))
+
+    def _read_record(self, job_id: str) -> Optional[DocumentJob]:
+        # Job IDs come from URLs; anything that isn't one of ours can't name a record
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._record_path(job_id), "rb") as f:
+                return DocumentJob.model_validate_json(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _claim(self, key: Tuple, job_id: str) -> Optional[DocumentJob]:
+        """Mark ``job_id`` as the in-flight job for ``key`` across workers.
+
+        Returns the job another worker already has in flight for the key
+        instead, if any. A marker whose job has finished, vanished or outlived
+        ``result_ttl`` (its worker died) is taken over.
+        """
+
+        marker_path = self._marker_path(key)
+        while True:
+            try:
+                fd = os.open(marker_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                try:
+                    with open(marker_path, "r") as f:
+                        existing_id = f.read().strip()
+                    age = time.time() - os.path.getmtime(marker_path)
+                except FileNotFoundError:
+                    continue
+                existing = self._read_record(existing_id) if existing_id else None
+                if (
+                    existing is not None
+                    and existing.status not in TERMINAL_STATUSES
+                    and age < self.result_ttl.total_seconds()
+                ):
+                    return existing
+                self._remove_results([marker_path])
+                continue
+
+            with os.fdopen(fd, "w") as f:
+                f.write(job_id)
+            return None
+
+    def _release_claim(self, key: Tuple, job_id: str):
+        marker_path = self._marker_path(key)
+        try:
+            with open(marker_path, "r") as f:
+                owner = f.read().strip()
+        except FileNotFoundError:
+            return
+        if owner == job_id:
+            self._remove_results([marker_path])
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                with span("document job", parent=self._traceparents.pop(job_id, None), job_id=job_id):
+                    await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+
+        job = await self._update(job, status=DocumentJobStatus.RUNNING, started_at=datetime.now())
+        key = (job.type.value, job.property_id, job.offer_price)
+
+        try:
+            property = await PropertyService().get_property_by_id(job.property_id)
+            if not property:
+                raise LookupError(f"Property {job.property_id} not found")
+
+            document_service = DocumentService()
+            document = await document_service.render_document(property, job.type.value, job.offer_price)
+            content = await document_service.read_document(document)
+
+            await asyncio.to_thread(self._write_result, self.result_path(job), content)
+
+            await self._update(
+                job,
+                status=DocumentJobStatus.COMPLETED,
+                completed_at=datetime.now(),
+                filename=document.filename,
+                media_type=document.media_type,
+                result_url=f"/api/documents/jobs/{job.id}/result"
+            )
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Document job {job.id} failed: {e}")
+            await self._update(job, status=DocumentJobStatus.FAILED, completed_at=datetime.now(), error=str(e))
+        finally:
+            self._inflight.pop(key, None)
+            await asyncio.to_thread(self._release_claim, key, job.id)
+
+    def _write_result(self, path: str, data) -> None:
+        # Write then rename so readers never see a partially written file
+        partial_path = f"{path}.partial"
+        with open(partial_path, "wb") as f:
+            f.write(data)
+        os.replace(partial_path, path)
+
+    async def _cleanup_loop(self):
+        interval = max(self.result_ttl.total_seconds() / 4, 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._cleanup_expired()
+            except Exception as e:
+                logger.error(f"Document result cleanup error: {e}")
+
+    async def _cleanup_expired(self):
+        cutoff = datetime.now() - self.result_ttl
+        expired = [
+            job for job in self._jobs.values()
+            if job.status in TERMINAL_STATUSES and job.completed_at and job.completed_at < cutoff
+        ]
+
+        for job in expired:
+            self._jobs.pop(job.id, None)
+            self._updates.pop(job.id, None)
+
+        await asyncio.to_thread(
+            self._remove_results,
+            [path for job in expired for path in (self.result_path(job), self._record_path(job.id))]
+        )
+        # Results and records left behind by workers that have since gone away
+        orphaned = await asyncio.to_thread(self._remove_older_than, time.time() - self.result_ttl.total_seconds())
+
+        if expired or orphaned:
+            logger.info(f"Removed {len(expired) + orphaned} expired document results")
+
+    def _remove_results(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _remove_older_than(self, cutoff: float) -> int:
+        removed = 0
+        for directory in (self.result_dir, os.path.join(self.result_dir, "inflight")):
+            for entry in os.scandir(directory):
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += entry.name.endswith(".json")
+                except FileNotFoundError:
+                    pass
+        return removed
+
+_job_queue: Optional[DocumentJobQueue] = None
+
+def get_document_job_queue() -> DocumentJobQueue:
+    """Return the process-wide document job queue, creating it on first use."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = DocumentJobQueue()
+    return _job_queue
@@ -1,103 +1,73 @@
 import asyncio
+from contextlib import aclosing
 from datetime import datetime, timedelta
-from typing import Tuple
+from typing import AsyncIterator, BinaryIO, List, Optional, Tuple, Union
 from io import BytesIO
 from models.property import Property
-from models.document import UnderwritingAnalysis, LOIDetails, OperatingExpenses, UnderwritingCalculations
-from utils.excel_generator import ExcelGenerator
-from utils.pdf_generator import PDFGenerator
+from models.document import EXPENSE_CATEGORIES, UnderwritingAnalysis, UnderwritingAssumptions, LOIDetails, RenderedDocument
+from services.analysis_cache import analysis_cache
+from services.document_cache import get_document_cache
+from services.property_service import get_property_assumptions
+from services.render_executor import get_render_executor
+from services.underwriting import calculate_underwriting
+from utils.cache import stable_hash, property_version
+from utils.single_flight import SingleFlight
+from utils.tracing import traced
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Concurrent requests for the same analysis or document share one computation or render
+_analysis_calls = SingleFlight("underwriting_analysis")
+_render_calls = SingleFlight("render")
+
+MEDIA_TYPES = {
+    "underwriting": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "loi": "application/pdf",
+}
+
 class DocumentService:
     def __init__(self):
-        self.excel_generator = ExcelGenerator()
-        self.pdf_generator = PDFGenerator()
+        self.render_executor = get_render_executor()
+        self.document_cache = get_document_cache()
     
-    async def generate_underwriting_analysis(self, property: Property) -> UnderwritingAnalysis:
-        """Generate realistic underwriting analysis based on property data."""
+    @traced()
+    async def get_underwriting_analysis(
+        self,
+        property: Property,
+        assumptions: Optional[UnderwritingAssumptions] = None
+    ) -> UnderwritingAnalysis:
+        """Return the underwriting analysis for a property, computing it at most once per version."""
         
-        # Simulate processing time
-        await asyncio.sleep(2)
+        assumptions = assumptions or get_property_assumptions(property.id)
         
-        # Calculate realistic financial metrics
-        purchase_price = property.price
-        down_payment_percentage = 0.25  # 25% down payment
-        down_payment = purchase_price * down_payment_percentage
-        loan_amount = purchase_price - down_payment
-        interest_rate = 6.5  # 6.5% interest rate
-        loan_term = 30  # 30-year loan
-        
-        # Estimate monthly rent using 1% rule (adjustable based on market)
-        monthly_rent = purchase_price * 0.01
-        annual_rent = monthly_rent * 12
-        vacancy = 5.0  # 5% vacancy rate
-        effective_gross_income = annual_rent * (1 - vacancy / 100)
-        
-        # Calculate operating expenses (typically 40-50% of gross income)
-        operating_expenses = OperatingExpenses(
-            management=effective_gross_income * 0.08,  # 8% management fee
-            maintenance=effective_gross_income * 0.12,  # 12% maintenance
-            insurance=effective_gross_income * 0.06,   # 6% insurance  
-            taxes=effective_gross_income * 0.15,       # 15% property taxes
-            utilities=effective_gross_income * 0.05,   # 5% utilities
-            other=effective_gross_income * 0.04        # 4% other expenses
-        )
+        analysis = analysis_cache.get(property, assumptions)
+        if analysis is not None:
+            return analysis
         
-        total_operating_expenses = (
-            operating_expenses.management +
-            operating_expenses.maintenance +
-            operating_expenses.insurance +
-            operating_expenses.taxes +
-            operating_expenses.utilities +
-            operating_expenses.other
-        )
+        async def compute() -> UnderwritingAnalysis:
+            analysis = await self.generate_underwriting_analysis(property, assumptions)
+            analysis_cache.put(property, assumptions, analysis)
+            return analysis
         
-        net_operating_income = effective_gross_income - total_operating_expenses
-        
-        # Calculate debt service
-        monthly_rate = interest_rate / 100 / 12
-        number_of_payments = loan_term * 12
-        monthly_debt_service = loan_amount * (
-            monthly_rate * (1 + monthly_rate) ** number_of_payments
-        ) / ((1 + monthly_rate) ** number_of_payments - 1)
-        
-        annual_debt_service = monthly_debt_service * 12
-        
-        # Calculate returns and cash flow
-        annual_cash_flow = net_operating_income - annual_debt_service
-        monthly_cash_flow = annual_cash_flow / 12
-        cap_rate = (net_operating_income / purchase_price) * 100
-        cash_on_cash_return = (annual_cash_flow / down_payment) * 100
-        debt_service_coverage = net_operating_income / annual_debt_service
-        
-        calculations = UnderwritingCalculations(
-            grossRentalIncome=annual_rent,
-            netOperatingIncome=net_operating_income,
-            capRate=cap_rate,
-            cashOnCashReturn=cash_on_cash_return,
-            debtServiceCoverage=debt_service_coverage,
-            monthlyDebtService=monthly_debt_service,
-            monthlyCashFlow=monthly_cash_flow,
-            annualCashFlow=annual_cash_flow
-        )
+        return await _analysis_calls.do(analysis_cache.key_for(property, assumptions), compute)
+    
+    @traced()
+    async def generate_underwriting_analysis(
+        self,
+        property: Property,
+        assumptions: Optional[UnderwritingAssumptions] = None
+    ) -> UnderwritingAnalysis:
+        """Generate realistic underwriting analysis based on property data."""
         
-        return UnderwritingAnalysis(
-            propertyId=property.id,
-            propertyAddress=property.address,
-            analysisDate=datetime.now(),
-            purchasePrice=purchase_price,
-            downPayment=down_payment,
-            loanAmount=loan_amount,
-            interestRate=interest_rate,
-            loanTerm=loan_term,
-            monthlyRent=monthly_rent,
-            vacancy=vacancy,
-            operatingExpenses=operating_expenses,
-            calculations=calculations
-        )
+        assumptions = assumptions or UnderwritingAssumptions()
+        
+        # Simulate processing time
+        await asyncio.sleep(2)
+        
+        return calculate_underwriting(property, assumptions)
     
+    @traced()
     async def generate_loi_details(
         self, 
         property: Property, 
@@ -129,19 +99,29 @@ class DocumentService:
             buyerContact="contact@investmentgroup.com"
         )
     
+    @traced()
     async def generate_underwriting_document(
         self, 
-        property: Property
+        property: Property,
+        assumptions: Optional[UnderwritingAssumptions] = None,
+        live_formulas: bool = False
     ) -> Tuple[BytesIO, str]:
-        """Generate underwriting Excel document."""
+        """Generate underwriting Excel document.
         
-        logger.info(f"Generating underwriting document for property {property.id}")
+        With live_formulas the workbook holds numeric inputs and Excel formulas
+        instead of precomputed values, so it recalculates client-side.
+        """
         
-        # Generate analysis
-        analysis = await self.generate_underwriting_analysis(property)
+        logger.info(f"Generating underwriting document for property {property.id}")
         
-        # Generate Excel file
-        excel_buffer = self.excel_generator.generate_underwriting_excel(property, analysis)
+        if live_formulas:
+            excel_buffer = await self.render_executor.render_underwriting_formulas(property, assumptions)
+        else:
+            # Reuse the analysis computed for the preview when available
+            analysis = await self.get_underwriting_analysis(property, assumptions)
+            
+            # Render the Excel file on the worker pool
+            excel_buffer = await self.render_executor.render_underwriting(property, analysis)
         
         # Create filename
         safe_address = property.address.replace(" ", "_").replace(",", "").replace("/", "_")
@@ -149,6 +129,7 @@ class DocumentService:
         
         return excel_buffer, filename
     
+    @traced()
     async def generate_loi_document(
         self, 
         property: Property, 
@@ -161,8 +142,8 @@ class DocumentService:
         # Generate LOI details
         loi_details = await self.generate_loi_details(property, offer_price)
         
-        # Generate PDF file
-        pdf_buffer = self.pdf_generator.generate_loi_pdf(property, loi_details)
+        # Render the PDF file on the worker pool
+        pdf_buffer = await self.render_executor.render_loi(property, loi_details)
         
         # Create filename
         safe_address = property.address.replace(" ", "_").replace(",", "").replace("/", "_")
@@ -170,6 +151,153 @@ class DocumentService:
         
         return pdf_buffer, filename
     
+    @traced()
+    async def generate_portfolio_document(
+        self,
+        properties: List[Property],
+        assumptions: Optional[UnderwritingAssumptions] = None,
+        include_details: bool = False
+    ) -> Tuple[BytesIO, str]:
+        """Generate a portfolio comparison Excel document for many properties."""
+        
+        logger.info(f"Generating portfolio document for {len(properties)} properties")
+        
+        excel_buffer = await self.render_executor.render_portfolio(properties, assumptions, include_details)
+        filename = f"Portfolio_{len(properties)}_Properties_{datetime.now().strftime('%Y%m%d')}.xlsx"
+        
+        return excel_buffer, filename
+    
+    @traced()
+    async def render_document(
+        self,
+        property: Property,
+        document_type: str,
+        offer_price: float = None,
+        assumptions: Optional[UnderwritingAssumptions] = None,
+        live_formulas: bool = False
+    ) -> RenderedDocument:
+        """Return a rendered document, rendering it only if no cached copy exists.
+        
+        Concurrent requests for the same document wait for a single render.
+        """
+        
+        if document_type not in MEDIA_TYPES:
+            raise ValueError(f"Invalid document type: {document_type}")
+        
+        assumptions = assumptions or get_property_assumptions(property.id)
+        key = self.document_cache.render_key(
+            document_type,
+            property_version(property),
+            stable_hash(assumptions) if document_type == "underwriting" else None,
+            offer_price,
+            variant="formulas" if live_formulas else "values"
+        )
+        
+        return await _render_calls.do(
+            key,
+            lambda: self._render_document(key, property, document_type, offer_price, assumptions, live_formulas)
+        )
+    
+    async def _render_document(
+        self,
+        key: str,
+        property: Property,
+        document_type: str,
+        offer_price: Optional[float],
+        assumptions: UnderwritingAssumptions,
+        live_formulas: bool
+    ) -> RenderedDocument:
+        document = await asyncio.to_thread(self.document_cache.lookup, key)
+        if document is not None:
+            logger.info(f"Serving cached {document_type} document for property {property.id}")
+            return document
+        
+        if document_type == "underwriting":
+            document_buffer, filename = await self.generate_underwriting_document(
+                property,
+                assumptions,
+                live_formulas
+            )
+        else:
+            document_buffer, filename = await self.generate_loi_document(property, offer_price)
+        
+        return await asyncio.to_thread(
+            self.document_cache.store,
+            key,
+            document_buffer.getvalue(),
+            filename,
+            MEDIA_TYPES[document_type]
+        )
+    
+    async def render_loi_batch(
+        self,
+        offers: List[Tuple[Property, Optional[float]]]
+    ) -> AsyncIterator[Tuple[int, Union[Tuple[RenderedDocument, bytes], Exception]]]:
+        """Render many LOIs concurrently, yielding (index, outcome) as each one finishes.
+        
+        The outcome is the rendered document and its bytes, or the exception that
+        rendering raised, so one failed LOI doesn't sink the rest. Renders still
+        pending when the caller stops iterating are cancelled.
+        """
+        
+        async def render(index: int, property: Property, offer_price: Optional[float]):
+            try:
+                document = await self.render_document(property, "loi", offer_price)
+                return index, (document, await self.read_document(document))
+            except Exception as e:
+                logger.error(f"LOI render failed for property {property.id}: {e}")
+                return index, e
+        
+        tasks = [
+            asyncio.create_task(render(index, property, offer_price))
+            for index, (property, offer_price) in enumerate(offers)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let the cancelled renders unwind before the caller moves on
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    @traced()
+    async def generate_merged_loi_document(
+        self,
+        offers: List[Tuple[Property, Optional[float]]]
+    ) -> Tuple[BytesIO, str]:
+        """Render many LOIs in parallel and merge them, in request order, into one PDF."""
+        
+        logger.info(f"Generating merged LOI document for {len(offers)} offers")
+        
+        contents: List[Optional[bytes]] = [None] * len(offers)
+        async with aclosing(self.render_loi_batch(offers)) as outcomes:
+            async for index, outcome in outcomes:
+                if isinstance(outcome, Exception):
+                    raise outcome
+                contents[index] = outcome[1]
+        
+        pdf_buffer = await self.render_executor.merge_pdfs(contents)
+        filename = f"LOIs_{len(offers)}_Properties_{datetime.now().strftime('%Y%m%d')}.pdf"
+        
+        return pdf_buffer, filename
+    
+    @traced()
+    async def read_document(self, document: RenderedDocument) -> Optional[bytes]:
+        """Read the bytes of a rendered document from the cache."""
+        return await asyncio.to_thread(self.document_cache.read, document)
+    
+    async def open_document(self, document: RenderedDocument) -> Tuple[Optional[bytes], Optional[BinaryIO]]:
+        """Return the in-memory bytes of a rendered document if hot, else its file opened for reading.
+        
+        Both are None when the document has been evicted since it was looked up.
+        """
+        content = self.document_cache.peek(document)
+        if content is not None:
+            return content, None
+        return None, await asyncio.to_thread(self.document_cache.open_file, document)
+    
+    @traced()
     async def get_document_preview_data(
         self, 
         property: Property, 
@@ -178,14 +306,14 @@ class DocumentService:
         """Get data for document preview in the UI."""
         
         if document_type == "underwriting":
-            analysis = await self.generate_underwriting_analysis(property)
+            analysis = await self.get_underwriting_analysis(property)
             
             # Generate chart data for UI display
             chart_data = self._generate_chart_data(analysis)
             
             return {
-                "property": property.dict(),
-                "analysis": analysis.dict(),
+                "property": property.model_dump(),
+                "analysis": analysis.model_dump(),
                 "chartData": chart_data
             }
             
@@ -193,8 +321,8 @@ class DocumentService:
             loi_details = await self.generate_loi_details(property)
             
             return {
-                "property": property.dict(),
-                "loiDetails": loi_details.dict()
+                "property": property.model_dump(),
+                "loiDetails": loi_details.model_dump()
             }
         
         else:
@@ -203,27 +331,14 @@ class DocumentService:
     def _generate_chart_data(self, analysis: UnderwritingAnalysis) -> dict:
         """Generate chart data for UI visualization."""
         
-        # 10-year cash flow projection
-        cash_flow_labels = [f"Year {i+1}" for i in range(10)]
-        cash_flow_data = []
-        
-        base_cash_flow = analysis.calculations.annual_cash_flow
-        growth_rate = 0.03  # 3% annual growth
-        
-        for year in range(10):
-            projected_cf = base_cash_flow * (1 + growth_rate) ** year
-            cash_flow_data.append(round(projected_cf))
+        # 10-year cash flow projection, as computed with the analysis
+        projection = analysis.projection
+        cash_flow_labels = [f"Year {year}" for year in projection.years]
+        cash_flow_data = [round(value) for value in projection.cash_flow]
         
         # Operating expenses breakdown
         expenses_labels = ["Management", "Maintenance", "Insurance", "Taxes", "Utilities", "Other"]
-        expenses_data = [
-            analysis.operating_expenses.management,
-            analysis.operating_expenses.maintenance,
-            analysis.operating_expenses.insurance,
-            analysis.operating_expenses.taxes,
-            analysis.operating_expenses.utilities,
-            analysis.operating_expenses.other
-        ]
+        expenses_data = [getattr(analysis.operating_expenses, category) for category in EXPENSE_CATEGORIES]
         
         return {
             "cashFlow": {
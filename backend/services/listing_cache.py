@@ -0,0 +1,74 @@
+import os
+from typing import Dict, List, Optional, Tuple
+import orjson
+from models.property import Property
+from utils.metrics import register_cache
+
+class ListingJSONCache:
+    """Process-wide cache of each listing's encoded JSON, as the API returns it.
+
+    Search and list responses are assembled by joining these fragments, so a
+    listing is serialized once per version instead of once per response. Entries
+    are keyed by listing ID and remember the exact Property they were encoded
+    from, so a replaced listing is re-encoded even before it is invalidated.
+    With the in-process store there is one entry per listing, so by default the
+    cache needs no eviction; when listings come from a shared snapshot that may
+    be far larger than what one worker touches, ``maxsize`` (LISTING_JSON_CACHE_SIZE)
+    bounds it and the oldest entries go first.
+    """
+
+    def __init__(self, maxsize: Optional[int] = None):
+        self._entries: Dict[str, Tuple[Property, bytes]] = {}
+        self.maxsize = maxsize if maxsize is not None else int(os.getenv("LISTING_JSON_CACHE_SIZE", "0"))
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, property: Property, fragment: bytes) -> Tuple[Property, bytes]:
+        entry = (property, fragment)
+        self._entries.pop(property.id, None)
+        self._entries[property.id] = entry
+        if self.maxsize and len(self._entries) > self.maxsize:
+            del self._entries[next(iter(self._entries))]
+        return entry
+
+    def _encode(self, property: Property) -> Tuple[Property, bytes]:
+        self.misses += 1
+        return self._store(property, property.model_dump_json(by_alias=True).encode("utf-8"))
+
+    def prime(self, property: Property, fragment: bytes):
+        """Record a listing's JSON that is already known, e.g. read from a listing snapshot."""
+        self._store(property, fragment)
+
+    def encode_properties(self, properties: List[Property]) -> bytes:
+        """The JSON array of listings."""
+        entries = self._entries
+        misses = self.misses
+        fragments = []
+        for property in properties:
+            entry = entries.get(property.id)
+            if entry is None or entry[0] is not property:
+                entry = self._encode(property)
+            fragments.append(entry[1])
+        self.hits += len(properties) - (self.misses - misses)
+        return b"[" + b",".join(fragments) + b"]"
+
+    @staticmethod
+    def wrap_search_result(properties_json: bytes, total_count: int, search_query: str) -> bytes:
+        """A search result around an already encoded JSON array of its listings,
+        byte for byte as ``PropertySearchResult.model_dump_json(by_alias=True)``."""
+        return (
+            b'{"properties":' + properties_json
+            + b',"totalCount":' + orjson.dumps(total_count)
+            + b',"searchQuery":' + orjson.dumps(search_query)
+            + b"}"
+        )
+
+    def invalidate_property(self, property_id: str):
+        self._entries.pop(property_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+# Shared by every request in this process
+listing_json_cache = ListingJSONCache()
+register_cache("listing_json", listing_json_cache)
@@ -0,0 +1,434 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import orjson
+from models.property import Property, PropertyType
+from models.document import UnderwritingAssumptions
+from services.listing_cache import listing_json_cache
+from utils.cache import LRUCache
+from utils.metrics import register_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RETSNAP1"
+ALIGNMENT = 64
+PROPERTY_TYPES = list(PropertyType)
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "publish.lock"
+
+def _id_hash(property_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(property_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _search_text(property: Property) -> bytes:
+    # The fields the location filter matches, NUL-separated so a match can't span two of them
+    return f"{property.city.lower()}\0{property.address.lower()}\0{property.state.lower()}\0".encode("utf-8")
+
+def _fragment(property: Property) -> bytes:
+    return property.model_dump_json(by_alias=True).encode("utf-8")
+
+def _offsets(lengths: np.ndarray) -> np.ndarray:
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+class ListingSnapshot:
+    """One immutable generation of the listing store, read through a shared memory map.
+
+    The file holds fixed-width columns for every filterable field, each
+    listing's API JSON, the lowercased text the location filter matches and a
+    sorted ID hash index. Every worker maps the same file, so the pages are
+    shared through the OS page cache instead of copied into each process; a
+    worker only keeps the Property objects it has recently decoded.
+    """
+
+    def __init__(self, path: str, decode_cache_size: Optional[int] = None):
+        self.path = path
+        self.generation = os.path.basename(path)
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a listing snapshot")
+
+        header_length = int.from_bytes(self._map[8:16], "little")
+        header = orjson.loads(self._map[16:16 + header_length])
+        self.count: int = header["count"]
+        self.created: float = header["created"]
+        self._sections: Dict[str, Tuple[int, int, str]] = {
+            name: tuple(section) for name, section in header["sections"].items()
+        }
+
+        self.price = self._column("price")
+        self.cap_rate = self._column("cap_rate")
+        self.units = self._column("units")
+        self.property_type = self._column("property_type")
+        self._json_offsets = self._column("json_offsets")
+        self._text_offsets = self._column("text_offsets")
+        self._id_hashes = self._column("id_hashes")
+        self._id_rows = self._column("id_rows")
+        self._json_start = self._sections["json"][0]
+        self._text_start, text_length, _ = self._sections["text"]
+        self._text_end = self._text_start + text_length
+        self._assumptions: Optional[Dict[str, UnderwritingAssumptions]] = None
+
+        self._decoded = LRUCache(
+            maxsize=decode_cache_size or int(os.getenv("LISTING_SNAPSHOT_CACHE_SIZE", "20000"))
+        )
+
+    def warm_up(self):
+        """Read the mapped file ahead, so the first searches don't fault its pages in one at a time."""
+        self._map.madvise(mmap.MADV_WILLNEED)
+
+    def _column(self, name: str) -> np.ndarray:
+        offset, length, dtype = self._sections[name]
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self._map, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    def fragment(self, row: int) -> bytes:
+        """The listing's JSON, byte for byte as ``model_dump_json(by_alias=True)``."""
+        start = self._json_start + int(self._json_offsets[row])
+        return self._map[start:self._json_start + int(self._json_offsets[row + 1])]
+
+    def listing(self, row: int) -> Property:
+        property = self._decoded.get(row)
+        if property is None:
+            fragment = self.fragment(row)
+            property = Property.model_validate_json(fragment)
+            self._decoded.put(row, property)
+            # The API response can reuse the stored JSON rather than encode the listing again
+            listing_json_cache.prime(property, fragment)
+        return property
+
+    def listings(self, rows: Iterable[int]) -> List[Property]:
+        return [self.listing(int(row)) for row in rows]
+
+    def encode_listings(self, rows: np.ndarray) -> bytes:
+        """The JSON array of the listings at ``rows``, without decoding them."""
+        starts = self._json_offsets[rows] + self._json_start
+        ends = self._json_offsets[rows + 1] + self._json_start
+        source = self._map
+        return b"[" + b",".join([source[start:end] for start, end in zip(starts.tolist(), ends.tolist())]) + b"]"
+
+    def row_for(self, property_id: str) -> Optional[int]:
+        """The row holding a listing, or None if it isn't in this generation."""
+        id_hash = np.uint64(_id_hash(property_id))
+        index = int(np.searchsorted(self._id_hashes, id_hash))
+        # The JSON starts with the ID, which settles the (astronomically rare) hash collision
+        prefix = b'{"id":' + orjson.dumps(property_id)
+        while index < self.count and self._id_hashes[index] == id_hash:
+            row = int(self._id_rows[index])
+            if self.fragment(row).startswith(prefix):
+                return row
+            index += 1
+        return None
+
+    def match_location(self, location: str) -> np.ndarray:
+        """Mask of listings whose city, address or state contains ``location``, ignoring case."""
+        matches = np.zeros(self.count, dtype=bool)
+        needle = location.lower().encode("utf-8")
+        if b"\0" in needle:
+            return matches
+        pattern = re.compile(re.escape(needle))
+        positions = np.fromiter(
+            (match.start() for match in pattern.finditer(self._map, self._text_start, self._text_end)),
+            dtype=np.int64
+        )
+        rows = np.searchsorted(self._text_offsets, positions - self._text_start, side="right") - 1
+        matches[rows] = True
+        return matches
+
+    def property_type_code(self, property_type: PropertyType) -> int:
+        return PROPERTY_TYPES.index(PropertyType(property_type))
+
+    def assumptions(self, property_id: str) -> Optional[UnderwritingAssumptions]:
+        if self._assumptions is None:
+            self._assumptions = {
+                property_id: UnderwritingAssumptions.model_validate(values)
+                for property_id, values in self.assumption_values().items()
+            }
+        return self._assumptions.get(property_id)
+
+    def raw_section(self, name: str) -> memoryview:
+        offset, length, _ = self._sections[name]
+        return memoryview(self._map)[offset:offset + length]
+
+    def assumption_values(self) -> Dict[str, dict]:
+        offset, length, _ = self._sections["assumptions"]
+        return orjson.loads(self._map[offset:offset + length])
+
+    @property
+    def hits(self) -> int:
+        return self._decoded.hits
+
+    @property
+    def misses(self) -> int:
+        return self._decoded.misses
+
+def _write_snapshot(
+    path: str,
+    columns: Dict[str, np.ndarray],
+    blobs: Dict[str, Sequence],
+    assumptions: Dict[str, dict]
+):
+    """Write a generation file; ``blobs`` are written as the concatenation of their chunks."""
+    count = len(columns["price"])
+    sections: Dict[str, List] = {}
+    layout = []
+    for name, array in columns.items():
+        layout.append((name, array.nbytes, array.dtype.str, [array]))
+    for name, chunks in blobs.items():
+        layout.append((name, sum(len(chunk) for chunk in chunks), "|u1", chunks))
+    assumptions_json = orjson.dumps(assumptions)
+    layout.append(("assumptions", len(assumptions_json), "|u1", [assumptions_json]))
+
+    # Lay sections out after the header, each aligned so columns can be mapped in place
+    header_room = 4096
+    position = header_room
+    for name, length, dtype, _ in layout:
+        sections[name] = [position, length, dtype]
+        position += -(-length // ALIGNMENT) * ALIGNMENT
+    header = orjson.dumps({"count": count, "created": time.time(), "sections": sections})
+    if 16 + len(header) > header_room:
+        raise ValueError("Snapshot header too large")
+
+    temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+        for name, length, _, chunks in layout:
+            f.seek(sections[name][0])
+            for chunk in chunks:
+                f.write(chunk)
+        f.truncate(position)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+def _columns_for(properties: Sequence[Property]) -> Dict[str, np.ndarray]:
+    return {
+        "price": np.array([property.price for property in properties], dtype=np.float64),
+        "cap_rate": np.array([property.cap_rate for property in properties], dtype=np.float64),
+        "units": np.array([property.units for property in properties], dtype=np.int64),
+        "property_type": np.array(
+            [PROPERTY_TYPES.index(PropertyType(property.property_type)) for property in properties], dtype=np.int8
+        ),
+    }
+
+def _id_index(hashes: np.ndarray) -> Dict[str, np.ndarray]:
+    order = np.argsort(hashes, kind="stable")
+    return {"id_hashes": hashes[order], "id_rows": order.astype(np.int64)}
+
+class ListingSnapshotStore:
+    """Publishes and follows generations of the listing store in a shared directory.
+
+    Each generation is a complete snapshot file, written once and never
+    modified; CURRENT names the latest. Publishing writes the new file under an
+    exclusive lock (so there is only ever one writer, whichever worker takes an
+    import) and then replaces CURRENT atomically. Readers check CURRENT at most
+    every ``poll_interval`` seconds and swap to the new generation between
+    requests; a request already holding the previous generation finishes on it.
+    """
+
+    def __init__(self, directory: str, poll_interval: Optional[float] = None, keep: int = 3):
+        self.directory = directory
+        self.poll_interval = poll_interval if poll_interval is not None else float(
+            os.getenv("LISTING_SNAPSHOT_POLL_INTERVAL", "1")
+        )
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        self._current: Optional[ListingSnapshot] = None
+        self._checked = 0.0
+
+    def _read_pointer(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def current(self) -> Optional[ListingSnapshot]:
+        """The latest published generation, or None before the first publish."""
+        now = time.monotonic()
+        if self._current is None or now - self._checked >= self.poll_interval:
+            self._checked = now
+            generation = self._read_pointer()
+            if generation is not None and (self._current is None or self._current.generation != generation):
+                self._current = ListingSnapshot(os.path.join(self.directory, generation))
+                logger.info(f"Listing snapshot generation {generation} ({self._current.count} listings)")
+        return self._current
+
+    @property
+    def hits(self) -> int:
+        return self._current.hits if self._current is not None else 0
+
+    @property
+    def misses(self) -> int:
+        return self._current.misses if self._current is not None else 0
+
+    @contextmanager
+    def _writer(self):
+        with open(os.path.join(self.directory, LOCK_FILE), "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _publish(
+        self,
+        properties: Sequence[Property],
+        assumptions: Optional[Dict[str, UnderwritingAssumptions]] = None
+    ) -> ListingSnapshot:
+        texts = [_search_text(property) for property in properties]
+        fragments = [_fragment(property) for property in properties]
+        columns = _columns_for(properties)
+        columns["json_offsets"] = _offsets(np.fromiter(map(len, fragments), dtype=np.int64, count=len(fragments)))
+        columns["text_offsets"] = _offsets(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)))
+        columns.update(_id_index(np.fromiter(
+            (_id_hash(property.id) for property in properties), dtype=np.uint64, count=len(properties)
+        )))
+        values = {
+            property_id: value.model_dump(mode="json", by_alias=True)
+            for property_id, value in (assumptions or {}).items()
+        }
+        return self._commit(columns, {"json": fragments, "text": texts}, values)
+
+    def publish(
+        self,
+        properties: Sequence[Property],
+        assumptions: Optional[Dict[str, UnderwritingAssumptions]] = None
+    ) -> ListingSnapshot:
+        """Publish a complete new generation holding exactly ``properties``."""
+        with self._writer():
+            return self._publish(properties, assumptions)
+
+    def ensure_published(
+        self,
+        properties: Sequence[Property],
+        assumptions: Optional[Dict[str, UnderwritingAssumptions]] = None
+    ) -> ListingSnapshot:
+        """The current generation, publishing ``properties`` as the first one if there is none yet."""
+        with self._writer():
+            self._checked = 0.0
+            return self.current() or self._publish(properties, assumptions)
+
+    def upsert(
+        self,
+        properties: Sequence[Property],
+        assumptions: Optional[Dict[str, UnderwritingAssumptions]] = None
+    ) -> ListingSnapshot:
+        """Publish a generation with ``properties`` replacing listings of the same ID or appended.
+
+        Unchanged listings are copied from the latest generation as they are,
+        without being decoded.
+        """
+        with self._writer():
+            generation = self._read_pointer()
+            if generation is None:
+                base = None
+            elif self._current is not None and self._current.generation == generation:
+                base = self._current
+            else:
+                base = ListingSnapshot(os.path.join(self.directory, generation))
+            count = base.count if base is not None else 0
+
+            replaced: Dict[int, Property] = {}
+            appended: Dict[str, Property] = {}
+            for property in properties:
+                row = base.row_for(property.id) if base is not None else None
+                if row is not None:
+                    replaced[row] = property
+                else:
+                    appended[property.id] = property
+            added = list(appended.values())
+
+            new_columns = _columns_for(added)
+            columns = {}
+            for name, new_values in new_columns.items():
+                column = np.concatenate([getattr(base, name), new_values]) if base is not None else new_values
+                if replaced:
+                    column[list(replaced)] = _columns_for(list(replaced.values()))[name]
+                columns[name] = column
+
+            blobs = {}
+            for blob, encode, offsets_name in (
+                ("json", _fragment, "_json_offsets"),
+                ("text", _search_text, "_text_offsets"),
+            ):
+                old_offsets = getattr(base, offsets_name) if base is not None else np.zeros(1, dtype=np.int64)
+                old_blob = base.raw_section(blob) if base is not None else memoryview(b"")
+                lengths = np.diff(old_offsets)
+                chunks = []
+                start = 0
+                # Copy the previous generation between the replaced rows, splicing in the new encodings
+                for row in sorted(replaced):
+                    chunks.append(old_blob[int(old_offsets[start]):int(old_offsets[row])])
+                    encoded = encode(replaced[row])
+                    chunks.append(encoded)
+                    lengths[row] = len(encoded)
+                    start = row + 1
+                chunks.append(old_blob[int(old_offsets[start]):int(old_offsets[count])])
+                encoded_added = [encode(property) for property in added]
+                chunks.extend(encoded_added)
+                columns[f"{blob}_offsets"] = _offsets(
+                    np.concatenate([lengths, np.array([len(chunk) for chunk in encoded_added], dtype=np.int64)])
+                )
+                blobs[blob] = chunks
+
+            hashes = np.array([_id_hash(property.id) for property in added], dtype=np.uint64)
+            if base is not None:
+                hashes = np.concatenate([base._id_hashes[np.argsort(base._id_rows, kind="stable")], hashes])
+            columns.update(_id_index(hashes))
+
+            values = base.assumption_values() if base is not None else {}
+            for property_id, value in (assumptions or {}).items():
+                values[property_id] = value.model_dump(mode="json", by_alias=True)
+
+            return self._commit(columns, blobs, values)
+
+    def _commit(self, columns: Dict[str, np.ndarray], blobs: Dict[str, Sequence], assumptions: Dict[str, dict]):
+        generation = f"listings-{time.time_ns():020d}.snap"
+        _write_snapshot(os.path.join(self.directory, generation), columns, blobs, assumptions)
+
+        pointer = os.path.join(self.directory, CURRENT_FILE)
+        temporary = f"{pointer}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, "w") as f:
+            f.write(generation)
+        os.replace(temporary, pointer)
+
+        self._current = ListingSnapshot(os.path.join(self.directory, generation))
+        self._checked = time.monotonic()
+        self._prune(generation)
+        logger.info(f"Published listing snapshot {generation} ({self._current.count} listings)")
+        return self._current
+
+    def _prune(self, current: str):
+        # Workers still reading an older generation keep its pages mapped after the file is unlinked
+        generations = sorted(
+            name for name in os.listdir(self.directory) if name.startswith("listings-") and name.endswith(".snap")
+        )
+        for name in generations[:-self.keep]:
+            if name != current:
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+_listing_snapshot_store: Optional[ListingSnapshotStore] = None
+
+def get_listing_snapshot_store() -> Optional[ListingSnapshotStore]:
+    """Return the shared listing store when LISTING_SNAPSHOT_DIR is set, else None (in-process list)."""
+    global _listing_snapshot_store
+    if _listing_snapshot_store is None:
+        directory = os.getenv("LISTING_SNAPSHOT_DIR")
+        if not directory:
+            return None
+        _listing_snapshot_store = ListingSnapshotStore(directory)
+        register_cache("listing_snapshot", _listing_snapshot_store)
+    return _listing_snapshot_store
@@ -1,25 +1,68 @@
 import json
 import os
-from typing import List, Dict, Any, Optional
-from openai import AsyncOpenAI
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 from models.chat import ChatResponse, ChatAction, AIProcessingResult
 from models.property import PropertySearchFilters
+from services.upstream_scheduler import UpstreamRejected, get_upstream_scheduler
+from utils.cache import stable_hash
+from utils.deadline import remaining
+from utils.metrics import OPENAI_REQUESTS, record_openai_usage, stage
+from utils.single_flight import SingleFlight
+from utils.tracing import SPAN_KIND_CLIENT, span, traced
 import logging
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from openai.types.chat import ChatCompletion
+
 logger = logging.getLogger(__name__)
 
+_completion_calls = SingleFlight("llm")
+
+_openai_client: Optional["AsyncOpenAI"] = None
+
+def get_openai_client() -> "AsyncOpenAI":
+    """Return the process-wide OpenAI client, creating it on first use.
+    
+    The SDK takes most of a second to import, so it is only loaded here (during
+    warm-up, or by the first chat request); one client, with its connection
+    pool and SSL context, then serves every request.
+    """
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI
+        
+        _openai_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            # Any OpenAI-compatible endpoint, e.g. benchmarks/mock_openai.py for load tests
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            # Retries go through the upstream scheduler, which paces them against the quota
+            max_retries=0
+        )
+    return _openai_client
+
+def _estimate_tokens(messages: List[Dict[str, str]], functions: List[Dict[str, Any]]) -> int:
+    # About four characters per token; only needs to be close enough to pace against the TPM quota
+    characters = sum(len(message.get("content") or "") for message in messages)
+    return (characters + len(json.dumps(functions))) // 4
+
 class OpenAIService:
     def __init__(self):
-        self.client = AsyncOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+        self.client = get_openai_client()
+        self.scheduler = get_upstream_scheduler()
         
+    @traced()
     async def process_message(
         self, 
         user_message: str, 
-        conversation_history: Optional[List[Dict[str, str]]] = None
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        user: str = "anonymous"
     ) -> AIProcessingResult:
-        """Process user message with OpenAI and determine action and extract data."""
+        """Process user message with OpenAI and determine action and extract data.
+        
+        Raises UpstreamRejected when the call is shed by admission control or
+        OpenAI stays unavailable through retries, so the API can answer 429/503.
+        """
         
         try:
             system_prompt = self._get_system_prompt()
@@ -31,14 +74,20 @@ class OpenAIService:
                 
             messages.append({"role": "user", "content": user_message})
             
-            response = await self.client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1000,
-                functions=[self._get_function_schema()],
-                function_call="auto"
-            )
+            model = "gpt-4"
+            max_tokens = 1000
+            functions = [self._get_function_schema()]
+            with stage("llm"), span("openai chat.completions", kind=SPAN_KIND_CLIENT, model=model) as llm_span:
+                # Identical conversations in flight at the same moment share one completion;
+                # each caller still counts against its own user's limit while it waits
+                with self.scheduler.caller(user):
+                    response = await _completion_calls.do(
+                        stable_hash([model, messages]),
+                        lambda: self._complete(model, messages, functions, max_tokens, user)
+                    )
+                if response.usage is not None:
+                    llm_span.set_attribute("prompt_tokens", response.usage.prompt_tokens)
+                    llm_span.set_attribute("completion_tokens", response.usage.completion_tokens)
             
             message = response.choices[0].message
             
@@ -50,6 +99,8 @@ class OpenAIService:
             # Fallback to content parsing
             return self._parse_content_response(message.content or "")
             
+        except UpstreamRejected:
+            raise
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
             return AIProcessingResult(
@@ -57,6 +108,44 @@ class OpenAIService:
                 action=ChatAction.GENERAL_RESPONSE
             )
     
+    async def _complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        functions: List[Dict[str, Any]],
+        max_tokens: int,
+        user: str
+    ) -> "ChatCompletion":
+        try:
+            response = await self.scheduler.submit(
+                lambda: self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=max_tokens,
+                    functions=functions,
+                    function_call="auto",
+                    # Don't wait on OpenAI past the request's deadline
+                    timeout=self._request_timeout()
+                ),
+                user=user,
+                tokens=_estimate_tokens(messages, functions) + max_tokens
+            )
+        except UpstreamRejected:
+            OPENAI_REQUESTS.labels(model, "rejected").inc()
+            raise
+        except Exception:
+            OPENAI_REQUESTS.labels(model, "error").inc()
+            raise
+        
+        OPENAI_REQUESTS.labels(model, "ok").inc()
+        record_openai_usage(model, response.usage)
+        return response
+    
+    def _request_timeout(self):
+        time_left = remaining()
+        return self.client.timeout if time_left is None else max(time_left, 1.0)
+    
     def _get_system_prompt(self) -> str:
         return """You are RETS, an AI assistant specializing in real estate investment analysis. You help users find properties and generate investment documents.
 
@@ -158,6 +247,7 @@ Always be helpful and professional. Confirm what you're doing before taking acti
             confidence=0.6  # Lower confidence for keyword matching
         )
     
+    @traced()
     def parse_search_query(self, query: str) -> Dict[str, Any]:
         """Parse natural language query to extract search filters."""
         filters = {}
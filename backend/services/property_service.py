@@ -1,48 +1,236 @@
 import asyncio
-from typing import List, Optional
+import re
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 from models.property import Property, PropertySearchFilters, PropertySearchResult
+from models.document import UnderwritingAssumptions
 from data.mock_properties import MOCK_PROPERTIES
+from services.analysis_cache import analysis_cache
+from services.listing_cache import listing_json_cache
+from services.listing_snapshot import ListingSnapshot, get_listing_snapshot_store
+from utils.metrics import stage
+from utils.single_flight import SingleFlight
+from utils.tracing import traced
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Brokers often run the same search or open the same listing at the same moment
+_search_calls = SingleFlight("search")
+_property_calls = SingleFlight("property")
+
+# Underwriting assumptions recorded for specific listings, e.g. from imported deal models
+PROPERTY_ASSUMPTIONS: Dict[str, UnderwritingAssumptions] = {}
+
+ValueRange = Tuple[float, float]
+
+def get_property_assumptions(property_id: str) -> UnderwritingAssumptions:
+    """Return the assumptions recorded for a listing, or the defaults."""
+    snapshot = PropertyService().snapshot()
+    if snapshot is not None:
+        return snapshot.assumptions(property_id) or UnderwritingAssumptions()
+    return PROPERTY_ASSUMPTIONS.get(property_id) or UnderwritingAssumptions()
+
 class PropertyService:
     def __init__(self):
         self.properties = MOCK_PROPERTIES
+        # Set in multi-worker deployments (app/server.py): listings live in a snapshot shared by every worker
+        self.snapshots = get_listing_snapshot_store()
     
+    def snapshot(self) -> Optional[ListingSnapshot]:
+        """The current shared listing snapshot, or None when listings are kept in this process."""
+        if self.snapshots is None:
+            return None
+        return self.snapshots.current() or self.snapshots.ensure_published(self.properties, PROPERTY_ASSUMPTIONS)
+    
+    def warm_up(self):
+        """Load the listing store and encode its listings' JSON ahead of the first request."""
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            snapshot.warm_up()
+        else:
+            listing_json_cache.encode_properties(self.properties)
+    
+    def _store_version(self):
+        snapshot = self.snapshot()
+        return snapshot.generation if snapshot is not None else id(self.properties)
+    
+    @traced()
     async def search_properties(
         self, 
         query: str, 
         filters: Optional[PropertySearchFilters] = None
     ) -> PropertySearchResult:
-        """Search properties based on query and filters."""
+        """Search properties based on query and filters.
         
-        # Simulate API delay
-        await asyncio.sleep(1)
+        Joins an identical search already in progress instead of repeating it.
+        """
         
-        filtered_properties = self.properties.copy()
+        key = (self._store_version(), query, filters.model_dump_json() if filters else None)
+        return await _search_calls.do(key, lambda: self._search_properties(query, filters))
+    
+    async def _search_properties(
+        self,
+        query: str,
+        filters: Optional[PropertySearchFilters]
+    ) -> PropertySearchResult:
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            filtered_properties = snapshot.listings(await self._search_snapshot(snapshot, query, filters))
+            return PropertySearchResult.model_construct(
+                properties=filtered_properties,
+                totalCount=len(filtered_properties),
+                searchQuery=query
+            )
         
-        if filters:
-            filtered_properties = self._apply_filters(filtered_properties, filters)
+        # Simulate API delay
+        await asyncio.sleep(1)
         
-        # Apply natural language query filtering
-        filtered_properties = self._apply_query_filters(filtered_properties, query)
+        with stage("search"):
+            filtered_properties = self.properties.copy()
+            
+            if filters:
+                filtered_properties = self._apply_filters(filtered_properties, filters)
+            
+            # Apply natural language query filtering
+            filtered_properties = self._apply_query_filters(filtered_properties, query)
         
-        return PropertySearchResult(
+        # Listings are validated when they enter the store, so the result is not re-validated
+        return PropertySearchResult.model_construct(
             properties=filtered_properties,
             totalCount=len(filtered_properties),
             searchQuery=query
         )
     
+    @traced()
+    async def search_listings_json(
+        self,
+        query: str,
+        filters: Optional[PropertySearchFilters] = None
+    ) -> Tuple[int, bytes]:
+        """Search, returning the match count and the matching listings as the API's JSON array.
+        
+        The same listings as search_properties, but with a shared snapshot their
+        stored JSON is copied straight out of it instead of each listing being
+        decoded first, which dominates the cost of large results.
+        """
+        
+        snapshot = self.snapshot()
+        if snapshot is None:
+            result = await self.search_properties(query, filters)
+            with stage("serialization"):
+                return result.total_count, listing_json_cache.encode_properties(result.properties)
+        
+        key = ("rows", snapshot.generation, query, filters.model_dump_json() if filters else None)
+        rows = await _search_calls.do(key, lambda: self._search_snapshot(snapshot, query, filters))
+        with stage("serialization"):
+            return len(rows), snapshot.encode_listings(rows)
+    
+    async def _search_snapshot(
+        self,
+        snapshot: ListingSnapshot,
+        query: str,
+        filters: Optional[PropertySearchFilters]
+    ) -> np.ndarray:
+        # Simulate API delay
+        await asyncio.sleep(1)
+        
+        with stage("search"):
+            return self._snapshot_rows(snapshot, query, filters)
+    
+    @traced()
     async def get_property_by_id(self, property_id: str) -> Optional[Property]:
         """Get a specific property by ID."""
+        return await _property_calls.do(
+            (self._store_version(), property_id),
+            lambda: self._get_property_by_id(property_id)
+        )
+    
+    async def _get_property_by_id(self, property_id: str) -> Optional[Property]:
         await asyncio.sleep(0.5)  # Simulate API delay
         
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            row = snapshot.row_for(property_id)
+            return snapshot.listing(row) if row is not None else None
+        
         for property in self.properties:
             if property.id == property_id:
                 return property
         return None
     
+    @traced()
+    async def get_properties_by_ids(self, property_ids: List[str]) -> List[Property]:
+        """Get several properties by ID, in the order requested; unknown IDs are skipped."""
+        await asyncio.sleep(0.5)  # Simulate API delay
+        
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            rows = [snapshot.row_for(property_id) for property_id in property_ids]
+            return snapshot.listings(row for row in rows if row is not None)
+        
+        properties_by_id = {property.id: property for property in self.properties}
+        return [properties_by_id[property_id] for property_id in property_ids if property_id in properties_by_id]
+    
+    @traced()
+    async def upsert_property(
+        self,
+        property: Property,
+        assumptions: Optional[UnderwritingAssumptions] = None
+    ) -> Property:
+        """Insert a new listing or replace an existing one with the same ID.
+        
+        When assumptions are given they become the listing's default underwriting
+        assumptions.
+        """
+        
+        await self.upsert_properties([(property, assumptions)])
+        return property
+    
+    @traced()
+    async def upsert_properties(
+        self,
+        listings: List[Tuple[Property, Optional[UnderwritingAssumptions]]]
+    ) -> List[Property]:
+        """Upsert several listings (with optional assumptions) at once.
+        
+        With a shared snapshot this publishes a single new generation for the
+        whole batch; the other workers pick it up within their poll interval.
+        """
+        
+        if not listings:
+            return []
+        
+        if self.snapshots is not None:
+            # Make sure there is a generation to build on
+            self.snapshot()
+            await asyncio.to_thread(
+                self.snapshots.upsert,
+                [property for property, _ in listings],
+                {property.id: assumptions for property, assumptions in listings if assumptions is not None}
+            )
+        else:
+            for property, assumptions in listings:
+                self._upsert_local(property, assumptions)
+        
+        # Analyses and encoded JSON of the previous version of the listings are stale
+        for property, _ in listings:
+            analysis_cache.invalidate_property(property.id)
+            listing_json_cache.invalidate_property(property.id)
+        
+        return [property for property, _ in listings]
+    
+    def _upsert_local(self, property: Property, assumptions: Optional[UnderwritingAssumptions]):
+        for index, existing in enumerate(self.properties):
+            if existing.id == property.id:
+                self.properties[index] = property
+                break
+        else:
+            self.properties.append(property)
+        
+        if assumptions is not None:
+            PROPERTY_ASSUMPTIONS[property.id] = assumptions
+    
     def _apply_filters(self, properties: List[Property], filters: PropertySearchFilters) -> List[Property]:
         """Apply search filters to property list."""
         
@@ -85,25 +273,17 @@ class PropertyService:
     
     def _apply_query_filters(self, properties: List[Property], query: str) -> List[Property]:
         """Apply additional filtering based on natural language query."""
-        query_lower = query.lower()
-        
-        # Extract and apply price range from query
-        import re
+        price_range, cap_rate_range = self._query_ranges(query)
         
-        price_match = re.search(r'\$(\d+(?:,\d{3})*(?:\.\d+)?)[mk]?[-\s]*\$?(\d+(?:,\d{3})*(?:\.\d+)?)[mk]?', query_lower)
-        if price_match:
-            min_price = self._parse_price(price_match.group(1))
-            max_price = self._parse_price(price_match.group(2))
+        if price_range:
+            min_price, max_price = price_range
             properties = [
                 prop for prop in properties 
                 if min_price <= prop.price <= max_price
             ]
         
-        # Extract and apply cap rate from query
-        cap_rate_match = re.search(r'(\d+(?:\.\d+)?)\s*%?\s*[-\s]*(\d+(?:\.\d+)?)\s*%?\s*cap\s*rate', query_lower)
-        if cap_rate_match:
-            min_cap_rate = float(cap_rate_match.group(1))
-            max_cap_rate = float(cap_rate_match.group(2))
+        if cap_rate_range:
+            min_cap_rate, max_cap_rate = cap_rate_range
             properties = [
                 prop for prop in properties 
                 if min_cap_rate <= prop.cap_rate <= max_cap_rate
@@ -111,6 +291,56 @@ class PropertyService:
         
         return properties
     
+    def _query_ranges(self, query: str) -> Tuple[Optional[ValueRange], Optional[ValueRange]]:
+        """Extract the price range and cap rate range stated in a natural language query."""
+        query_lower = query.lower()
+        price_range = cap_rate_range = None
+        
+        price_match = re.search(r'\$(\d+(?:,\d{3})*(?:\.\d+)?)[mk]?[-\s]*\$?(\d+(?:,\d{3})*(?:\.\d+)?)[mk]?', query_lower)
+        if price_match:
+            price_range = (self._parse_price(price_match.group(1)), self._parse_price(price_match.group(2)))
+        
+        cap_rate_match = re.search(r'(\d+(?:\.\d+)?)\s*%?\s*[-\s]*(\d+(?:\.\d+)?)\s*%?\s*cap\s*rate', query_lower)
+        if cap_rate_match:
+            cap_rate_range = (float(cap_rate_match.group(1)), float(cap_rate_match.group(2)))
+        
+        return price_range, cap_rate_range
+    
+    def _snapshot_rows(
+        self,
+        snapshot: ListingSnapshot,
+        query: str,
+        filters: Optional[PropertySearchFilters]
+    ) -> np.ndarray:
+        """Rows of the snapshot matching, with the same semantics as _apply_filters and _apply_query_filters."""
+        mask = np.ones(snapshot.count, dtype=bool)
+        
+        if filters:
+            if filters.location:
+                mask &= snapshot.match_location(filters.location)
+            if filters.min_price is not None:
+                mask &= snapshot.price >= filters.min_price
+            if filters.max_price is not None:
+                mask &= snapshot.price <= filters.max_price
+            if filters.min_cap_rate is not None:
+                mask &= snapshot.cap_rate >= filters.min_cap_rate
+            if filters.max_cap_rate is not None:
+                mask &= snapshot.cap_rate <= filters.max_cap_rate
+            if filters.min_units is not None:
+                mask &= snapshot.units >= filters.min_units
+            if filters.max_units is not None:
+                mask &= snapshot.units <= filters.max_units
+            if filters.property_type is not None:
+                mask &= snapshot.property_type == snapshot.property_type_code(filters.property_type)
+        
+        price_range, cap_rate_range = self._query_ranges(query)
+        if price_range:
+            mask &= (snapshot.price >= price_range[0]) & (snapshot.price <= price_range[1])
+        if cap_rate_range:
+            mask &= (snapshot.cap_rate >= cap_rate_range[0]) & (snapshot.cap_rate <= cap_rate_range[1])
+        
+        return np.flatnonzero(mask)
+    
     def _parse_price(self, price_str: str) -> float:
         """Parse price string and convert to float."""
         price = float(price_str.replace(',', ''))
@@ -122,6 +352,7 @@ class PropertyService:
             
         return price
     
+    @traced()
     def parse_search_query(self, query: str) -> PropertySearchFilters:
         """Parse natural language query into search filters."""
         filters_dict = {}
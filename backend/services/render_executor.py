@@ -0,0 +1,196 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from io import BytesIO
+from typing import Any, Callable, List, Optional
+from models.property import Property
+from models.document import UnderwritingAnalysis, UnderwritingAssumptions, LOIDetails
+from utils.metrics import stage
+from utils.tracing import current_traceparent, run_with_parent
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Generators are created once per worker (process or thread) and reused for every render
+_worker_state = threading.local()
+
+def _init_worker():
+    """Warm-initialize the document generators in a pool worker."""
+    from utils.excel_generator import ExcelGenerator
+    from utils.pdf_generator import PDFGenerator
+
+    _worker_state.excel_generator = ExcelGenerator()
+    _worker_state.pdf_generator = PDFGenerator()
+    _worker_state.pdf_generator.warm_up()
+
+def _worker_generators():
+    if not hasattr(_worker_state, "excel_generator"):
+        _init_worker()
+    return _worker_state.excel_generator, _worker_state.pdf_generator
+
+def _warm_worker():
+    _worker_generators()
+
+def _render_underwriting(property: Property, analysis: UnderwritingAnalysis) -> bytes:
+    excel_generator, _ = _worker_generators()
+    return excel_generator.generate_underwriting_excel(property, analysis).getvalue()
+
+def _render_underwriting_formulas(property: Property, assumptions: Optional[UnderwritingAssumptions]) -> bytes:
+    excel_generator, _ = _worker_generators()
+    return excel_generator.generate_formula_excel(property, assumptions).getvalue()
+
+def _render_loi(property: Property, loi_details: LOIDetails) -> bytes:
+    _, pdf_generator = _worker_generators()
+    return pdf_generator.generate_loi_pdf(property, loi_details).getvalue()
+
+def _merge_pdfs(documents: List[bytes]) -> bytes:
+    from utils.pdf_generator import merge_pdfs
+    return merge_pdfs(documents).getvalue()
+
+def _render_portfolio(
+    properties: List[Property],
+    assumptions: Optional[UnderwritingAssumptions],
+    include_details: bool
+) -> bytes:
+    from services.underwriting import build_analysis, calculate_portfolio_metrics
+
+    excel_generator, _ = _worker_generators()
+    # Underwrite the whole portfolio in one vectorized pass
+    metrics = calculate_portfolio_metrics(properties, assumptions)
+    analyses = None
+    if include_details:
+        analysis_date = datetime.now()
+        analyses = [
+            build_analysis(property, metrics, index, assumptions, analysis_date)
+            for index, property in enumerate(properties)
+        ]
+    return excel_generator.generate_portfolio_excel(properties, metrics, analyses).getvalue()
+
+class RenderExecutor:
+    """Runs CPU-bound Excel/PDF rendering off the event loop.
+
+    Uses a process pool by default and falls back to a thread pool when processes
+    are unavailable. At most ``max_pending`` renders are queued or running at once;
+    further requests wait for a slot instead of piling onto the pool. Render
+    stages are timed here, around the pool round trip including any wait for a
+    slot, so process workers need no metrics of their own.
+    """
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None
+    ):
+        self.mode = (mode or os.getenv("RENDER_EXECUTOR", "process")).lower()
+        self.max_workers = max_workers or int(os.getenv("RENDER_WORKERS", "0")) or os.cpu_count() or 1
+        self.max_pending = max_pending or int(os.getenv("RENDER_QUEUE_SIZE", "0")) or self.max_workers * 4
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._pool = self._create_pool()
+
+    def _create_pool(self) -> Executor:
+        if self.mode == "process":
+            try:
+                return ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+            except (OSError, NotImplementedError, ValueError) as e:
+                logger.warning(f"Process pool unavailable ({e}), rendering in threads instead")
+                self.mode = "thread"
+
+        return ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="render",
+            initializer=_init_worker
+        )
+
+    def _fall_back_to_threads(self, error: Exception):
+        logger.warning(f"Render process pool failed ({error}), rendering in threads instead")
+        broken_pool = self._pool
+        self.mode = "thread"
+        self._pool = self._create_pool()
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run fn(*args) on the pool once a queue slot is free."""
+        # Pool workers don't inherit the caller's context, so a sampled trace is passed along explicitly
+        traceparent = current_traceparent()
+        if traceparent is not None:
+            fn, args = run_with_parent, (traceparent, fn.__name__.lstrip("_"), fn, *args)
+        
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._pool, fn, *args)
+            except (BrokenProcessPool, PermissionError) as e:
+                if self.mode != "process":
+                    raise
+                self._fall_back_to_threads(e)
+                return await loop.run_in_executor(self._pool, fn, *args)
+
+    async def render_underwriting(self, property: Property, analysis: UnderwritingAnalysis) -> BytesIO:
+        with stage("render_excel"):
+            return BytesIO(await self.run(_render_underwriting, property, analysis))
+
+    async def render_underwriting_formulas(
+        self,
+        property: Property,
+        assumptions: Optional[UnderwritingAssumptions] = None
+    ) -> BytesIO:
+        with stage("render_excel"):
+            return BytesIO(await self.run(_render_underwriting_formulas, property, assumptions))
+
+    async def render_loi(self, property: Property, loi_details: LOIDetails) -> BytesIO:
+        with stage("render_pdf"):
+            return BytesIO(await self.run(_render_loi, property, loi_details))
+
+    async def render_portfolio(
+        self,
+        properties: List[Property],
+        assumptions: Optional[UnderwritingAssumptions] = None,
+        include_details: bool = False
+    ) -> BytesIO:
+        with stage("render_excel"):
+            return BytesIO(await self.run(_render_portfolio, properties, assumptions, include_details))
+
+    async def merge_pdfs(self, documents: List[bytes]) -> BytesIO:
+        with stage("render_pdf"):
+            return BytesIO(await self.run(_merge_pdfs, documents))
+    
+    async def warm_up(self):
+        """Start every pool worker and wait until each has its generators and templates ready.
+        
+        The workers boot in parallel with each other and with the rest of startup,
+        and the first download doesn't pay the spawn cost.
+        """
+        try:
+            await asyncio.gather(*(
+                asyncio.wrap_future(self._pool.submit(_warm_worker)) for _ in range(self.max_workers)
+            ))
+        except BrokenProcessPool as e:
+            self._fall_back_to_threads(e)
+            await self.warm_up()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+_render_executor: Optional[RenderExecutor] = None
+
+def get_render_executor() -> RenderExecutor:
+    """Return the process-wide render executor, creating it on first use."""
+    global _render_executor
+    if _render_executor is None:
+        _render_executor = RenderExecutor()
+    return _render_executor
+
+def shutdown_render_executor():
+    global _render_executor
+    if _render_executor is not None:
+        _render_executor.shutdown()
+        _render_executor = None
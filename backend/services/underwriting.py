@@ -0,0 +1,199 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from models.property import Property
+from models.document import (
+    EXPENSE_CATEGORIES, PROJECTION_YEARS,
+    UnderwritingAnalysis, UnderwritingAssumptions, OperatingExpenses, UnderwritingCalculations, CashFlowProjection
+)
+from utils.metrics import stage
+
+# Projection arrays in the batch result, keyed "projection_<name>" with one row per
+# property, and the CashFlowProjection field each one fills
+PROJECTION_SERIES = {
+    "rental_income": "rentalIncome",
+    "operating_expenses": "operatingExpenses",
+    "net_operating_income": "netOperatingIncome",
+    "debt_service": "debtService",
+    "cash_flow": "cashFlow",
+    "cumulative_cash_flow": "cumulativeCashFlow",
+}
+
+def _expense_rates(assumptions: UnderwritingAssumptions) -> Dict[str, float]:
+    return {
+        "management": assumptions.management_rate,
+        "maintenance": assumptions.maintenance_rate,
+        "insurance": assumptions.insurance_rate,
+        "taxes": assumptions.tax_rate,
+        "utilities": assumptions.utilities_rate,
+        "other": assumptions.other_rate,
+    }
+
+def calculate_underwriting_batch(
+    prices: np.ndarray,
+    assumptions: Optional[UnderwritingAssumptions] = None
+) -> Dict[str, np.ndarray]:
+    """Underwrite many purchase prices at once.
+
+    Every metric of the single-property analysis is returned as an array aligned
+    with ``prices``, computed in one vectorized pass.
+    """
+
+    assumptions = assumptions or UnderwritingAssumptions()
+    purchase_price = np.asarray(prices, dtype=np.float64)
+
+    down_payment = purchase_price * assumptions.down_payment_percentage
+    loan_amount = purchase_price - down_payment
+
+    monthly_rent = purchase_price * assumptions.rent_to_price_ratio
+    annual_rent = monthly_rent * 12
+    effective_gross_income = annual_rent * (1 - assumptions.vacancy / 100)
+
+    metrics = {
+        "purchase_price": purchase_price,
+        "down_payment": down_payment,
+        "loan_amount": loan_amount,
+        "monthly_rent": monthly_rent,
+        "gross_rental_income": annual_rent,
+        "effective_gross_income": effective_gross_income,
+    }
+
+    for category, rate in _expense_rates(assumptions).items():
+        metrics[category] = effective_gross_income * rate
+
+    total_operating_expenses = sum(metrics[category] for category in EXPENSE_CATEGORIES)
+    net_operating_income = effective_gross_income - total_operating_expenses
+
+    # Standard amortizing loan payment
+    monthly_rate = assumptions.interest_rate / 100 / 12
+    number_of_payments = assumptions.loan_term * 12
+    if monthly_rate:
+        growth = (1 + monthly_rate) ** number_of_payments
+        monthly_debt_service = loan_amount * (monthly_rate * growth) / (growth - 1)
+    else:
+        monthly_debt_service = loan_amount / number_of_payments
+    annual_debt_service = monthly_debt_service * 12
+
+    annual_cash_flow = net_operating_income - annual_debt_service
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics.update({
+            "total_operating_expenses": total_operating_expenses,
+            "net_operating_income": net_operating_income,
+            "monthly_debt_service": monthly_debt_service,
+            "annual_debt_service": annual_debt_service,
+            "annual_cash_flow": annual_cash_flow,
+            "monthly_cash_flow": annual_cash_flow / 12,
+            "cap_rate": net_operating_income / purchase_price * 100,
+            "cash_on_cash_return": annual_cash_flow / down_payment * 100,
+            "debt_service_coverage": net_operating_income / annual_debt_service,
+            "gross_rent_multiplier": purchase_price / annual_rent,
+            "loan_to_value": loan_amount / purchase_price * 100,
+            "expense_ratio": total_operating_expenses / annual_rent * 100,
+            "noi_margin": net_operating_income / annual_rent * 100,
+        })
+
+    metrics.update(calculate_projection_batch(metrics, assumptions))
+
+    return metrics
+
+def calculate_projection_batch(
+    metrics: Dict[str, np.ndarray],
+    assumptions: Optional[UnderwritingAssumptions] = None,
+    years: int = PROJECTION_YEARS
+) -> Dict[str, np.ndarray]:
+    """Project every property of a batch forward, year by year.
+
+    Effective gross income grows at the rent growth rate and operating expenses at
+    the expense growth rate, so year 1 is exactly the underwriting analysis. Each
+    series is a (properties, years) array computed from one row of growth factors.
+    """
+
+    assumptions = assumptions or UnderwritingAssumptions()
+    elapsed = np.arange(years, dtype=np.float64)
+
+    rental_income = np.outer(metrics["effective_gross_income"], (1 + assumptions.rent_growth) ** elapsed)
+    operating_expenses = np.outer(metrics["total_operating_expenses"], (1 + assumptions.expense_growth) ** elapsed)
+    net_operating_income = rental_income - operating_expenses
+    debt_service = np.repeat(np.asarray(metrics["annual_debt_service"])[:, np.newaxis], years, axis=1)
+    cash_flow = net_operating_income - debt_service
+
+    return {
+        "projection_years": np.arange(1, years + 1),
+        "projection_rental_income": rental_income,
+        "projection_operating_expenses": operating_expenses,
+        "projection_net_operating_income": net_operating_income,
+        "projection_debt_service": debt_service,
+        "projection_cash_flow": cash_flow,
+        "projection_cumulative_cash_flow": np.cumsum(cash_flow, axis=1),
+    }
+
+def calculate_portfolio_metrics(
+    properties: List[Property],
+    assumptions: Optional[UnderwritingAssumptions] = None
+) -> Dict[str, np.ndarray]:
+    """Batch underwriting for a list of listings, including per-unit metrics."""
+
+    with stage("underwriting"):
+        metrics = calculate_underwriting_batch(
+            np.fromiter((p.price for p in properties), dtype=np.float64, count=len(properties)),
+            assumptions
+        )
+
+    units = np.fromiter((p.units for p in properties), dtype=np.float64, count=len(properties))
+    metrics["price_per_unit"] = metrics["purchase_price"] / units
+    metrics["noi_per_unit"] = metrics["net_operating_income"] / units
+    metrics["cash_flow_per_unit"] = metrics["annual_cash_flow"] / units
+
+    return metrics
+
+def build_analysis(
+    property: Property,
+    metrics: Dict[str, np.ndarray],
+    index: int,
+    assumptions: Optional[UnderwritingAssumptions] = None,
+    analysis_date: Optional[datetime] = None
+) -> UnderwritingAnalysis:
+    """Assemble the UnderwritingAnalysis of one row of a batch result.
+
+    Every value is computed here from validated inputs, so the models are built
+    with ``model_construct`` rather than validated field by field.
+    """
+
+    assumptions = assumptions or UnderwritingAssumptions()
+    value = lambda name: float(metrics[name][index])
+
+    return UnderwritingAnalysis.model_construct(
+        propertyId=property.id,
+        propertyAddress=property.address,
+        analysisDate=analysis_date or datetime.now(),
+        purchasePrice=value("purchase_price"),
+        downPayment=value("down_payment"),
+        loanAmount=value("loan_amount"),
+        interestRate=assumptions.interest_rate,
+        loanTerm=assumptions.loan_term,
+        monthlyRent=value("monthly_rent"),
+        vacancy=assumptions.vacancy,
+        operatingExpenses=OperatingExpenses.model_construct(**{category: value(category) for category in EXPENSE_CATEGORIES}),
+        calculations=UnderwritingCalculations.model_construct(
+            grossRentalIncome=value("gross_rental_income"),
+            netOperatingIncome=value("net_operating_income"),
+            capRate=value("cap_rate"),
+            cashOnCashReturn=value("cash_on_cash_return"),
+            debtServiceCoverage=value("debt_service_coverage"),
+            monthlyDebtService=value("monthly_debt_service"),
+            monthlyCashFlow=value("monthly_cash_flow"),
+            annualCashFlow=value("annual_cash_flow")
+        ),
+        projection=CashFlowProjection.model_construct(
+            years=metrics["projection_years"].tolist(),
+            **{alias: metrics[f"projection_{series}"][index].tolist() for series, alias in PROJECTION_SERIES.items()}
+        )
+    )
+
+def calculate_underwriting(
+    property: Property,
+    assumptions: Optional[UnderwritingAssumptions] = None
+) -> UnderwritingAnalysis:
+    """Underwrite a single property."""
+    return build_analysis(property, calculate_portfolio_metrics([property], assumptions), 0, assumptions)
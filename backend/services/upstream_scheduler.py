@@ -0,0 +1,303 @@
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Deque, Dict, Iterator, Optional, TypeVar
+from utils.deadline import remaining
+from utils.metrics import OPENAI_QUEUE_WAIT, OPENAI_REJECTED, OPENAI_RETRIES
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Full-jitter exponential backoff between retries: uniform(0, min(cap, base * 2**attempt))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+class UpstreamRejected(Exception):
+    """A call was refused before or instead of reaching the upstream API.
+
+    ``status_code`` is what the API should answer with (429 for a client over
+    its own limit, 503 when the upstream is saturated) and ``retry_after`` a
+    suggested wait in seconds.
+    """
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: float = 1.0):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Rate limiter refilling ``per_minute`` units a minute, holding at most ``burst``.
+
+    A reservation always succeeds and may take the level below zero; the caller
+    then waits for the returned delay, by which time the debt is repaid. That
+    keeps reservations in order without a wait queue of its own. A limit of 0
+    disables the bucket.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60
+        # Ten seconds' worth by default, so an idle minute doesn't allow a full minute's quota in one burst
+        self.capacity = burst or self.rate * 10
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float = 0) -> float:
+        """Seconds until ``amount`` more could be taken without waiting."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        return max(amount - self.level, 0) / self.rate
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` and return how long to wait before using it."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        self.level -= amount
+        return max(-self.level, 0) / self.rate
+
+    def adjust(self, amount: float):
+        """Give back (positive) or take (negative) units after the fact, e.g. once actual usage is known."""
+        if not self.enabled:
+            return
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def pause(self, seconds: float):
+        """Hold off every reservation for at least ``seconds``, as the upstream asked in a 429."""
+        if not self.enabled:
+            return
+        self._refill()
+        self.level = min(self.level, -seconds * self.rate)
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying after ``error``, or None if it should not be retried."""
+    # Only reached once a call has failed, by which time the SDK is loaded
+    import openai
+    
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code != 429 and error.status_code < 500:
+            return None
+    elif not isinstance(error, openai.APIConnectionError):
+        return None
+
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return delay
+
+def _retry_reason(error: Exception) -> str:
+    import openai
+    
+    if isinstance(error, openai.APIStatusError):
+        return "rate_limited" if error.status_code == 429 else "server_error"
+    return "connection_error"
+
+class UpstreamScheduler:
+    """Admission control for calls to a rate-limited upstream API (OpenAI).
+
+    * Token buckets keep requests and tokens per minute within the account's
+      quota (OPENAI_RPM, OPENAI_TPM), so bursts queue here instead of turning
+      into 429s and retries.
+    * At most ``max_concurrency`` calls are in flight; waiting calls are served
+      round-robin across users, so one busy client cannot starve the others.
+    * Each user may have at most ``per_user_limit`` requests waiting on the
+      upstream. Requests are counted through ``caller()`` rather than per
+      call, so one that shares a coalesced call started by another user still
+      counts against its own user's limit (but not against the quota, as it
+      costs nothing upstream).
+    * A call whose expected queueing time exceeds ``queue_deadline``, or what is
+      left of the request's deadline, is refused at once with UpstreamRejected
+      rather than timing out later.
+    * 429s, 5xx and connection errors are retried with jittered exponential
+      backoff, honouring Retry-After; a 429 also pauses the request bucket so
+      the other queued calls back off too.
+    """
+
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        per_user_limit: Optional[int] = None,
+        queue_deadline: Optional[float] = None,
+        max_retries: Optional[int] = None
+    ):
+        self.requests = TokenBucket(rpm if rpm is not None else float(os.getenv("OPENAI_RPM", "500")))
+        self.tokens = TokenBucket(tpm if tpm is not None else float(os.getenv("OPENAI_TPM", "40000")))
+        self.max_concurrency = max_concurrency or int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+        self.per_user_limit = per_user_limit or int(os.getenv("OPENAI_PER_USER_LIMIT", "4"))
+        self.queue_deadline = queue_deadline or float(os.getenv("OPENAI_QUEUE_DEADLINE", "10"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+
+        # Waiting calls per user; users are served in the order of this dict, and move to the back once served
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._waiting_count = 0
+        self._user_calls: Dict[str, int] = {}
+        self._in_flight = 0
+        # Moving average of call duration, for estimating queueing time
+        self._call_seconds = 2.0
+
+    @property
+    def queued(self) -> int:
+        return self._waiting_count
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def expected_wait(self, tokens: float = 0) -> float:
+        """Estimated seconds a call submitted now would wait before being sent."""
+        ahead = self._waiting_count + 1
+        slot_wait = 0.0
+        if self._in_flight >= self.max_concurrency:
+            slot_wait = -(-ahead // self.max_concurrency) * self._call_seconds
+        rate_wait = max(self.requests.wait_time(ahead), self.tokens.wait_time(tokens * ahead))
+        return max(slot_wait, rate_wait)
+
+    @contextmanager
+    def caller(self, user: str = "anonymous") -> Iterator[None]:
+        """Count a request against its user's limit while it waits on the upstream.
+
+        Wraps everything the request awaits, whether a call it submits itself or
+        one it shares with identical requests. Raises UpstreamRejected (429) when
+        the user already has ``per_user_limit`` requests waiting.
+        """
+        if self._user_calls.get(user, 0) >= self.per_user_limit:
+            OPENAI_REJECTED.labels("per_user_limit").inc()
+            raise UpstreamRejected("Too many requests in progress", 429, self._call_seconds)
+
+        self._user_calls[user] = self._user_calls.get(user, 0) + 1
+        try:
+            yield
+        finally:
+            self._user_calls[user] -= 1
+            if not self._user_calls[user]:
+                del self._user_calls[user]
+
+    async def submit(self, call: Callable[[], Awaitable[T]], user: str = "anonymous", tokens: float = 0) -> T:
+        """Run ``call`` once admitted, retrying transient upstream errors.
+
+        ``tokens`` is the most the call may use (prompt plus max completion); it is
+        reserved up front and the unused part is returned once the response reports
+        its usage. ``user`` decides the call's place in the round-robin; the
+        per-user limit is enforced by ``caller()`` around it. Raises
+        UpstreamRejected when the call is not admitted or keeps failing.
+        """
+        queued_at = time.monotonic()
+        await self._acquire(user, tokens)
+        OPENAI_QUEUE_WAIT.observe(time.monotonic() - queued_at)
+
+        try:
+            attempt = 0
+            while True:
+                delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                started = time.monotonic()
+                try:
+                    result = await call()
+                except Exception as e:
+                    # A failed call used no tokens
+                    self.tokens.adjust(tokens)
+                    retry_delay = _retry_delay(e, attempt)
+                    if retry_delay is None:
+                        raise
+                    time_left = remaining()
+                    if attempt >= self.max_retries or (time_left is not None and retry_delay >= time_left):
+                        OPENAI_REJECTED.labels("retries_exhausted").inc()
+                        raise UpstreamRejected(
+                            "The AI service is temporarily unavailable", 503, retry_delay or BACKOFF_BASE
+                        ) from e
+
+                    reason = _retry_reason(e)
+                    OPENAI_RETRIES.labels(reason).inc()
+                    if reason == "rate_limited":
+                        self.requests.pause(retry_delay)
+                    logger.warning(f"Upstream call failed ({e}), retry {attempt + 1} in {retry_delay:.2f}s")
+                    attempt += 1
+                    await asyncio.sleep(retry_delay)
+                    continue
+
+                self._call_seconds = 0.8 * self._call_seconds + 0.2 * (time.monotonic() - started)
+                usage = getattr(result, "usage", None)
+                if usage is not None and usage.total_tokens is not None:
+                    self.tokens.adjust(tokens - usage.total_tokens)
+                return result
+        finally:
+            self._release()
+
+    async def _acquire(self, user: str, tokens: float):
+        expected_wait = self.expected_wait(tokens)
+        time_left = remaining()
+        if expected_wait > self.queue_deadline or (time_left is not None and expected_wait >= time_left):
+            OPENAI_REJECTED.labels("queue_deadline").inc()
+            raise UpstreamRejected("The AI service is busy, please try again shortly", 503, expected_wait)
+
+        if self._in_flight < self.max_concurrency and not self._waiting_count:
+            self._in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user, deque()).append(future)
+        self._waiting_count += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted a slot just as the caller went away
+                self._release()
+            else:
+                self._forget(user, future)
+            raise
+
+    def _forget(self, user: str, future: asyncio.Future):
+        waiting = self._waiting.get(user)
+        if waiting is not None and future in waiting:
+            waiting.remove(future)
+            self._waiting_count -= 1
+            if not waiting:
+                del self._waiting[user]
+
+    def _release(self):
+        self._in_flight -= 1
+
+        while self._in_flight < self.max_concurrency and self._waiting:
+            next_user, waiting = self._waiting.popitem(last=False)
+            future = waiting.popleft()
+            self._waiting_count -= 1
+            if waiting:
+                self._waiting[next_user] = waiting
+            if future.done():
+                # Cancelled, and about to be forgotten by its caller
+                continue
+            self._in_flight += 1
+            future.set_result(None)
+
+_upstream_scheduler: Optional[UpstreamScheduler] = None
+
+def get_upstream_scheduler() -> UpstreamScheduler:
+    """Return the process-wide OpenAI scheduler, creating it on first use."""
+    global _upstream_scheduler
+    if _upstream_scheduler is None:
+        _upstream_scheduler = UpstreamScheduler()
+    return _upstream_scheduler
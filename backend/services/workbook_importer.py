@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import posixpath
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+from models.property import Property, PropertyType
+from models.document import UnderwritingAssumptions, WorkbookImportReport, WorkbookImportResult
+from services.property_service import PropertyService
+from utils.cache import stable_hash
+import logging
+
+logger = logging.getLogger(__name__)
+
+WORKBOOK_EXTENSIONS = (".xlsx", ".xlsm")
+
+# Property-Input sheet of the REanalysis model: label in column B, value in column C
+INPUT_LABELS = {
+    "purchase price": "purchase_price",
+    "market rent/month": "monthly_rent",
+    "vacancy rate": "vacancy_rate",
+    "credit loss": "credit_loss",
+    "property taxes": "taxes",
+    "insurance": "insurance",
+    "property management (% of egr)": "management_rate",
+    "leasing/advertising fees": "leasing",
+    "repairs/maintenance": "maintenance",
+    "hoa fees": "hoa",
+    "other": "other",
+    "loan amount": "loan_amount",
+    "interest rate": "interest_rate",
+    "amortization": "amortization",
+    "going-in cap rate": "cap_rate",
+    "units": "units",
+    "number of units": "units",
+}
+
+# Growth rates sit in the annual cash flow block: label in column E, rates from year 2 on
+GROWTH_LABELS = {
+    "% rent growth": "rent_growth",
+    "% expense growth": "expense_growth",
+}
+
+REQUIRED_FIELDS = ["purchase_price", "monthly_rent", "loan_amount", "interest_rate", "amortization"]
+
+# The inputs all sit above the what-if tables, so the rest of the sheet is never read
+_INPUT_ROWS = 60
+
+_ADDRESS_PATTERN = re.compile(r"^(?P<street>.+?),\s*(?P<city>[^,]+?),\s*(?P<state>[A-Z]{2})\s+(?P<zip>\d{5}(?:-\d{4})?)$")
+
+class StreamingWorkbook:
+    """Streams cell values from named sheets of an XLSX file.
+
+    ``openpyxl.load_workbook`` parses the whole workbook part up front, and the
+    REanalysis models carry tens of thousands of defined names there, which made
+    opening one take most of a second. This reads only the sheet list, the shared
+    strings and the requested sheets, using openpyxl's streaming sheet parser, and
+    stops parsing a sheet as soon as the rows needed have been read. openpyxl is
+    imported on first use, so the API doesn't load it unless workbooks are imported.
+    """
+
+    def __init__(self, path: str):
+        from openpyxl.reader.strings import read_string_table
+
+        self.archive = zipfile.ZipFile(path)
+        self.sheets = self._sheet_parts()
+        self.shared_strings = []
+        if "xl/sharedStrings.xml" in self.archive.namelist():
+            with self.archive.open("xl/sharedStrings.xml") as source:
+                self.shared_strings = read_string_table(source)
+
+    def _sheet_parts(self) -> Dict[str, str]:
+        from openpyxl.xml.constants import PKG_REL_NS, REL_NS, SHEET_MAIN_NS
+
+        targets = {}
+        with self.archive.open("xl/_rels/workbook.xml.rels") as source:
+            for _, node in iterparse(source):
+                if node.tag == f"{{{PKG_REL_NS}}}Relationship":
+                    target = node.get("Target")
+                    targets[node.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+
+        sheets = {}
+        with self.archive.open("xl/workbook.xml") as source:
+            for _, node in iterparse(source):
+                if node.tag == f"{{{SHEET_MAIN_NS}}}sheet":
+                    sheets[node.get("name")] = targets[node.get(f"{{{REL_NS}}}id")]
+                elif node.tag == f"{{{SHEET_MAIN_NS}}}sheets":
+                    # Everything after the sheet list (defined names, calc settings) is skipped
+                    break
+        return sheets
+
+    def rows(self, sheet: str, max_row: int, max_col: int) -> Iterator[Tuple[Any, ...]]:
+        """Yield the values of each non-empty row up to max_row, padded to max_col columns."""
+        from openpyxl.worksheet._reader import WorkSheetParser
+
+        with self.archive.open(self.sheets[sheet]) as source:
+            parser = WorkSheetParser(source, self.shared_strings, data_only=True)
+            for row_index, cells in parser.parse():
+                if row_index > max_row:
+                    break
+                values = [None] * max_col
+                for cell in cells:
+                    if cell["column"] <= max_col:
+                        values[cell["column"] - 1] = cell["value"]
+                yield tuple(values)
+
+    def close(self):
+        self.archive.close()
+
+def _label(value: Any) -> Optional[str]:
+    return value.strip().lower() if isinstance(value, str) else None
+
+def _number(value: Any) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+def _read_inputs(workbook: StreamingWorkbook) -> Dict[str, float]:
+    inputs: Dict[str, float] = {}
+    for row in workbook.rows("Property-Input", _INPUT_ROWS, 8):
+        field = INPUT_LABELS.get(_label(row[1]))
+        value = _number(row[2])
+        if field and value is not None:
+            inputs.setdefault(field, value)
+
+        field = GROWTH_LABELS.get(_label(row[4]))
+        if field:
+            rate = next((_number(v) for v in row[5:] if _number(v) is not None), None)
+            if rate is not None:
+                inputs.setdefault(field, rate)
+
+    return inputs
+
+def _read_address(workbook: StreamingWorkbook, path: str) -> str:
+    if "Summary" in workbook.sheets:
+        for row in workbook.rows("Summary", 10, 3):
+            if _label(row[1]) == "property address:" and isinstance(row[2], str):
+                return row[2].strip()
+
+    # Fall back to the file name, e.g. "358 Gavin St, San Diego, CA 92102 - REanalysis.xlsx"
+    name = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r"\s*-\s*REanalysis$", "", name, flags=re.IGNORECASE).strip()
+
+def _percent(rate: float) -> float:
+    # The model stores rates as fractions (0.05); ours are percentages (5.0)
+    return rate * 100 if rate < 1 else rate
+
+def build_listing(path: str, address: str, inputs: Dict[str, float]) -> WorkbookImportResult:
+    """Map extracted workbook inputs onto a Property and its UnderwritingAssumptions."""
+
+    missing = [field for field in REQUIRED_FIELDS if field not in inputs]
+    if missing:
+        raise ValueError(f"Missing inputs: {', '.join(missing)}")
+
+    price = inputs["purchase_price"]
+    monthly_rent = inputs["monthly_rent"]
+    if price <= 0 or monthly_rent <= 0:
+        raise ValueError("Purchase price and market rent must be positive")
+
+    # Vacancy and credit loss both come off gross rent before expenses
+    occupancy = (1 - inputs.get("vacancy_rate", 0)) * (1 - inputs.get("credit_loss", 0))
+    effective_gross_income = monthly_rent * 12 * occupancy
+
+    # Fixed annual expenses become rates of effective gross income, matching our model
+    expense_rate = lambda *fields: sum(inputs.get(field, 0) for field in fields) / effective_gross_income
+    defaults = UnderwritingAssumptions()
+
+    assumptions = UnderwritingAssumptions(
+        downPaymentPercentage=1 - inputs["loan_amount"] / price,
+        interestRate=_percent(inputs["interest_rate"]),
+        loanTerm=int(inputs["amortization"]),
+        rentToPriceRatio=monthly_rent / price,
+        vacancy=(1 - occupancy) * 100,
+        managementRate=inputs.get("management_rate", 0),
+        maintenanceRate=expense_rate("maintenance"),
+        insuranceRate=expense_rate("insurance"),
+        taxRate=expense_rate("taxes"),
+        utilitiesRate=0,
+        otherRate=expense_rate("leasing", "hoa", "other"),
+        rentGrowth=inputs.get("rent_growth", defaults.rent_growth),
+        expenseGrowth=inputs.get("expense_growth", defaults.expense_growth),
+    )
+
+    if "cap_rate" in inputs:
+        cap_rate = _percent(inputs["cap_rate"])
+    else:
+        operating_expenses = effective_gross_income * (
+            assumptions.management_rate + assumptions.maintenance_rate + assumptions.insurance_rate
+            + assumptions.tax_rate + assumptions.other_rate
+        )
+        cap_rate = (effective_gross_income - operating_expenses) / price * 100
+
+    match = _ADDRESS_PATTERN.match(address)
+    property = Property(
+        # Stable per address, so re-importing a deal replaces it rather than duplicating it
+        id=f"wb-{stable_hash(address.lower())[:12]}",
+        price=price,
+        address=match.group("street") if match else address,
+        city=match.group("city") if match else "",
+        state=match.group("state") if match else "",
+        zipCode=match.group("zip") if match else "",
+        imageUrl="",
+        units=max(int(inputs.get("units", 1)), 1),
+        capRate=round(cap_rate, 2),
+        propertyType=PropertyType.APARTMENT,
+        description=f"Imported from {os.path.basename(path)}",
+    )
+
+    return WorkbookImportResult(path=path, property=property, assumptions=assumptions)
+
+def extract_workbook(path: str) -> WorkbookImportResult:
+    """Read one underwriting workbook. Never raises; failures are reported in the result."""
+    try:
+        workbook = StreamingWorkbook(path)
+        try:
+            if "Property-Input" not in workbook.sheets:
+                raise ValueError("No Property-Input sheet")
+            inputs = _read_inputs(workbook)
+            address = _read_address(workbook, path)
+        finally:
+            workbook.close()
+
+        return build_listing(path, address, inputs)
+
+    except Exception as e:
+        return WorkbookImportResult(path=path, error=f"{type(e).__name__}: {e}")
+
+def find_workbooks(directory: str) -> List[str]:
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        # Skip Excel's "~$" lock files
+        if name.lower().endswith(WORKBOOK_EXTENSIONS) and not name.startswith("~$")
+    )
+
+class WorkbookImporter:
+    """Bulk import of existing underwriting workbooks into the property store.
+
+    Workbooks are parsed in parallel across processes; each file succeeds or fails
+    on its own and the report lists the error of every file that failed.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or int(os.getenv("WORKBOOK_IMPORT_WORKERS", "0")) or os.cpu_count() or 1
+
+    def extract_all(self, paths: List[str]) -> List[WorkbookImportResult]:
+        """Extract every workbook, in the order given."""
+
+        workers = min(self.max_workers, len(paths))
+        if workers <= 1:
+            return [extract_workbook(path) for path in paths]
+
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                return list(pool.map(extract_workbook, paths, chunksize=max(len(paths) // (workers * 4), 1)))
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning(f"Workbook import pool unavailable ({e}), importing in this process instead")
+            return [extract_workbook(path) for path in paths]
+
+    def extract_directory(self, directory: str) -> WorkbookImportReport:
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Workbook directory not found: {directory}")
+
+        results = self.extract_all(find_workbooks(directory))
+        failed = sum(1 for result in results if result.error)
+
+        return WorkbookImportReport(
+            directory=directory,
+            imported=len(results) - failed,
+            failed=failed,
+            results=results
+        )
+
+    async def import_directory(self, directory: str) -> WorkbookImportReport:
+        """Extract every workbook under directory and upsert the deals into the property store."""
+
+        report = await asyncio.to_thread(self.extract_directory, directory)
+
+        for result in report.results:
+            if result.error:
+                logger.warning(f"Could not import {result.path}: {result.error}")
+        await PropertyService().upsert_properties([
+            (result.property, result.assumptions) for result in report.results if not result.error
+        ])
+
+        logger.info(f"Imported {report.imported} workbooks from {directory} ({report.failed} failed)")
+        return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract deals from a directory of underwriting workbooks")
+    parser.add_argument("directory")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    report = WorkbookImporter(args.workers).extract_directory(args.directory)
+    print(json.dumps(report.model_dump(mode="json", by_alias=True), indent=2))
+
+if __name__ == "__main__":
+    main()
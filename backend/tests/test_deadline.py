@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import pytest
+
+from utils.deadline import DeadlineMiddleware, remaining
+
+def http_scope(path: str = "/api/properties") -> dict:
+    return {"type": "http", "method": "GET", "path": path, "headers": []}
+
+class Client:
+    """A connection that stays open until ``disconnect()`` and records what was sent to it."""
+
+    def __init__(self):
+        self.sent = []
+        self._gone = asyncio.Event()
+        self._requested = False
+
+    async def receive(self):
+        if not self._requested:
+            self._requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self._gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    def disconnect(self):
+        self._gone.set()
+
+    @property
+    def status(self):
+        starts = [message["status"] for message in self.sent if message["type"] == "http.response.start"]
+        return starts[0] if starts else None
+
+def middleware(app, monkeypatch, deadlines=None, default="30") -> DeadlineMiddleware:
+    monkeypatch.setenv("REQUEST_DEADLINE", default)
+    if deadlines is not None:
+        monkeypatch.setenv("ROUTE_DEADLINES", json.dumps(deadlines))
+    else:
+        monkeypatch.delenv("ROUTE_DEADLINES", raising=False)
+    return DeadlineMiddleware(app)
+
+async def respond(send, body: bytes = b"ok"):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": body})
+
+def test_budget_for_longest_prefix(monkeypatch):
+    deadlines = middleware(None, monkeypatch, {"/api/properties": 5, "/api/properties/import": 60})
+    assert deadlines.budget_for("/api/properties/import") == 60
+    assert deadlines.budget_for("/api/properties/123") == 5
+    # A zero budget means no deadline at all
+    assert deadlines.budget_for("/api/documents/jobs/abc/events") is None
+    assert deadlines.budget_for("/health") == 30
+
+    assert middleware(None, monkeypatch, default="0").budget_for("/health") is None
+
+@pytest.mark.asyncio
+async def test_fast_response_passes_through(monkeypatch):
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen["remaining"] = remaining()
+        await respond(send)
+
+    client = Client()
+    await middleware(app, monkeypatch, {"/api/properties": 5})(http_scope(), client.receive, client.send)
+
+    assert client.status == 200
+    assert 0 < seen["remaining"] <= 5
+
+@pytest.mark.asyncio
+async def test_slow_handler_gets_504(monkeypatch):
+    cancelled = asyncio.Event()
+
+    async def app(scope, receive, send):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        await respond(send)
+
+    client = Client()
+    await middleware(app, monkeypatch, {"/api/properties": 0.05})(http_scope(), client.receive, client.send)
+
+    assert client.status == 504
+    assert json.loads(client.sent[1]["body"]) == {"detail": "Request deadline exceeded"}
+    assert cancelled.is_set()
+
+@pytest.mark.asyncio
+async def test_deadline_lifted_once_response_starts(monkeypatch):
+    seen = {}
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        seen["remaining"] = remaining()
+        # Streaming the body may outlast the budget
+        await asyncio.sleep(0.1)
+        await send({"type": "http.response.body", "body": b"late"})
+
+    client = Client()
+    await middleware(app, monkeypatch, {"/api/properties": 0.05})(http_scope(), client.receive, client.send)
+
+    assert client.status == 200
+    assert [message["type"] for message in client.sent] == ["http.response.start", "http.response.body"]
+    assert seen["remaining"] is None
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_handler(monkeypatch):
+    cancelled = asyncio.Event()
+    started = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await receive()
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        await respond(send)
+
+    client = Client()
+    scope = http_scope()
+    request = asyncio.create_task(middleware(app, monkeypatch)(scope, client.receive, client.send))
+    await started.wait()
+    client.disconnect()
+    await asyncio.wait_for(request, 1)
+
+    # Nobody is left to answer: no 504, nothing sent, and the handler was stopped
+    assert cancelled.is_set()
+    assert client.sent == []
+    assert scope["client_disconnected"] is True
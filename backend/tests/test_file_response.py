@@ -0,0 +1,102 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import documents
+from services import document_cache, render_executor
+from services.document_cache import DocumentCache
+from services.render_executor import RenderExecutor
+from utils.file_response import RangeNotSatisfiable, parse_range
+
+SIZE = 1000
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+    (" bytes=0-0 ", (0, 0)),
+    # Forms served as the whole document instead
+    ("bytes=0-99,200-299", None),
+    ("bytes=-", None),
+    ("items=0-99", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=500-100", "bytes=-0"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, SIZE)
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_cache, "_document_cache", DocumentCache(str(tmp_path)))
+    monkeypatch.setattr(render_executor, "_render_executor", RenderExecutor(mode="thread", max_workers=1))
+    app = FastAPI()
+    app.include_router(documents.router, prefix="/api/documents")
+    return TestClient(app)
+
+DOWNLOAD = "/api/documents/download"
+PARAMS = {"type": "loi", "propertyId": "1"}
+
+def test_download_validators(client):
+    first = client.get(DOWNLOAD, params=PARAMS)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["accept-ranges"] == "bytes"
+    assert int(first.headers["content-length"]) == len(first.content)
+
+    assert client.get(DOWNLOAD, params=PARAMS, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(DOWNLOAD, params=PARAMS, headers={"If-None-Match": f"W/{etag}, \"other\""}).status_code == 304
+    assert client.get(DOWNLOAD, params=PARAMS, headers={"If-None-Match": "*"}).status_code == 304
+    assert client.get(DOWNLOAD, params=PARAMS, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    last_modified = first.headers["last-modified"]
+    assert client.get(DOWNLOAD, params=PARAMS, headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get(
+        DOWNLOAD, params=PARAMS, headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}
+    ).status_code == 200
+
+def test_download_ranges(client):
+    content = client.get(DOWNLOAD, params=PARAMS).content
+    etag = client.get(DOWNLOAD, params=PARAMS).headers["etag"]
+    size = len(content)
+
+    partial = client.get(DOWNLOAD, params=PARAMS, headers={"Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == content[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{size}"
+
+    suffix = client.get(DOWNLOAD, params=PARAMS, headers={"Range": "bytes=-10"})
+    assert suffix.status_code == 206
+    assert suffix.content == content[-10:]
+
+    past_end = client.get(DOWNLOAD, params=PARAMS, headers={"Range": f"bytes={size}-"})
+    assert past_end.status_code == 416
+    assert past_end.headers["content-range"] == f"bytes */{size}"
+
+    # If-Range: the range applies only while the validator still matches
+    matching = client.get(DOWNLOAD, params=PARAMS, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert matching.status_code == 206
+    stale = client.get(DOWNLOAD, params=PARAMS, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == content
+
+def test_download_after_eviction(client, tmp_path):
+    first = client.get(DOWNLOAD, params=PARAMS)
+    cache = document_cache._document_cache
+
+    # Another worker's sweep removed the file and this worker no longer holds the bytes
+    cache._contents.clear()
+    for path in tmp_path.glob("objects/*/*"):
+        path.unlink()
+
+    again = client.get(DOWNLOAD, params=PARAMS)
+    assert again.status_code == 200
+    assert int(again.headers["content-length"]) == len(again.content)
+    assert again.content[:4] == first.content[:4] == b"%PDF"
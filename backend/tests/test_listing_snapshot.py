@@ -0,0 +1,70 @@
+import pytest
+
+from models.document import UnderwritingAssumptions
+from models.property import Property
+from services.listing_snapshot import ListingSnapshotStore
+
+def listing(property_id: str, price: float = 1_000_000, city: str = "Austin") -> Property:
+    return Property(
+        id=property_id,
+        price=price,
+        address=f"{property_id} Main St",
+        city=city,
+        state="TX",
+        zipCode="78701",
+        imageUrl=f"https://example.com/{property_id}.jpg",
+        units=8,
+        capRate=6.5,
+        propertyType="apartment",
+        amenities=["parking"],
+    )
+
+@pytest.fixture
+def store(tmp_path) -> ListingSnapshotStore:
+    return ListingSnapshotStore(str(tmp_path), poll_interval=0)
+
+def snapshot_listings(snapshot):
+    return {property.id: property for property in snapshot.listings(range(snapshot.count))}
+
+def test_upsert_replaces_and_appends(store):
+    store.publish([listing("a"), listing("b"), listing("c")])
+
+    snapshot = store.upsert([listing("b", price=2_000_000, city="Dallas"), listing("d")])
+
+    assert snapshot.count == 4
+    listings = snapshot_listings(snapshot)
+    assert sorted(listings) == ["a", "b", "c", "d"]
+    assert listings["b"].price == 2_000_000
+    assert listings["b"].city == "Dallas"
+    assert listings["a"] == listing("a")
+    assert listings["d"] == listing("d")
+    # Replaced listings keep their row; new ones go at the end
+    assert snapshot.row_for("b") == 1
+    assert snapshot.row_for("d") == 3
+    assert list(snapshot.match_location("dallas").nonzero()[0]) == [1]
+    assert list(snapshot.match_location("austin").nonzero()[0]) == [0, 2, 3]
+
+def test_upsert_without_a_generation(store):
+    snapshot = store.upsert([listing("a"), listing("a", price=3_000_000)])
+
+    # The last of several listings with one ID wins
+    assert snapshot.count == 1
+    assert snapshot.listing(0).price == 3_000_000
+
+def test_upsert_merges_assumptions(store):
+    store.publish([listing("a"), listing("b")], {"a": UnderwritingAssumptions(interestRate=5.0)})
+
+    snapshot = store.upsert([listing("b")], {"b": UnderwritingAssumptions(interestRate=7.0)})
+
+    assert snapshot.assumptions("a").interest_rate == 5.0
+    assert snapshot.assumptions("b").interest_rate == 7.0
+
+def test_other_store_sees_the_upsert(store, tmp_path):
+    store.publish([listing("a")])
+    reader = ListingSnapshotStore(str(tmp_path), poll_interval=0)
+    assert reader.current().count == 1
+
+    store.upsert([listing("b")])
+
+    assert reader.current().count == 2
+    assert reader.current().row_for("b") == 1
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test-shared")
+    release = asyncio.Event()
+    runs = 0
+
+    async def work():
+        nonlocal runs
+        runs += 1
+        await release.wait()
+        return {"value": 42}
+
+    callers = [asyncio.create_task(flight.do("key", work)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers)
+
+    assert runs == 1
+    assert all(result is results[0] for result in results)
+    assert (flight.executed, flight.coalesced) == (1, 4)
+    assert flight.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately():
+    flight = SingleFlight("test-keys")
+
+    async def work(value):
+        await asyncio.sleep(0)
+        return value
+
+    results = await asyncio.gather(flight.do("a", lambda: work(1)), flight.do("b", lambda: work(2)))
+    assert results == [1, 2]
+    assert flight.executed == 2
+
+@pytest.mark.asyncio
+async def test_exception_reaches_every_caller():
+    flight = SingleFlight("test-errors")
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        raise LookupError("upstream failed")
+
+    callers = [asyncio.create_task(flight.do("key", work)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+
+    assert all(isinstance(result, LookupError) for result in results)
+    assert flight.executed == 1
+
+    # Nothing is cached: the next call runs afresh
+    async def recovered():
+        return "ok"
+
+    assert await flight.do("key", recovered) == "ok"
+    assert flight.executed == 2
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_leaves_others_waiting():
+    flight = SingleFlight("test-cancel-one")
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "done"
+
+    first = asyncio.create_task(flight.do("key", work))
+    second = asyncio.create_task(flight.do("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await second == "done"
+    assert first.cancelled()
+
+@pytest.mark.asyncio
+async def test_work_cancelled_once_every_caller_has_gone():
+    flight = SingleFlight("test-cancel-all")
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    callers = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+    await asyncio.sleep(0)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert cancelled.is_set()
+    assert flight.in_flight == 0
+
+    # An abandoned call is not joined by later callers
+    async def fresh():
+        return "fresh"
+
+    assert await flight.do("key", fresh) == "fresh"
@@ -0,0 +1,157 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from services import upstream_scheduler
+from services.upstream_scheduler import UpstreamRejected, UpstreamScheduler, _retry_delay
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+def status_error(status_code: int, headers=None) -> openai.APIStatusError:
+    response = httpx.Response(status_code, headers=headers, request=REQUEST)
+    return openai.APIStatusError("upstream error", response=response, body=None)
+
+def scheduler(**overrides) -> UpstreamScheduler:
+    options = dict(rpm=0, tpm=0, max_concurrency=2, per_user_limit=2, queue_deadline=10, max_retries=2)
+    options.update(overrides)
+    return UpstreamScheduler(**options)
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """Record the retry delays instead of waiting them out."""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(seconds):
+        delays.append(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(upstream_scheduler.asyncio, "sleep", sleep)
+    return delays
+
+def test_per_user_limit():
+    limiter = scheduler(per_user_limit=2)
+    with limiter.caller("alice"), limiter.caller("alice"):
+        with pytest.raises(UpstreamRejected) as rejected:
+            with limiter.caller("alice"):
+                pass
+        assert rejected.value.status_code == 429
+
+        # Other users are unaffected
+        with limiter.caller("bob"):
+            pass
+
+    # Released on exit
+    with limiter.caller("alice"):
+        pass
+    assert limiter._user_calls == {}
+
+@pytest.mark.parametrize("status_code", [400, 401, 404, 422])
+def test_client_errors_are_not_retried(status_code):
+    assert _retry_delay(status_error(status_code), 0) is None
+
+def test_unrelated_errors_are_not_retried():
+    assert _retry_delay(ValueError("bad prompt"), 0) is None
+
+@pytest.mark.parametrize("attempt", range(6))
+def test_backoff_is_bounded(attempt):
+    cap = min(upstream_scheduler.BACKOFF_CAP, upstream_scheduler.BACKOFF_BASE * 2 ** attempt)
+    for error in (status_error(429), status_error(500), openai.APIConnectionError(request=REQUEST)):
+        for _ in range(20):
+            assert 0 <= _retry_delay(error, attempt) <= cap
+
+def test_backoff_honours_retry_after():
+    assert _retry_delay(status_error(429, {"retry-after": "30"}), 0) >= 30
+    # An unparseable header falls back to the computed backoff
+    assert _retry_delay(status_error(503, {"retry-after": "soon"}), 0) <= upstream_scheduler.BACKOFF_BASE
+
+@pytest.mark.asyncio
+async def test_submit_retries_transient_errors(no_sleep):
+    limiter = scheduler(max_retries=3)
+    outcomes = [status_error(500), status_error(502), "ok"]
+
+    async def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert await limiter.submit(call) == "ok"
+    assert len(no_sleep) == 2
+    assert limiter.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_submit_gives_up_after_max_retries(no_sleep):
+    limiter = scheduler(max_retries=2)
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        raise status_error(503)
+
+    with pytest.raises(UpstreamRejected) as rejected:
+        await limiter.submit(call)
+    assert rejected.value.status_code == 503
+    assert calls == 3
+    assert limiter.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_submit_raises_client_errors_at_once(no_sleep):
+    limiter = scheduler()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        raise status_error(400)
+
+    with pytest.raises(openai.APIStatusError):
+        await limiter.submit(call)
+    assert calls == 1
+    assert no_sleep == []
+
+@pytest.mark.asyncio
+async def test_rate_limit_pauses_the_request_bucket(no_sleep):
+    limiter = scheduler(rpm=600)
+    outcomes = [status_error(429, {"retry-after": "5"}), "ok"]
+
+    async def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert await limiter.submit(call) == "ok"
+    assert no_sleep[0] >= 5
+    # Other calls now wait out the pause too
+    assert limiter.requests.wait_time(1) > 4
+
+@pytest.mark.asyncio
+async def test_waiting_calls_are_served_round_robin():
+    limiter = scheduler(max_concurrency=1)
+    gate = asyncio.Event()
+    order = []
+
+    async def blocker():
+        await gate.wait()
+
+    def call(name):
+        async def run():
+            order.append(name)
+        return run
+
+    first = asyncio.create_task(limiter.submit(blocker, "alice"))
+    await asyncio.sleep(0)
+    waiting = [
+        asyncio.create_task(limiter.submit(call(name), user))
+        for name, user in [("a1", "alice"), ("a2", "alice"), ("a3", "alice"), ("b1", "bob")]
+    ]
+    await asyncio.sleep(0)
+    assert limiter.queued == 4
+
+    gate.set()
+    await asyncio.gather(first, *waiting)
+    assert order == ["a1", "b1", "a2", "a3"]
@@ -0,0 +1,95 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+from pydantic import BaseModel
+from models.property import Property
+
+class LRUCache:
+    """Bounded in-memory cache with least-recently-used eviction.
+
+    Bounded by entry count, and optionally by total weight (e.g. bytes) when
+    ``max_weight`` and ``weigh`` are given.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        max_weight: Optional[int] = None,
+        weigh: Optional[Callable[[Any], int]] = None
+    ):
+        self.maxsize = maxsize
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self.weight = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """Store value under key, evicting the oldest entries when full."""
+        if self.weigh is not None and self.max_weight is not None and self.weigh(value) > self.max_weight:
+            # Never let a single oversized value flush the whole cache
+            self.pop(key)
+            return
+
+        self.pop(key)
+        self._entries[key] = value
+        self.weight += self._weight_of(value)
+
+        while len(self._entries) > self.maxsize or self._over_weight():
+            _, evicted = self._entries.popitem(last=False)
+            self.weight -= self._weight_of(evicted)
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self.weight -= self._weight_of(value)
+        return value
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches predicate."""
+        stale = [key for key in self._entries if predicate(key)]
+        for key in stale:
+            self.pop(key)
+        return len(stale)
+
+    def clear(self):
+        self._entries.clear()
+        self.weight = 0
+
+    def _weight_of(self, value: Any) -> int:
+        return self.weigh(value) if self.weigh is not None else 0
+
+    def _over_weight(self) -> bool:
+        return self.max_weight is not None and self.weight > self.max_weight
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+def stable_hash(data: Any) -> str:
+    """Hash JSON-compatible data (or a pydantic model) deterministically."""
+    if isinstance(data, BaseModel):
+        data = data.model_dump(mode="json")
+
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def property_version(property: Property) -> str:
+    """Content version of a listing; changes whenever any listing field changes."""
+    return stable_hash(property)[:16]
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+from contextvars import ContextVar
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds each route may take to start its response, by longest matching path prefix; 0 means no deadline
+DEFAULT_ROUTE_DEADLINES: Dict[str, float] = {
+    "/api/chat": 45,
+    "/api/properties": 15,
+    "/api/properties/import": 300,
+    "/api/documents": 30,
+    "/api/documents/download": 60,
+    "/api/documents/portfolio": 120,
+    "/api/documents/loi/bulk": 120,
+    # Job status streams and profiling sessions are long-lived by design
+    "/api/documents/jobs": 0,
+    "/api/admin": 0,
+}
+
+# Absolute deadline (event loop time) of the request being handled, if it has one
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without one."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - asyncio.get_running_loop().time()
+
+def _route_deadlines() -> Dict[str, float]:
+    deadlines = dict(DEFAULT_ROUTE_DEADLINES)
+    overrides = os.getenv("ROUTE_DEADLINES")
+    if overrides:
+        deadlines.update(json.loads(overrides))
+    return deadlines
+
+class DeadlineMiddleware:
+    """ASGI middleware bounding each request by a deadline and by the client's patience.
+
+    Each request gets a budget from ROUTE_DEADLINES (a JSON object of path
+    prefix to seconds, merged over the defaults above) or REQUEST_DEADLINE. The
+    deadline is visible to services through ``remaining()`` so they can shed or
+    bound upstream calls early; if the response hasn't started by then, the
+    handler is cancelled and the client gets a 504. Once the response starts
+    the deadline is lifted, so large downloads can stream at any speed.
+
+    The connection is watched for the client going away; if it does before the
+    response is complete the handler is cancelled, which cancels the LLM call,
+    search and renders it is waiting on (renders queued for the worker pool are
+    dropped; one already running on a worker finishes).
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.default_budget = float(os.getenv("REQUEST_DEADLINE", "30"))
+        self.route_budgets = sorted(_route_deadlines().items(), key=lambda item: len(item[0]), reverse=True)
+
+    def budget_for(self, path: str) -> Optional[float]:
+        for prefix, budget in self.route_budgets:
+            if path.startswith(prefix):
+                return budget or None
+        return self.default_budget or None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        budget = self.budget_for(scope["path"])
+        messages: asyncio.Queue = asyncio.Queue()
+        response_started = False
+        response_complete = False
+        disconnected = False
+
+        async def watch_connection():
+            # Sole reader of the connection: the app reads through the queue, so a disconnect is seen even
+            # while the app is busy and never reading
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    if not response_complete:
+                        disconnected = True
+                        scope["client_disconnected"] = True
+                        handler.cancel()
+                    return
+
+        async def send_tracking(message):
+            nonlocal response_started, response_complete
+            if message["type"] == "http.response.start":
+                response_started = True
+                # The deadline bounds time to first byte, not how long the body takes to stream
+                _deadline.set(None)
+                if timeout is not None:
+                    timeout.reschedule(None)
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        timeout: Optional[asyncio.Timeout] = None
+
+        async def handle():
+            nonlocal timeout
+            if budget is not None:
+                _deadline.set(loop.time() + budget)
+            async with asyncio.timeout(budget) as timeout:
+                await self.app(scope, messages.get, send_tracking)
+
+        handler = asyncio.create_task(handle())
+        watcher = asyncio.create_task(watch_connection())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not disconnected:
+                raise
+            logger.info(f"Client disconnected, cancelled {scope['method']} {scope['path']}")
+        except TimeoutError:
+            if timeout is None or not timeout.expired():
+                raise
+            logger.warning(f"{scope['method']} {scope['path']} exceeded its {budget:g}s deadline")
+            if not response_started:
+                body = b'{"detail":"Request deadline exceeded"}'
+                await send({
+                    "type": "http.response.start",
+                    "status": 504,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+                })
+                await send({"type": "http.response.body", "body": body})
+        finally:
+            watcher.cancel()
+            if not handler.done():
+                handler.cancel()
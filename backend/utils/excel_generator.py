@@ -1,14 +1,180 @@
+import copy
+import os
+import threading
 import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.chart import LineChart, Reference, BarChart
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment
+from openpyxl.utils import quote_sheetname
+from openpyxl.workbook.defined_name import DefinedName
 from io import BytesIO
-from datetime import datetime
-from typing import BinaryIO
+from typing import Any, Dict, List, Optional
 from models.property import Property
-from models.document import UnderwritingAnalysis
+from models.document import EXPENSE_CATEGORIES, PROJECTION_YEARS, UnderwritingAnalysis, UnderwritingAssumptions
+from utils.excel_template import PlaceholderValues, StyleSlot, TemplateMismatch, WorkbookTemplate
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Shared cell styles. Each is registered with a workbook once and then copied onto
+# cells as a precomputed style array instead of building Font objects per cell.
+CELL_STYLES: Dict[str, Dict[str, Any]] = {
+    "title": {"font": Font(size=16, bold=True)},
+    "sheet_title": {"font": Font(size=14, bold=True)},
+    "section": {"font": Font(bold=True, size=12)},
+    "bold": {"font": Font(bold=True)},
+    "positive": {"font": Font(bold=True, color="00800000")},  # Green
+    "negative": {"font": Font(bold=True, color="00FF0000")},  # Red
+    "header": {"font": Font(bold=True), "alignment": Alignment(horizontal='center')},
+    "currency": {"number_format": '"$"#,##0'},
+    "percent": {"number_format": '0.00"%"'},
+    "ratio": {"number_format": '0.00'},
+    # Formula workbooks: blue inputs, black formulas (same convention as the REanalysis model)
+    "input_currency": {"font": Font(color="000000FF"), "number_format": '"$"#,##0'},
+    "input_percent": {"font": Font(color="000000FF"), "number_format": '0.00%'},
+    "input_number": {"font": Font(color="000000FF"), "number_format": '0'},
+    "formula_percent": {"number_format": '0.00%'},
+    "bold_currency": {"font": Font(bold=True), "number_format": '"$"#,##0'},
+}
+
+# Portfolio comparison columns: (header, batch metric or property attribute, style)
+PORTFOLIO_COLUMNS = [
+    ("Property ID", "id", None),
+    ("Address", "address", None),
+    ("City", "city", None),
+    ("State", "state", None),
+    ("Property Type", "property_type", None),
+    ("Units", "units", None),
+    ("Year Built", "year_built", None),
+    ("Purchase Price", "purchase_price", "currency"),
+    ("Down Payment", "down_payment", "currency"),
+    ("Loan Amount", "loan_amount", "currency"),
+    ("Monthly Rent", "monthly_rent", "currency"),
+    ("Gross Rental Income", "gross_rental_income", "currency"),
+    ("Operating Expenses", "total_operating_expenses", "currency"),
+    ("NOI", "net_operating_income", "currency"),
+    ("Annual Debt Service", "annual_debt_service", "currency"),
+    ("Annual Cash Flow", "annual_cash_flow", "currency"),
+    ("Monthly Cash Flow", "monthly_cash_flow", "currency"),
+    ("Cap Rate", "cap_rate", "percent"),
+    ("Cash-on-Cash Return", "cash_on_cash_return", "percent"),
+    ("DSCR", "debt_service_coverage", "ratio"),
+    ("Gross Rent Multiplier", "gross_rent_multiplier", "ratio"),
+    ("Loan-to-Value", "loan_to_value", "percent"),
+    ("Expense Ratio", "expense_ratio", "percent"),
+    ("NOI Margin", "noi_margin", "percent"),
+    ("Price per Unit", "price_per_unit", "currency"),
+    ("NOI per Unit", "noi_per_unit", "currency"),
+    ("Cash Flow per Unit", "cash_flow_per_unit", "currency"),
+]
+
+# Per-year columns of the 10-year projection sheet
+PROJECTION_COLUMNS = ["rent", "expenses", "noi", "debt_service", "cash_flow", "cumulative_cash_flow"]
+
+_INVALID_SHEET_CHARACTERS = str.maketrans({c: " " for c in "[]:*?/\\"})
+
+class SheetWriter:
+    """Appends rows to a worksheet in order.
+
+    Works the same for normal and write-only (streaming) workbooks, so sheets are
+    always written sequentially and never addressed by coordinate.
+    """
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.row = 0  # Index of the last row written
+        self._style_arrays = {}
+
+    def cell(self, value: Any, style: Optional[str] = None):
+        """Return value as a cell carrying one of CELL_STYLES, or as-is when unstyled."""
+        if style is None:
+            return value
+        if isinstance(style, StyleSlot):
+            # Template skeleton: the style is filled in along with the value
+            return style.mark(value)
+
+        cell = WriteOnlyCell(self.worksheet, value=value)
+        cell._style = copy.copy(self._style_array(style))
+        return cell
+
+    def append(self, *values: Any):
+        self.worksheet.append(values)
+        self.row += 1
+
+    def blank(self, count: int = 1):
+        for _ in range(count):
+            self.worksheet.append([])
+        self.row += count
+
+    def name_last_row(self, name: str, column: str = "B"):
+        """Define a workbook-level name pointing at a cell of the last row written."""
+        reference = f"{quote_sheetname(self.worksheet.title)}!${column}${self.row}"
+        self.worksheet.parent.defined_names[name] = DefinedName(name, attr_text=reference)
+
+    def title(self, text: str, style: str = "sheet_title", merge_to: Optional[str] = None):
+        self.append(self.cell(text, style))
+        if merge_to:
+            self.worksheet.merged_cells.add(f"A1:{merge_to}1")
+
+    def section(self, heading: str, items, value_style: Optional[str] = None):
+        """Write a section heading followed by one label/value row per item."""
+        self.append(self.cell(heading, "section"))
+        for label, value in items:
+            self.append(label, self.cell(value, value_style))
+
+    def style_id(self, style: str) -> int:
+        """Register a named style with the workbook and return its cell format index."""
+        return self.worksheet.parent._cell_styles.add(self._style_array(style))
+    
+    def _style_array(self, style: str):
+        style_array = self._style_arrays.get(style)
+        if style_array is None:
+            prototype = WriteOnlyCell(self.worksheet)
+            for attribute, value in CELL_STYLES[style].items():
+                setattr(prototype, attribute, value)
+            style_array = self._style_arrays[style] = prototype._style
+        return style_array
+
+_underwriting_template: Optional[WorkbookTemplate] = None
+_template_unavailable = False
+_template_lock = threading.Lock()
+
+def get_underwriting_template() -> Optional[WorkbookTemplate]:
+    """Return this process's underwriting workbook template, building it on first use.
+    
+    The skeleton is laid out by the same sheet code as a normal render, with every
+    variable cell holding a placeholder, then compiled once and reused. Returns
+    None, so renders lay out their sheets with openpyxl, if the compiled template
+    doesn't account for every placeholder.
+    """
+    global _underwriting_template, _template_unavailable
+    with _template_lock:
+        if _underwriting_template is None and not _template_unavailable:
+            generator = ExcelGenerator(streaming=True, template=False)
+            generator._new_workbook()
+            values = PlaceholderValues()
+            generator._create_underwriting_sheets(values)
+            
+            # Register every style up front so a render may switch a slot to any of them
+            style_sheet = SheetWriter(generator.workbook.worksheets[0])
+            style_ids = {style: style_sheet.style_id(style) for style in CELL_STYLES}
+            
+            try:
+                _underwriting_template = WorkbookTemplate(generator._save().getvalue(), style_ids, values.requested)
+            except TemplateMismatch as e:
+                logger.warning(f"Underwriting template unavailable, rendering with openpyxl instead: {e}")
+                _template_unavailable = True
+        return _underwriting_template
 
 class ExcelGenerator:
-    def __init__(self):
+    def __init__(self, streaming: Optional[bool] = None, template: Optional[bool] = None):
+        # Write-only workbooks stream rows to disk-backed storage, keeping memory flat
+        if streaming is None:
+            streaming = os.getenv("EXCEL_STREAMING", "true").lower() == "true"
+        # Template mode fills a precompiled skeleton instead of laying out sheets per render
+        if template is None:
+            template = os.getenv("EXCEL_TEMPLATE", "true").lower() == "true"
+        self.streaming = streaming
+        self.template = get_underwriting_template() if template else None
         self.workbook = None
         
     def generate_underwriting_excel(
@@ -18,353 +184,526 @@ class ExcelGenerator:
     ) -> BytesIO:
         """Generate comprehensive underwriting Excel file."""
         
-        self.workbook = openpyxl.Workbook()
+        cells = self._underwriting_cells(property, analysis)
+        if self.template is not None:
+            return self.template.render(cells)
+        
+        self._new_workbook()
+        self._create_underwriting_sheets(cells)
+        
+        return self._save()
+    
+    def generate_formula_excel(
+        self,
+        property: Property,
+        assumptions: Optional[UnderwritingAssumptions] = None
+    ) -> BytesIO:
+        """Generate a live underwriting workbook driven by Excel formulas.
+        
+        Every assumption is a numeric input cell on the Assumptions sheet with a
+        workbook-level name, and all other figures are formulas over those names,
+        so analysts can change an input and see the whole model recalculate.
+        """
+        
+        assumptions = assumptions or UnderwritingAssumptions()
+        
+        self._new_workbook()
+        
+        self._create_formula_summary(property)
+        self._create_formula_assumptions(property, assumptions)
+        self._create_formula_cash_flow()
+        self._create_formula_projection()
+        self._create_formula_ratios()
+        
+        return self._save()
+    
+    def generate_portfolio_excel(
+        self,
+        properties: List[Property],
+        metrics: Dict[str, Any],
+        analyses: Optional[List[UnderwritingAnalysis]] = None
+    ) -> BytesIO:
+        """Generate one workbook comparing many properties, one row per property.
+        
+        ``metrics`` is the portfolio's batch underwriting result (one entry per
+        property in each array); ``analyses``, if given, adds a summary sheet
+        per property.
+        """
+        
+        # Large portfolios always stream so memory stays flat as rows grow
+        self._new_workbook(streaming=True)
+        
+        self._create_portfolio_comparison(properties, metrics)
+        
+        if analyses:
+            for index, (property, analysis) in enumerate(zip(properties, analyses)):
+                title = f"{index + 1} {property.address}".translate(_INVALID_SHEET_CHARACTERS)[:31]
+                self._create_executive_summary(self._underwriting_cells(property, analysis), title=title)
+        
+        return self._save()
+    
+    def _new_workbook(self, streaming: Optional[bool] = None):
+        self.workbook = openpyxl.Workbook(write_only=self.streaming if streaming is None else streaming)
         
         # Remove default sheet
         if 'Sheet' in self.workbook.sheetnames:
             self.workbook.remove(self.workbook['Sheet'])
-        
-        # Create worksheets
-        self._create_executive_summary(property, analysis)
-        self._create_cash_flow_analysis(property, analysis)
-        self._create_10_year_projection(property, analysis)
-        self._create_ratios_metrics(property, analysis)
-        
+    
+    def _new_sheet(self, title: str) -> SheetWriter:
+        return SheetWriter(self.workbook.create_sheet(title))
+    
+    def _save(self) -> BytesIO:
         # Save to BytesIO
         excel_buffer = BytesIO()
         self.workbook.save(excel_buffer)
         excel_buffer.seek(0)
+        self.workbook = None
         
         return excel_buffer
     
-    def _create_executive_summary(self, property: Property, analysis: UnderwritingAnalysis):
-        """Create executive summary worksheet."""
-        ws = self.workbook.create_sheet("Executive Summary")
+    def _create_portfolio_comparison(self, properties: List[Property], metrics: Dict[str, Any]):
+        """Create the portfolio comparison worksheet."""
+        sheet = self._new_sheet("Portfolio Comparison")
         
         # Title
-        ws['A1'] = "INVESTMENT PROPERTY UNDERWRITING ANALYSIS"
-        ws['A1'].font = Font(size=16, bold=True)
-        ws.merge_cells('A1:E1')
-        
-        row = 3
+        sheet.title(f"PORTFOLIO UNDERWRITING COMPARISON ({len(properties)} PROPERTIES)", style="title")
+        sheet.blank()
         
-        # Property Information
-        ws[f'A{row}'] = "Property Information"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
+        # Headers
+        sheet.append(*[sheet.cell(header, "header") for header, _, _ in PORTFOLIO_COLUMNS])
         
-        property_info = [
-            ("Address:", property.address),
-            ("City:", property.city),
-            ("State:", property.state),
-            ("ZIP Code:", property.zip_code),
-            ("Units:", property.units),
-            ("Property Type:", property.property_type.value),
-            ("Year Built:", property.year_built or 'N/A'),
-            ("Square Footage:", property.square_footage or 'N/A'),
+        # Convert metric arrays to Python lists once instead of indexing numpy per cell
+        columns = [
+            (metrics[source].tolist() if source in metrics else None, source, style)
+            for _, source, style in PORTFOLIO_COLUMNS
         ]
         
-        for label, value in property_info:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            row += 1
+        for index, property in enumerate(properties):
+            sheet.append(*[
+                sheet.cell(values[index] if values is not None else getattr(property, source), style)
+                for values, source, style in columns
+            ])
+    
+    def _create_underwriting_sheets(self, cells: Dict[str, Any]):
+        self._create_executive_summary(cells)
+        self._create_cash_flow_analysis(cells)
+        self._create_10_year_projection(cells)
+        self._create_ratios_metrics(cells)
+    
+    def _underwriting_cells(self, property: Property, analysis: UnderwritingAnalysis) -> Dict[str, Any]:
+        """Every variable cell of the underwriting workbook, keyed by name.
+        
+        The value-mode sheets are laid out from this dict alone, which is what lets
+        the template mode fill the same layout without rebuilding it.
+        """
+        calculations = analysis.calculations
+        total_expenses = analysis.operating_expenses.total
+        gross_rental_income = calculations.gross_rental_income
+        
+        cells = {
+            # Property information
+            "address": property.address,
+            "city": property.city,
+            "state": property.state,
+            "zip_code": property.zip_code,
+            "units": property.units,
+            "property_type": property.property_type,
+            "year_built": property.year_built or 'N/A',
+            "square_footage": property.square_footage or 'N/A',
+            # Purchase information
+            "purchase_price": f"${analysis.purchase_price:,.0f}",
+            "down_payment": f"${analysis.down_payment:,.0f}",
+            "loan_amount": f"${analysis.loan_amount:,.0f}",
+            "interest_rate": f"{analysis.interest_rate:.2f}%",
+            "loan_term": f"{analysis.loan_term} years",
+            # Key metrics
+            "cap_rate": f"{calculations.cap_rate:.2f}%",
+            "cash_on_cash_return": f"{calculations.cash_on_cash_return:.2f}%",
+            "debt_service_coverage": f"{calculations.debt_service_coverage:.2f}",
+            "monthly_cash_flow": f"${calculations.monthly_cash_flow:,.0f}",
+            "annual_cash_flow": f"${calculations.annual_cash_flow:,.0f}",
+            # Color code positive/negative annual cash flow
+            "annual_cash_flow_style": "positive" if calculations.annual_cash_flow > 0 else "negative",
+            # Cash flow
+            "monthly_rent": f"${analysis.monthly_rent:,.0f}",
+            "gross_rental_income": f"${gross_rental_income:,.0f}",
+            "vacancy_label": f"Less: Vacancy ({analysis.vacancy}%):",
+            "vacancy_loss": f"-${gross_rental_income * analysis.vacancy / 100:,.0f}",
+            "effective_rental_income": f"${gross_rental_income * (1 - analysis.vacancy / 100):,.0f}",
+            "total_operating_expenses": f"${total_expenses:,.0f}",
+            "net_operating_income": f"${calculations.net_operating_income:,.0f}",
+            "monthly_debt_service": f"${calculations.monthly_debt_service:,.0f}",
+            "annual_debt_service": f"${calculations.monthly_debt_service * 12:,.0f}",
+            # Ratios
+            "gross_rent_multiplier": f"{analysis.purchase_price / gross_rental_income:.2f}",
+            "loan_to_value": f"{(analysis.loan_amount / analysis.purchase_price) * 100:.2f}%",
+            "expense_ratio": f"{(total_expenses / gross_rental_income) * 100:.2f}%",
+            "noi_margin": f"{(calculations.net_operating_income / gross_rental_income) * 100:.2f}%",
+            "price_per_unit": f"${analysis.purchase_price / property.units:,.0f}",
+            "noi_per_unit": f"${calculations.net_operating_income / property.units:,.0f}",
+            "cash_flow_per_unit": f"${calculations.annual_cash_flow / property.units:,.0f}",
+        }
+        
+        for category in EXPENSE_CATEGORIES:
+            cells[category] = f"${getattr(analysis.operating_expenses, category):,.0f}"
+        
+        # 10-year projection, as computed with the analysis
+        projection = analysis.projection
+        for index, year in enumerate(projection.years):
+            for column, series in zip(PROJECTION_COLUMNS, [
+                projection.rental_income, projection.operating_expenses, projection.net_operating_income,
+                projection.debt_service, projection.cash_flow, projection.cumulative_cash_flow
+            ]):
+                cells[f"year_{year}_{column}"] = round(series[index])
+        
+        return cells
+    
+    def _create_executive_summary(self, cells: Dict[str, Any], title: str = "Executive Summary"):
+        """Create executive summary worksheet."""
+        sheet = self._new_sheet(title)
+        
+        # Title
+        sheet.title("INVESTMENT PROPERTY UNDERWRITING ANALYSIS", style="title", merge_to="E")
+        sheet.blank()
         
-        row += 1
+        # Property Information
+        property_info = [
+            ("Address:", cells["address"]),
+            ("City:", cells["city"]),
+            ("State:", cells["state"]),
+            ("ZIP Code:", cells["zip_code"]),
+            ("Units:", cells["units"]),
+            ("Property Type:", cells["property_type"]),
+            ("Year Built:", cells["year_built"]),
+            ("Square Footage:", cells["square_footage"]),
+        ]
+        sheet.section("Property Information", property_info)
+        sheet.blank()
         
         # Purchase Information
-        ws[f'A{row}'] = "Purchase Information"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
-        
         purchase_info = [
-            ("Purchase Price:", f"${analysis.purchase_price:,.0f}"),
-            ("Down Payment:", f"${analysis.down_payment:,.0f}"),
-            ("Loan Amount:", f"${analysis.loan_amount:,.0f}"),
-            ("Interest Rate:", f"{analysis.interest_rate:.2f}%"),
-            ("Loan Term:", f"{analysis.loan_term} years"),
+            ("Purchase Price:", cells["purchase_price"]),
+            ("Down Payment:", cells["down_payment"]),
+            ("Loan Amount:", cells["loan_amount"]),
+            ("Interest Rate:", cells["interest_rate"]),
+            ("Loan Term:", cells["loan_term"]),
         ]
-        
-        for label, value in purchase_info:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            row += 1
-        
-        row += 1
+        sheet.section("Purchase Information", purchase_info)
+        sheet.blank()
         
         # Key Metrics
-        ws[f'A{row}'] = "Key Metrics"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
-        
         metrics = [
-            ("Cap Rate:", f"{analysis.calculations.cap_rate:.2f}%"),
-            ("Cash-on-Cash Return:", f"{analysis.calculations.cash_on_cash_return:.2f}%"),
-            ("Debt Service Coverage:", f"{analysis.calculations.debt_service_coverage:.2f}"),
-            ("Monthly Cash Flow:", f"${analysis.calculations.monthly_cash_flow:,.0f}"),
-            ("Annual Cash Flow:", f"${analysis.calculations.annual_cash_flow:,.0f}"),
+            ("Cap Rate:", cells["cap_rate"]),
+            ("Cash-on-Cash Return:", cells["cash_on_cash_return"]),
+            ("Debt Service Coverage:", cells["debt_service_coverage"]),
+            ("Monthly Cash Flow:", cells["monthly_cash_flow"]),
+            ("Annual Cash Flow:", cells["annual_cash_flow"]),
         ]
-        
-        for label, value in metrics:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            # Highlight key metrics
-            ws[f'B{row}'].font = Font(bold=True)
-            row += 1
+        # Highlight key metrics
+        sheet.section("Key Metrics", metrics, value_style="bold")
     
-    def _create_cash_flow_analysis(self, property: Property, analysis: UnderwritingAnalysis):
+    def _create_cash_flow_analysis(self, cells: Dict[str, Any]):
         """Create cash flow analysis worksheet."""
-        ws = self.workbook.create_sheet("Cash Flow Analysis")
+        sheet = self._new_sheet("Cash Flow Analysis")
         
         # Title
-        ws['A1'] = "CASH FLOW ANALYSIS"
-        ws['A1'].font = Font(size=14, bold=True)
-        
-        row = 3
+        sheet.title("CASH FLOW ANALYSIS")
+        sheet.blank()
         
         # Income section
-        ws[f'A{row}'] = "Income"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
-        
         income_items = [
-            ("Gross Rental Income (Monthly):", f"${analysis.monthly_rent:,.0f}"),
-            ("Gross Rental Income (Annual):", f"${analysis.calculations.gross_rental_income:,.0f}"),
-            (f"Less: Vacancy ({analysis.vacancy}%):", f"-${analysis.calculations.gross_rental_income * analysis.vacancy / 100:,.0f}"),
-            ("Effective Rental Income:", f"${analysis.calculations.gross_rental_income * (1 - analysis.vacancy / 100):,.0f}"),
+            ("Gross Rental Income (Monthly):", cells["monthly_rent"]),
+            ("Gross Rental Income (Annual):", cells["gross_rental_income"]),
+            (cells["vacancy_label"], cells["vacancy_loss"]),
+            ("Effective Rental Income:", cells["effective_rental_income"]),
         ]
-        
-        for label, value in income_items:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            row += 1
-        
-        row += 1
+        sheet.section("Income", income_items)
+        sheet.blank()
         
         # Operating Expenses
-        ws[f'A{row}'] = "Operating Expenses"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
-        
         expenses = [
-            ("Management:", f"${analysis.operating_expenses.management:,.0f}"),
-            ("Maintenance & Repairs:", f"${analysis.operating_expenses.maintenance:,.0f}"),
-            ("Insurance:", f"${analysis.operating_expenses.insurance:,.0f}"),
-            ("Property Taxes:", f"${analysis.operating_expenses.taxes:,.0f}"),
-            ("Utilities:", f"${analysis.operating_expenses.utilities:,.0f}"),
-            ("Other Expenses:", f"${analysis.operating_expenses.other:,.0f}"),
+            ("Management:", cells["management"]),
+            ("Maintenance & Repairs:", cells["maintenance"]),
+            ("Insurance:", cells["insurance"]),
+            ("Property Taxes:", cells["taxes"]),
+            ("Utilities:", cells["utilities"]),
+            ("Other Expenses:", cells["other"]),
         ]
         
-        total_expenses = sum([
-            analysis.operating_expenses.management,
-            analysis.operating_expenses.maintenance,
-            analysis.operating_expenses.insurance,
-            analysis.operating_expenses.taxes,
-            analysis.operating_expenses.utilities,
-            analysis.operating_expenses.other,
-        ])
-        
-        for label, value in expenses:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            row += 1
-        
-        ws[f'A{row}'] = "Total Operating Expenses:"
-        ws[f'B{row}'] = f"${total_expenses:,.0f}"
-        ws[f'A{row}'].font = Font(bold=True)
-        ws[f'B{row}'].font = Font(bold=True)
-        row += 2
+        sheet.section("Operating Expenses", expenses)
+        sheet.append(
+            sheet.cell("Total Operating Expenses:", "bold"),
+            sheet.cell(cells["total_operating_expenses"], "bold")
+        )
+        sheet.blank()
         
         # NOI and Cash Flow
-        ws[f'A{row}'] = "Net Operating Income (NOI):"
-        ws[f'B{row}'] = f"${analysis.calculations.net_operating_income:,.0f}"
-        ws[f'A{row}'].font = Font(bold=True)
-        ws[f'B{row}'].font = Font(bold=True)
-        row += 2
+        sheet.append(
+            sheet.cell("Net Operating Income (NOI):", "bold"),
+            sheet.cell(cells["net_operating_income"], "bold")
+        )
+        sheet.blank()
         
         # Debt Service
-        ws[f'A{row}'] = "Debt Service"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
-        
         debt_items = [
-            ("Monthly Debt Service:", f"${analysis.calculations.monthly_debt_service:,.0f}"),
-            ("Annual Debt Service:", f"${analysis.calculations.monthly_debt_service * 12:,.0f}"),
+            ("Monthly Debt Service:", cells["monthly_debt_service"]),
+            ("Annual Debt Service:", cells["annual_debt_service"]),
         ]
+        sheet.section("Debt Service", debt_items)
+        sheet.blank()
         
-        for label, value in debt_items:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            row += 1
+        # Final Cash Flow
+        sheet.append(sheet.cell("Cash Flow", "section"))
+        sheet.append(
+            "Before-Tax Cash Flow (Annual):",
+            sheet.cell(cells["annual_cash_flow"], cells["annual_cash_flow_style"])
+        )
+        sheet.append(
+            "Before-Tax Cash Flow (Monthly):",
+            sheet.cell(cells["monthly_cash_flow"], "bold")
+        )
+    
+    def _create_formula_summary(self, property: Property):
+        """Create executive summary worksheet for the formula workbook."""
+        sheet = self._new_sheet("Executive Summary")
         
-        row += 1
+        sheet.title("INVESTMENT PROPERTY UNDERWRITING ANALYSIS", style="title", merge_to="E")
+        sheet.blank()
         
-        # Final Cash Flow
-        ws[f'A{row}'] = "Cash Flow"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
+        property_info = [
+            ("Address:", property.address),
+            ("City:", property.city),
+            ("State:", property.state),
+            ("ZIP Code:", property.zip_code),
+            ("Units:", property.units),
+            ("Property Type:", property.property_type),
+            ("Year Built:", property.year_built or 'N/A'),
+            ("Square Footage:", property.square_footage or 'N/A'),
+        ]
+        sheet.section("Property Information", property_info)
+        sheet.blank()
+        
+        sheet.append(sheet.cell("Purchase Information", "section"))
+        sheet.append("Purchase Price:", sheet.cell("=PurchasePrice", "currency"))
+        sheet.append("Down Payment:", sheet.cell("=DownPayment", "currency"))
+        sheet.append("Loan Amount:", sheet.cell("=LoanAmount", "currency"))
+        sheet.append("Interest Rate:", sheet.cell("=InterestRate", "formula_percent"))
+        sheet.append("Loan Term (Years):", "=LoanTerm")
+        sheet.blank()
+        
+        sheet.append(sheet.cell("Key Metrics", "section"))
+        sheet.append("Cap Rate:", sheet.cell("=NetOperatingIncome/PurchasePrice", "formula_percent"))
+        sheet.append("Cash-on-Cash Return:", sheet.cell("=AnnualCashFlow/DownPayment", "formula_percent"))
+        sheet.append("Debt Service Coverage:", sheet.cell("=NetOperatingIncome/AnnualDebtService", "ratio"))
+        sheet.append("Monthly Cash Flow:", sheet.cell("=AnnualCashFlow/12", "bold_currency"))
+        sheet.append("Annual Cash Flow:", sheet.cell("=AnnualCashFlow", "bold_currency"))
+    
+    def _create_formula_assumptions(self, property: Property, assumptions: UnderwritingAssumptions):
+        """Create the input sheet; every input gets a workbook-level name."""
+        sheet = self._new_sheet("Assumptions")
+        
+        sheet.title("UNDERWRITING ASSUMPTIONS")
+        sheet.append("Blue cells are inputs. Change them and every sheet recalculates.")
+        sheet.blank()
+        
+        sections = [
+            ("Purchase & Financing", [
+                ("Purchase Price:", "PurchasePrice", property.price, "input_currency"),
+                ("Down Payment:", "DownPaymentPct", assumptions.down_payment_percentage, "input_percent"),
+                ("Interest Rate:", "InterestRate", assumptions.interest_rate / 100, "input_percent"),
+                ("Loan Term (Years):", "LoanTerm", assumptions.loan_term, "input_number"),
+                ("Units:", "Units", property.units, "input_number"),
+            ]),
+            ("Income", [
+                ("Monthly Rent (% of Price):", "RentToPrice", assumptions.rent_to_price_ratio, "input_percent"),
+                ("Vacancy Rate:", "VacancyRate", assumptions.vacancy / 100, "input_percent"),
+                ("Annual Rent Growth:", "RentGrowth", assumptions.rent_growth, "input_percent"),
+            ]),
+            ("Operating Expenses (% of Effective Income)", [
+                ("Management:", "ManagementRate", assumptions.management_rate, "input_percent"),
+                ("Maintenance & Repairs:", "MaintenanceRate", assumptions.maintenance_rate, "input_percent"),
+                ("Insurance:", "InsuranceRate", assumptions.insurance_rate, "input_percent"),
+                ("Property Taxes:", "TaxRate", assumptions.tax_rate, "input_percent"),
+                ("Utilities:", "UtilitiesRate", assumptions.utilities_rate, "input_percent"),
+                ("Other Expenses:", "OtherRate", assumptions.other_rate, "input_percent"),
+                ("Annual Expense Growth:", "ExpenseGrowth", assumptions.expense_growth, "input_percent"),
+            ]),
+        ]
+        
+        for heading, inputs in sections:
+            sheet.append(sheet.cell(heading, "section"))
+            for label, name, value, style in inputs:
+                sheet.append(label, sheet.cell(value, style))
+                sheet.name_last_row(name)
+            sheet.blank()
+    
+    def _create_formula_cash_flow(self):
+        """Create cash flow analysis worksheet from formulas over the assumptions."""
+        sheet = self._new_sheet("Cash Flow Analysis")
+        
+        sheet.title("CASH FLOW ANALYSIS")
+        sheet.blank()
+        
+        def line(label: str, formula: str, name: Optional[str] = None, style: str = "currency"):
+            sheet.append(label, sheet.cell(formula, style))
+            if name:
+                sheet.name_last_row(name)
+        
+        sheet.append(sheet.cell("Financing", "section"))
+        line("Down Payment:", "=PurchasePrice*DownPaymentPct", "DownPayment")
+        line("Loan Amount:", "=PurchasePrice-DownPayment", "LoanAmount")
+        sheet.blank()
+        
+        sheet.append(sheet.cell("Income", "section"))
+        line("Gross Rental Income (Monthly):", "=PurchasePrice*RentToPrice", "MonthlyRent")
+        line("Gross Rental Income (Annual):", "=MonthlyRent*12", "GrossRentalIncome")
+        line("Less: Vacancy:", "=-GrossRentalIncome*VacancyRate")
+        line("Effective Rental Income:", "=GrossRentalIncome*(1-VacancyRate)", "EffectiveGrossIncome")
+        sheet.blank()
+        
+        sheet.append(sheet.cell("Operating Expenses", "section"))
+        first_expense_row = sheet.row + 1
+        line("Management:", "=EffectiveGrossIncome*ManagementRate")
+        line("Maintenance & Repairs:", "=EffectiveGrossIncome*MaintenanceRate")
+        line("Insurance:", "=EffectiveGrossIncome*InsuranceRate")
+        line("Property Taxes:", "=EffectiveGrossIncome*TaxRate")
+        line("Utilities:", "=EffectiveGrossIncome*UtilitiesRate")
+        line("Other Expenses:", "=EffectiveGrossIncome*OtherRate")
+        sheet.append(
+            sheet.cell("Total Operating Expenses:", "bold"),
+            sheet.cell(f"=SUM(B{first_expense_row}:B{sheet.row})", "bold_currency")
+        )
+        sheet.name_last_row("TotalOperatingExpenses")
+        sheet.blank()
+        
+        sheet.append(
+            sheet.cell("Net Operating Income (NOI):", "bold"),
+            sheet.cell("=EffectiveGrossIncome-TotalOperatingExpenses", "bold_currency")
+        )
+        sheet.name_last_row("NetOperatingIncome")
+        sheet.blank()
+        
+        sheet.append(sheet.cell("Debt Service", "section"))
+        line("Monthly Debt Service:", "=PMT(InterestRate/12,LoanTerm*12,-LoanAmount)", "MonthlyDebtService")
+        line("Annual Debt Service:", "=MonthlyDebtService*12", "AnnualDebtService")
+        sheet.blank()
+        
+        sheet.append(sheet.cell("Cash Flow", "section"))
+        line("Before-Tax Cash Flow (Annual):", "=NetOperatingIncome-AnnualDebtService", "AnnualCashFlow", "bold_currency")
+        line("Before-Tax Cash Flow (Monthly):", "=AnnualCashFlow/12", style="bold_currency")
+    
+    def _create_formula_projection(self):
+        """Create 10-year projection worksheet from formulas."""
+        sheet = self._new_sheet("10-Year Projection")
         
-        cash_flow_items = [
-            ("Before-Tax Cash Flow (Annual):", f"${analysis.calculations.annual_cash_flow:,.0f}"),
-            ("Before-Tax Cash Flow (Monthly):", f"${analysis.calculations.monthly_cash_flow:,.0f}"),
+        sheet.title("10-YEAR CASH FLOW PROJECTION")
+        sheet.blank()
+        
+        headers = ["Year", "Rental Income", "Operating Expenses", "NOI", "Debt Service", "Cash Flow", "Cumulative CF"]
+        sheet.append(*[sheet.cell(header, "header") for header in headers])
+        
+        first_row = sheet.row + 1
+        for year in range(1, PROJECTION_YEARS + 1):
+            row = sheet.row + 1
+            formulas = [
+                f"=EffectiveGrossIncome*(1+RentGrowth)^(A{row}-1)",
+                f"=TotalOperatingExpenses*(1+ExpenseGrowth)^(A{row}-1)",
+                f"=B{row}-C{row}",
+                "=AnnualDebtService",
+                f"=D{row}-E{row}",
+                f"=SUM(F${first_row}:F{row})",
+            ]
+            sheet.append(year, *[sheet.cell(formula, "currency") for formula in formulas])
+    
+    def _create_formula_ratios(self):
+        """Create ratios and metrics worksheet from formulas."""
+        sheet = self._new_sheet("Ratios & Metrics")
+        
+        sheet.title("INVESTMENT RATIOS & METRICS")
+        sheet.blank()
+        
+        sections = [
+            ("Profitability Ratios", [
+                ("Cap Rate:", "=NetOperatingIncome/PurchasePrice", "formula_percent"),
+                ("Cash-on-Cash Return:", "=AnnualCashFlow/DownPayment", "formula_percent"),
+                ("Gross Rent Multiplier:", "=PurchasePrice/GrossRentalIncome", "ratio"),
+            ]),
+            ("Risk Ratios", [
+                ("Debt Service Coverage Ratio:", "=NetOperatingIncome/AnnualDebtService", "ratio"),
+                ("Loan-to-Value Ratio:", "=LoanAmount/PurchasePrice", "formula_percent"),
+            ]),
+            ("Efficiency Ratios", [
+                ("Operating Expense Ratio:", "=TotalOperatingExpenses/GrossRentalIncome", "formula_percent"),
+                ("NOI Margin:", "=NetOperatingIncome/GrossRentalIncome", "formula_percent"),
+            ]),
+            ("Per Unit Analysis", [
+                ("Price per Unit:", "=PurchasePrice/Units", "currency"),
+                ("NOI per Unit:", "=NetOperatingIncome/Units", "currency"),
+                ("Cash Flow per Unit:", "=AnnualCashFlow/Units", "currency"),
+            ]),
         ]
         
-        for label, value in cash_flow_items:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            # Highlight cash flow
-            ws[f'B{row}'].font = Font(bold=True)
-            if "Annual" in label:
-                # Color code positive/negative cash flow
-                if analysis.calculations.annual_cash_flow > 0:
-                    ws[f'B{row}'].font = Font(bold=True, color="00800000")  # Green
-                else:
-                    ws[f'B{row}'].font = Font(bold=True, color="00FF0000")  # Red
-            row += 1
+        for heading, ratios in sections:
+            sheet.append(sheet.cell(heading, "section"))
+            for label, formula, style in ratios:
+                sheet.append(label, sheet.cell(formula, style))
+            sheet.blank()
     
-    def _create_10_year_projection(self, property: Property, analysis: UnderwritingAnalysis):
+    def _create_10_year_projection(self, cells: Dict[str, Any]):
         """Create 10-year projection worksheet."""
-        ws = self.workbook.create_sheet("10-Year Projection")
+        sheet = self._new_sheet("10-Year Projection")
         
         # Title
-        ws['A1'] = "10-YEAR CASH FLOW PROJECTION"
-        ws['A1'].font = Font(size=14, bold=True)
+        sheet.title("10-YEAR CASH FLOW PROJECTION")
+        sheet.blank()
         
         # Headers
         headers = ["Year", "Rental Income", "Operating Expenses", "NOI", "Debt Service", "Cash Flow", "Cumulative CF"]
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=3, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal='center')
-        
-        # Projection calculations
-        cumulative_cf = 0
-        rent_growth = 0.03  # 3% annual rent growth
-        expense_growth = 0.02  # 2% annual expense growth
-        
-        base_expenses = sum([
-            analysis.operating_expenses.management,
-            analysis.operating_expenses.maintenance,
-            analysis.operating_expenses.insurance,
-            analysis.operating_expenses.taxes,
-            analysis.operating_expenses.utilities,
-            analysis.operating_expenses.other,
-        ])
-        
-        for year in range(1, 11):
-            row = year + 3
-            
-            yearly_rent = analysis.calculations.gross_rental_income * (1 + rent_growth) ** (year - 1)
-            yearly_expenses = base_expenses * (1 + expense_growth) ** (year - 1)
-            yearly_noi = yearly_rent - yearly_expenses
-            yearly_debt_service = analysis.calculations.monthly_debt_service * 12
-            yearly_cash_flow = yearly_noi - yearly_debt_service
-            cumulative_cf += yearly_cash_flow
-            
-            data = [
-                year,
-                round(yearly_rent),
-                round(yearly_expenses),
-                round(yearly_noi),
-                round(yearly_debt_service),
-                round(yearly_cash_flow),
-                round(cumulative_cf)
-            ]
-            
-            for col, value in enumerate(data, 1):
-                cell = ws.cell(row=row, column=col, value=value)
-                if col > 1:  # Format currency columns
-                    cell.number_format = '"$"#,##0'
+        sheet.append(*[sheet.cell(header, "header") for header in headers])
+        
+        for year in range(1, PROJECTION_YEARS + 1):
+            # Format currency columns
+            sheet.append(year, *[
+                sheet.cell(cells[f"year_{year}_{column}"], "currency") for column in PROJECTION_COLUMNS
+            ])
     
-    def _create_ratios_metrics(self, property: Property, analysis: UnderwritingAnalysis):
+    def _create_ratios_metrics(self, cells: Dict[str, Any]):
         """Create ratios and metrics worksheet."""
-        ws = self.workbook.create_sheet("Ratios & Metrics")
+        sheet = self._new_sheet("Ratios & Metrics")
         
         # Title
-        ws['A1'] = "INVESTMENT RATIOS & METRICS"
-        ws['A1'].font = Font(size=14, bold=True)
-        
-        row = 3
+        sheet.title("INVESTMENT RATIOS & METRICS")
+        sheet.blank()
         
         # Profitability Ratios
-        ws[f'A{row}'] = "Profitability Ratios"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
-        
-        gross_rent_multiplier = analysis.purchase_price / analysis.calculations.gross_rental_income
-        
         profitability = [
-            ("Cap Rate:", f"{analysis.calculations.cap_rate:.2f}%"),
-            ("Cash-on-Cash Return:", f"{analysis.calculations.cash_on_cash_return:.2f}%"),
-            ("Gross Rent Multiplier:", f"{gross_rent_multiplier:.2f}"),
+            ("Cap Rate:", cells["cap_rate"]),
+            ("Cash-on-Cash Return:", cells["cash_on_cash_return"]),
+            ("Gross Rent Multiplier:", cells["gross_rent_multiplier"]),
         ]
-        
-        for label, value in profitability:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            row += 1
-        
-        row += 1
+        sheet.section("Profitability Ratios", profitability)
+        sheet.blank()
         
         # Risk Ratios
-        ws[f'A{row}'] = "Risk Ratios"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
-        
-        ltv_ratio = (analysis.loan_amount / analysis.purchase_price) * 100
-        
         risk_ratios = [
-            ("Debt Service Coverage Ratio:", f"{analysis.calculations.debt_service_coverage:.2f}"),
-            ("Loan-to-Value Ratio:", f"{ltv_ratio:.2f}%"),
+            ("Debt Service Coverage Ratio:", cells["debt_service_coverage"]),
+            ("Loan-to-Value Ratio:", cells["loan_to_value"]),
         ]
-        
-        for label, value in risk_ratios:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            row += 1
-        
-        row += 1
+        sheet.section("Risk Ratios", risk_ratios)
+        sheet.blank()
         
         # Efficiency Ratios
-        ws[f'A{row}'] = "Efficiency Ratios"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
-        
-        total_expenses = sum([
-            analysis.operating_expenses.management,
-            analysis.operating_expenses.maintenance,
-            analysis.operating_expenses.insurance,
-            analysis.operating_expenses.taxes,
-            analysis.operating_expenses.utilities,
-            analysis.operating_expenses.other,
-        ])
-        
-        expense_ratio = (total_expenses / analysis.calculations.gross_rental_income) * 100
-        noi_margin = (analysis.calculations.net_operating_income / analysis.calculations.gross_rental_income) * 100
-        
         efficiency = [
-            ("Operating Expense Ratio:", f"{expense_ratio:.2f}%"),
-            ("NOI Margin:", f"{noi_margin:.2f}%"),
+            ("Operating Expense Ratio:", cells["expense_ratio"]),
+            ("NOI Margin:", cells["noi_margin"]),
         ]
-        
-        for label, value in efficiency:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            row += 1
-        
-        row += 1
+        sheet.section("Efficiency Ratios", efficiency)
+        sheet.blank()
         
         # Per Unit Analysis
-        ws[f'A{row}'] = "Per Unit Analysis"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
-        
         per_unit = [
-            ("Price per Unit:", f"${analysis.purchase_price / property.units:,.0f}"),
-            ("NOI per Unit:", f"${analysis.calculations.net_operating_income / property.units:,.0f}"),
-            ("Cash Flow per Unit:", f"${analysis.calculations.annual_cash_flow / property.units:,.0f}"),
+            ("Price per Unit:", cells["price_per_unit"]),
+            ("NOI per Unit:", cells["noi_per_unit"]),
+            ("Cash Flow per Unit:", cells["cash_flow_per_unit"]),
         ]
-        
-        for label, value in per_unit:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            row += 1
\ No newline at end of file
+        sheet.section("Per Unit Analysis", per_unit)
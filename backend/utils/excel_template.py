@@ -0,0 +1,184 @@
+import re
+import struct
+import zipfile
+import zlib
+from io import BytesIO
+from typing import Any, Iterable, List, Mapping, Optional, Set, Tuple
+from xml.sax.saxutils import escape
+from openpyxl.compat import safe_string
+
+# A placeholder cell as openpyxl writes it: an inline string holding "{{key}}", or
+# "{{key|style_key}}" when the cell's style is also chosen per render
+_SLOT_PATTERN = re.compile(
+    rb'<c r="([A-Z]+[0-9]+)"(?: s="([0-9]+)")? t="inlineStr"><is><t>\{\{(\w+)(?:\|(\w+))?\}\}</t></is></c>'
+)
+
+class TemplateMismatch(Exception):
+    """The skeleton's placeholders could not all be found in the XML openpyxl wrote."""
+
+def placeholder(key: str) -> str:
+    """The text written into a skeleton cell that is filled in per render."""
+    return "{{" + key + "}}"
+
+class StyleSlot(str):
+    """A style that is chosen per render, named by the values key holding it."""
+
+    def mark(self, value: str) -> str:
+        """Tag a placeholder so its cell takes this slot's style when filled in."""
+        return f"{value[:-2]}|{self}}}}}"
+
+class PlaceholderValues(dict):
+    """Stands in for a render's values while the skeleton is being laid out.
+
+    Every lookup yields that key's placeholder, except "<name>_style" keys, which
+    yield a StyleSlot for the cell they are applied to. The keys looked up are
+    recorded in ``requested``, so the template can check it found them all.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.requested: Set[str] = set()
+
+    def __missing__(self, key: str) -> str:
+        self.requested.add(key)
+        return StyleSlot(key) if key.endswith("_style") else placeholder(key)
+
+def _cell_xml(ref: bytes, style: Optional[bytes], value: Any) -> bytes:
+    """Serialize one cell the way openpyxl would write it."""
+    style_attribute = b' s="' + style + b'"' if style is not None else b""
+
+    if value is None or value == "":
+        return b'<c r="' + ref + b'"' + style_attribute + b"/>" if style is not None else b""
+
+    if isinstance(value, bool):
+        return b'<c r="' + ref + b'"' + style_attribute + b' t="b"><v>' + (b"1" if value else b"0") + b"</v></c>"
+
+    if isinstance(value, (int, float)):
+        return (
+            b'<c r="' + ref + b'"' + style_attribute + b' t="n"><v>'
+            + safe_string(value).encode() + b"</v></c>"
+        )
+
+    text = str(value)
+    preserve = b' xml:space="preserve"' if text != text.strip() else b""
+    return (
+        b'<c r="' + ref + b'"' + style_attribute + b' t="inlineStr"><is><t' + preserve + b">"
+        + escape(text).encode() + b"</t></is></c>"
+    )
+
+class CompiledSheet:
+    """Worksheet XML precompiled into static byte segments around its variable cells."""
+
+    def __init__(self, xml: bytes):
+        self.segments: List[bytes] = []
+        self.slots: List[Tuple[bytes, Optional[bytes], str, Optional[str]]] = []
+
+        position = 0
+        for match in _SLOT_PATTERN.finditer(xml):
+            ref, style, key, style_key = match.groups()
+            self.segments.append(xml[position:match.start()])
+            self.slots.append((ref, style, key.decode(), style_key.decode() if style_key else None))
+            position = match.end()
+        self.segments.append(xml[position:])
+
+    def keys(self) -> Set[str]:
+        """Every values key the sheet's slots read, style keys included."""
+        return {key for _, _, key, _ in self.slots} | {style_key for _, _, _, style_key in self.slots if style_key}
+
+    def render(self, values: Mapping[str, Any], style_ids: Mapping[str, bytes]) -> bytes:
+        parts = [self.segments[0]]
+        for (ref, style, key, style_key), segment in zip(self.slots, self.segments[1:]):
+            if style_key is not None:
+                style = style_ids[values[style_key]]
+            parts.append(_cell_xml(ref, style, values[key]))
+            parts.append(segment)
+        return b"".join(parts)
+
+class _ZipEntry:
+    """One deflated member of an archive, with what its headers record."""
+
+    __slots__ = ("name", "date_time", "crc", "size", "compressed")
+
+    def __init__(self, name: str, date_time: Tuple[int, ...], data: bytes):
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        self.name = name.encode("utf-8")
+        self.date_time = date_time
+        self.crc = zlib.crc32(data)
+        self.size = len(data)
+        self.compressed = compressor.compress(data) + compressor.flush()
+
+def _write_zip(entries: Iterable[_ZipEntry]) -> BytesIO:
+    """Write already deflated entries as a ZIP archive (no ZIP64: workbooks are small)."""
+    buffer = BytesIO()
+    central_directory = []
+    for entry in entries:
+        year, month, day, hour, minute, second = entry.date_time
+        dos_time = hour << 11 | minute << 5 | second // 2
+        dos_date = (year - 1980) << 9 | month << 5 | day
+        offset = buffer.tell()
+        buffer.write(struct.pack(
+            "<4s2B4HL2L2H", b"PK\x03\x04", 20, 0, 0, zipfile.ZIP_DEFLATED, dos_time, dos_date,
+            entry.crc, len(entry.compressed), entry.size, len(entry.name), 0
+        ))
+        buffer.write(entry.name)
+        buffer.write(entry.compressed)
+        central_directory.append(struct.pack(
+            "<4s4B4HL2L5H2L", b"PK\x01\x02", 20, 0, 20, 0, 0, zipfile.ZIP_DEFLATED, dos_time, dos_date,
+            entry.crc, len(entry.compressed), entry.size, len(entry.name), 0, 0, 0, 0, 0o600 << 16, offset
+        ) + entry.name)
+
+    directory_offset = buffer.tell()
+    for record in central_directory:
+        buffer.write(record)
+    buffer.write(struct.pack(
+        "<4s4H2LH", b"PK\x05\x06", 0, 0, len(central_directory), len(central_directory),
+        buffer.tell() - directory_offset, directory_offset, 0
+    ))
+    buffer.seek(0)
+    return buffer
+
+class WorkbookTemplate:
+    """A pre-styled workbook whose placeholder cells are filled in per render.
+
+    The skeleton is an XLSX in which every variable cell holds ``placeholder(key)``.
+    It is parsed once: worksheets containing placeholders are split into static
+    segments and slots, and every other part (styles, theme, workbook, content
+    types) is compressed once and written back verbatim on each render, so a
+    render only deflates the sheets it fills in.
+
+    ``keys``, the placeholders the skeleton was laid out with, is checked against
+    the slots found; TemplateMismatch is raised if any is missing (say, openpyxl
+    wrote a cell differently than ``_SLOT_PATTERN`` expects), rather than
+    shipping workbooks with literal placeholders in them.
+    """
+
+    def __init__(self, skeleton: bytes, style_ids: Mapping[str, int], keys: Optional[Set[str]] = None):
+        self.style_ids = {name: str(index).encode() for name, index in style_ids.items()}
+        self.parts: List[Tuple[str, Tuple[int, ...], Optional[_ZipEntry], Optional[CompiledSheet]]] = []
+
+        found: Set[str] = set()
+        with zipfile.ZipFile(BytesIO(skeleton)) as archive:
+            for info in archive.infolist():
+                data = archive.read(info)
+                if info.filename.startswith("xl/worksheets/") and _SLOT_PATTERN.search(data):
+                    compiled = CompiledSheet(data)
+                    found |= compiled.keys()
+                    static = b"".join(compiled.segments)
+                    self.parts.append((info.filename, info.date_time, None, compiled))
+                else:
+                    static = data
+                    entry = _ZipEntry(info.filename, info.date_time, data)
+                    self.parts.append((info.filename, info.date_time, entry, None))
+                if b"{{" in static:
+                    raise TemplateMismatch(f"Unrecognised placeholder left in {info.filename}")
+
+        if keys is not None and found != keys:
+            missing = ", ".join(sorted(keys - found)) or "none"
+            unexpected = ", ".join(sorted(found - keys)) or "none"
+            raise TemplateMismatch(f"Template slots don't match the skeleton (missing: {missing}; unexpected: {unexpected})")
+
+    def render(self, values: Mapping[str, Any]) -> BytesIO:
+        return _write_zip(
+            entry if entry is not None else _ZipEntry(name, date_time, sheet.render(values, self.style_ids))
+            for name, date_time, entry, sheet in self.parts
+        )
@@ -0,0 +1,143 @@
+import os
+import re
+from typing import BinaryIO, Mapping, Optional, Tuple
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``Range: bytes=...`` header into an inclusive (start, end) pair.
+
+    Returns None when the whole body should be sent (no header, or a form we don't
+    serve partially such as multiple ranges). Raises RangeNotSatisfiable when the
+    range lies outside the document.
+    """
+    if not range_header:
+        return None
+
+    match = _RANGE_PATTERN.match(range_header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+
+    return start, end
+
+class DocumentResponse(Response):
+    """Sends a document without copying it, optionally limited to one byte range.
+
+    The body is either bytes already held in memory, sent in slices, or a file
+    the caller has already opened (so a missing file is found before a status
+    is committed), which is handed to the server via the ASGI zero-copy
+    extension when available and otherwise read one chunk at a time. The
+    response closes the file.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        content: Optional[bytes] = None,
+        file: Optional[BinaryIO] = None,
+        size: int = 0,
+        byte_range: Optional[Tuple[int, int]] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None
+    ):
+        if content is None and file is None:
+            raise ValueError("DocumentResponse needs content or a file")
+
+        self.content = content
+        self.file = file
+        self.start, self.end = byte_range if byte_range is not None else (0, size - 1)
+
+        status_code = 206 if byte_range is not None else 200
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["content-length"] = str(self.end - self.start + 1)
+        if byte_range is not None:
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            })
+
+            if scope["method"].upper() == "HEAD":
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            elif self.content is not None:
+                await self._send_memory(send)
+            else:
+                await self._send_file(scope, send)
+        finally:
+            if self.file is not None:
+                self.file.close()
+
+        if self.background is not None:
+            await self.background()
+
+    async def _send_memory(self, send: Send):
+        view = memoryview(self.content)[self.start:self.end + 1]
+        for offset in range(0, len(view), self.chunk_size):
+            # ASGI bodies must be bytes; this copies one chunk at a time, never the whole document
+            chunk = bytes(view[offset:offset + self.chunk_size])
+            await send({
+                "type": "http.response.body",
+                "body": chunk,
+                "more_body": offset + self.chunk_size < len(view),
+            })
+
+        if len(view) == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _send_file(self, scope: Scope, send: Send):
+        count = self.end - self.start + 1
+
+        if "http.response.zerocopy" in scope.get("extensions", {}):
+            await send({
+                "type": "http.response.zerocopy",
+                "file": self.file,
+                "offset": self.start,
+                "count": count,
+                "more_body": False,
+            })
+            return
+
+        fd = self.file.fileno()
+        offset = self.start
+        remaining = count
+        while remaining > 0:
+            chunk = await anyio.to_thread.run_sync(os.pread, fd, min(self.chunk_size, remaining), offset)
+            if not chunk:
+                # Content-Length is already promised; failing makes the server abort the connection
+                # rather than end a short body the client would take as complete
+                raise OSError(f"File ended {remaining} bytes before the promised length")
+            offset += len(chunk)
+            remaining -= len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+        if count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,317 @@
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Prometheus text exposition format; the response adds "; charset=utf-8"
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class _ThreadCells:
+    """Fixed-size numeric cells with one copy per recording thread.
+
+    Each thread only ever writes its own preallocated list, so recording is a
+    plain in-place add with no lock. Reading sums the copies of every thread; the
+    lock is only taken when a thread records for the first time and when reading.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def cells(self) -> List[float]:
+        try:
+            return self._local.cells
+        except AttributeError:
+            cells = [0] * self._size
+            with self._lock:
+                self._shards.append(cells)
+            self._local.cells = cells
+            return cells
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            shards = list(self._shards)
+        return [sum(column) for column in zip(*shards)] if shards else [0] * self._size
+
+class _Timer:
+    """Context manager observing its elapsed wall time into a histogram; works across awaits."""
+
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: "_HistogramChild"):
+        self._histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(perf_counter() - self._start)
+
+class _CounterChild:
+    def __init__(self):
+        self._values = _ThreadCells(1)
+
+    def inc(self, amount: float = 1):
+        self._values.cells()[0] += amount
+
+    def samples(self, name: str, labels: str) -> Iterator[str]:
+        yield f"{name}{labels} {_format(self._values.totals()[0])}"
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount: float = 1):
+        self._values.cells()[0] -= amount
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = buckets
+        # One count per bucket, one for +Inf, then the running sum
+        self._values = _ThreadCells(len(buckets) + 2)
+
+    def observe(self, value: float):
+        cells = self._values.cells()
+        cells[bisect_left(self._buckets, value)] += 1
+        cells[-1] += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def samples(self, name: str, labels: str) -> Iterator[str]:
+        totals = self._values.totals()
+        cumulative = 0
+        for bound, count in zip(list(self._buckets) + ["+Inf"], totals[:-1]):
+            cumulative += count
+            le = f'le="{bound}"'
+            yield f"{name}_bucket{{{labels[1:-1] + ',' if labels else ''}{le}}} {_format(cumulative)}"
+        yield f"{name}_sum{labels} {_format(totals[-1])}"
+        yield f"{name}_count{labels} {_format(cumulative)}"
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def labels(self, *values: str):
+        """The series for these label values, created on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> Iterator[str]:
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values))
+            yield from child.samples(self.name, f"{{{labels}}}" if labels else "")
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+class CallbackMetric(_Metric):
+    """A metric whose values are read from elsewhere (e.g. cache counters) at scrape time."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        type: str,
+        callback: Callable[[], Dict[Tuple[str, ...], float]]
+    ):
+        self.type = type
+        self.callback = callback
+        super().__init__(name, documentation, labelnames)
+
+    def collect(self) -> Iterator[str]:
+        for values, value in self.callback().items():
+            labels = ",".join(f'{name}="{_escape(label)}"' for name, label in zip(self.labelnames, values))
+            yield f"{self.name}{{{labels}}} {_format(value)}" if labels else f"{self.name} {_format(value)}"
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = Histogram(
+    "rets_http_request_duration_seconds",
+    "HTTP request latency by route template, including streamed bodies.",
+    ["method", "route", "status"]
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("rets_http_requests_in_flight", "HTTP requests currently being handled.")
+STAGE_DURATION = Histogram(
+    "rets_stage_duration_seconds",
+    "Latency of each processing stage (llm, filter_parse, search, underwriting, render_excel, render_pdf, serialization).",
+    ["stage"]
+)
+OPENAI_REQUESTS = Counter("rets_openai_requests_total", "OpenAI chat completion requests.", ["model", "outcome"])
+OPENAI_TOKENS = Counter("rets_openai_tokens_total", "OpenAI tokens used, by prompt or completion.", ["model", "kind"])
+OPENAI_QUEUE_WAIT = Histogram("rets_openai_queue_wait_seconds", "Time OpenAI calls waited for a concurrency slot.")
+OPENAI_RETRIES = Counter("rets_openai_retries_total", "OpenAI calls retried, by cause.", ["reason"])
+OPENAI_REJECTED = Counter(
+    "rets_openai_rejected_total",
+    "OpenAI calls refused by admission control (per_user_limit, queue_deadline, retries_exhausted).",
+    ["reason"]
+)
+
+# Caches register themselves; anything with ``hits`` and ``misses`` counters can be tracked
+_caches: Dict[str, Any] = {}
+
+def register_cache(name: str, cache: Any):
+    _caches[name] = cache
+
+def _cache_counts() -> Dict[str, Tuple[int, int]]:
+    return {name: (cache.hits, cache.misses) for name, cache in list(_caches.items())}
+
+def _cache_hit_ratios() -> Dict[Tuple[str, ...], float]:
+    return {
+        (name,): hits / (hits + misses) if hits + misses else 0.0
+        for name, (hits, misses) in _cache_counts().items()
+    }
+
+CallbackMetric(
+    "rets_cache_hits_total", "Cache lookups that found an entry.", ["cache"], "counter",
+    lambda: {(name,): hits for name, (hits, _) in _cache_counts().items()}
+)
+CallbackMetric(
+    "rets_cache_misses_total", "Cache lookups that found nothing.", ["cache"], "counter",
+    lambda: {(name,): misses for name, (_, misses) in _cache_counts().items()}
+)
+CallbackMetric("rets_cache_hit_ratio", "Share of cache lookups that hit, since startup.", ["cache"], "gauge", _cache_hit_ratios)
+
+# Single-flight groups register themselves, to report how many calls they coalesced
+_single_flights: Dict[str, Any] = {}
+
+def register_single_flight(name: str, group: Any):
+    _single_flights[name] = group
+
+CallbackMetric(
+    "rets_singleflight_calls_total",
+    "Calls through single-flight groups, by whether they executed or joined an identical call in flight.",
+    ["group", "outcome"],
+    "counter",
+    lambda: {
+        key: value
+        for name, group in list(_single_flights.items())
+        for key, value in (((name, "executed"), group.executed), ((name, "coalesced"), group.coalesced))
+    }
+)
+
+def stage(name: str) -> _Timer:
+    """Time a processing stage: ``with stage("search"): ...``."""
+    return STAGE_DURATION.labels(name).time()
+
+def record_openai_usage(model: str, usage: Optional[Any]):
+    """Count the tokens reported in an OpenAI response's ``usage``."""
+    if usage is None:
+        return
+    OPENAI_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+    OPENAI_TOKENS.labels(model, "completion").inc(usage.completion_tokens or 0)
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and the in-flight request count."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            if scope.get("client_disconnected"):
+                # Client closed the connection first, as nginx reports it
+                status = 499
+            # Routing stores the matched route in the scope; label by its template, not the raw path
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], route.path if route is not None else "unmatched", str(status)
+            ).observe(perf_counter() - start)
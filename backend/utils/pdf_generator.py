@@ -1,83 +1,194 @@
+import copy
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle, StyleSheet1
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from io import BytesIO
 from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List
+from pypdf import PdfWriter
 from models.property import Property
 from models.document import LOIDetails
 
+def _build_stylesheet() -> StyleSheet1:
+    """Create the sample stylesheet plus our custom paragraph styles."""
+    styles = getSampleStyleSheet()
+    
+    styles.add(ParagraphStyle(
+        name='CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='SectionHeader',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceBefore=20,
+        spaceAfter=10,
+        fontName='Helvetica-Bold'
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='BodyBold',
+        parent=styles['Normal'],
+        fontName='Helvetica-Bold'
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='Footer',
+        parent=styles['Normal'],
+        fontSize=9,
+        alignment=TA_CENTER,
+        textColor=colors.grey
+    ))
+    
+    return styles
+
+# Styles are immutable once built, so one stylesheet serves every generator in the process
+STYLES = _build_stylesheet()
+
+PAGE_MARGINS = {"rightMargin": 72, "leftMargin": 72, "topMargin": 72, "bottomMargin": 18}
+
+# Width available to flowables: the page less its side margins and the frame's 6pt padding
+FRAME_WIDTH = letter[0] - PAGE_MARGINS["leftMargin"] - PAGE_MARGINS["rightMargin"] - 12
+
+STANDARD_TERMS = [
+    "1. This Letter of Intent is non-binding and subject to execution of a formal Purchase Agreement.",
+    "2. Buyer shall have the right to inspect the property during the inspection period.",
+    "3. Sale is contingent upon buyer securing satisfactory financing terms.",
+    "4. Property to be sold in \"as-is\" condition unless otherwise negotiated.",
+    "5. Standard title insurance and warranty deed to be provided by seller.",
+    "6. Prorations of taxes, insurance, and other expenses as of closing date.",
+]
+
+SIGNATURE_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+])
+
+class PrewrappedParagraph(Paragraph):
+    """A paragraph parsed and line-broken once, then reused across documents.
+    
+    Wrapping at the width it was prepared for returns the stored layout instead of
+    breaking the lines again; any other width wraps normally.
+    """
+    
+    def prepare(self, width: float) -> "PrewrappedParagraph":
+        Paragraph.wrap(self, width, letter[1])
+        self._prepared_width = width
+        return self
+    
+    def wrap(self, availWidth, availHeight):
+        if availWidth == getattr(self, "_prepared_width", None):
+            return self.width, self.height
+        return Paragraph.wrap(self, availWidth, availHeight)
+
+def _prepared(text: str, style: str) -> PrewrappedParagraph:
+    return PrewrappedParagraph(text, STYLES[style]).prepare(FRAME_WIDTH)
+
+@lru_cache(maxsize=None)
+def _static_flowables() -> Dict[str, Any]:
+    """The parts of the LOI that are the same in every document, laid out once per process."""
+    
+    subtitle = _prepared("Real Estate Purchase", 'Heading2')
+    subtitle.hAlign = 'CENTER'
+    
+    return {
+        "title": _prepared("LETTER OF INTENT", 'CustomTitle'),
+        "subtitle": subtitle,
+        "property_header": _prepared("PROPERTY INFORMATION:", 'SectionHeader'),
+        "buyer_header": _prepared("BUYER INFORMATION:", 'SectionHeader'),
+        "purchase_header": _prepared("PURCHASE TERMS:", 'SectionHeader'),
+        "terms_header": _prepared("TERMS AND CONDITIONS:", 'SectionHeader'),
+        "standard_terms": [_prepared(term, 'Normal') for term in STANDARD_TERMS],
+        "signature_header": _prepared("SIGNATURES:", 'SectionHeader'),
+        "footer": _prepared("Generated by RETS AI - Real Estate Transaction System", 'Footer'),
+    }
+
+@lru_cache(maxsize=64)
+def _signature_table(buyer_name: str) -> Table:
+    """The signature block, laid out once per buyer name."""
+    
+    signature_data = [
+        ["Buyer:", "_" * 40, "Date:", "_" * 20],
+        [buyer_name, "", "", ""],
+        ["", "", "", ""],
+        ["Seller:", "_" * 40, "Date:", "_" * 20],
+        ["", "", "", ""],
+    ]
+    
+    signature_table = Table(signature_data, colWidths=[1*inch, 2.5*inch, 0.8*inch, 1.5*inch])
+    signature_table.setStyle(SIGNATURE_STYLE)
+    signature_table.wrap(FRAME_WIDTH, letter[1])
+    
+    return signature_table
+
+def _reuse(flowable):
+    # Flowables hold per-draw state (the canvas), so each document draws its own
+    # shallow copy, which shares the prepared layout
+    return copy.copy(flowable)
+
+def merge_pdfs(documents: List[bytes]) -> BytesIO:
+    """Concatenate PDF documents, in order, into a single PDF."""
+    writer = PdfWriter()
+    for document in documents:
+        writer.append(BytesIO(document))
+    
+    buffer = BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    
+    return buffer
+
 class PDFGenerator:
     def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self._create_custom_styles()
-    
-    def _create_custom_styles(self):
-        """Create custom paragraph styles."""
-        self.styles.add(ParagraphStyle(
-            name='CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=20,
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        ))
-        
-        self.styles.add(ParagraphStyle(
-            name='SectionHeader',
-            parent=self.styles['Heading2'],
-            fontSize=14,
-            spaceBefore=20,
-            spaceAfter=10,
-            fontName='Helvetica-Bold'
-        ))
-        
-        self.styles.add(ParagraphStyle(
-            name='BodyBold',
-            parent=self.styles['Normal'],
-            fontName='Helvetica-Bold'
-        ))
+        self.styles = STYLES
+    
+    def warm_up(self):
+        """Lay out the static parts of the LOI ahead of the first render."""
+        _static_flowables()
     
     def generate_loi_pdf(self, property: Property, loi_details: LOIDetails) -> BytesIO:
-        """Generate Letter of Intent PDF document."""
+        """Generate Letter of Intent PDF document.
+        
+        Only the paragraphs that depend on the property and offer are laid out here;
+        the static title, headers, standard terms and footer are prepared once.
+        """
+        
+        static = _static_flowables()
         
         buffer = BytesIO()
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=letter,
-            rightMargin=72,
-            leftMargin=72,
-            topMargin=72,
-            bottomMargin=18
-        )
+        doc = SimpleDocTemplate(buffer, pagesize=letter, **PAGE_MARGINS)
         
         # Build the document content
         story = []
         
         # Title
-        title = Paragraph("LETTER OF INTENT", self.styles['CustomTitle'])
-        story.append(title)
-        
-        subtitle = Paragraph("Real Estate Purchase", self.styles['Heading2'])
-        subtitle.hAlign = 'CENTER'
-        story.append(subtitle)
+        story.append(_reuse(static["title"]))
+        story.append(_reuse(static["subtitle"]))
         story.append(Spacer(1, 0.5*inch))
         
         # Date
         date_text = f"Date: {datetime.now().strftime('%B %d, %Y')}"
-        date_para = Paragraph(date_text, self.styles['Normal'])
-        story.append(date_para)
+        story.append(Paragraph(date_text, self.styles['Normal']))
         story.append(Spacer(1, 0.3*inch))
         
         # Property Information Section
-        story.append(Paragraph("PROPERTY INFORMATION:", self.styles['SectionHeader']))
+        story.append(_reuse(static["property_header"]))
         
         property_info = [
             f"<b>Address:</b> {property.address}",
             f"<b>City, State, ZIP:</b> {property.city}, {property.state} {property.zip_code}",
-            f"<b>Property Type:</b> {property.property_type.value.title()} ({property.units} units)",
+            f"<b>Property Type:</b> {property.property_type.title()} ({property.units} units)",
         ]
         
         if property.year_built:
@@ -92,7 +203,7 @@ class PDFGenerator:
         story.append(Spacer(1, 0.3*inch))
         
         # Buyer Information Section
-        story.append(Paragraph("BUYER INFORMATION:", self.styles['SectionHeader']))
+        story.append(_reuse(static["buyer_header"]))
         
         buyer_info = [
             f"<b>Name:</b> {loi_details.buyer_name}",
@@ -105,7 +216,7 @@ class PDFGenerator:
         story.append(Spacer(1, 0.3*inch))
         
         # Purchase Terms Section
-        story.append(Paragraph("PURCHASE TERMS:", self.styles['SectionHeader']))
+        story.append(_reuse(static["purchase_header"]))
         
         purchase_terms = [
             f"<b>Offer Price:</b> {self._format_currency(loi_details.offer_price)}",
@@ -121,64 +232,27 @@ class PDFGenerator:
         story.append(Spacer(1, 0.3*inch))
         
         # Terms and Conditions Section
-        story.append(Paragraph("TERMS AND CONDITIONS:", self.styles['SectionHeader']))
-        
-        standard_terms = [
-            "1. This Letter of Intent is non-binding and subject to execution of a formal Purchase Agreement.",
-            "2. Buyer shall have the right to inspect the property during the inspection period.",
-            "3. Sale is contingent upon buyer securing satisfactory financing terms.",
-            "4. Property to be sold in \"as-is\" condition unless otherwise negotiated.",
-            "5. Standard title insurance and warranty deed to be provided by seller.",
-            "6. Prorations of taxes, insurance, and other expenses as of closing date.",
-        ]
+        story.append(_reuse(static["terms_header"]))
+        
+        all_terms = [_reuse(term) for term in static["standard_terms"]]
         
         # Add additional terms if provided
-        all_terms = standard_terms.copy()
-        if loi_details.additional_terms:
-            for i, term in enumerate(loi_details.additional_terms):
-                all_terms.append(f"{len(standard_terms) + i + 1}. {term}")
+        for i, term in enumerate(loi_details.additional_terms or []):
+            all_terms.append(Paragraph(f"{len(STANDARD_TERMS) + i + 1}. {term}", self.styles['Normal']))
         
         for term in all_terms:
-            story.append(Paragraph(term, self.styles['Normal']))
+            story.append(term)
             story.append(Spacer(1, 0.1*inch))
         
         story.append(Spacer(1, 0.4*inch))
         
         # Signature Section
-        story.append(Paragraph("SIGNATURES:", self.styles['SectionHeader']))
-        
-        # Create signature table
-        signature_data = [
-            ["Buyer:", "_" * 40, "Date:", "_" * 20],
-            [loi_details.buyer_name, "", "", ""],
-            ["", "", "", ""],
-            ["Seller:", "_" * 40, "Date:", "_" * 20],
-            ["", "", "", ""],
-        ]
-        
-        signature_table = Table(signature_data, colWidths=[1*inch, 2.5*inch, 0.8*inch, 1.5*inch])
-        signature_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ]))
-        
-        story.append(signature_table)
+        story.append(_reuse(static["signature_header"]))
+        story.append(_reuse(_signature_table(loi_details.buyer_name)))
         story.append(Spacer(1, 0.5*inch))
         
         # Footer
-        footer_style = ParagraphStyle(
-            name='Footer',
-            parent=self.styles['Normal'],
-            fontSize=9,
-            alignment=TA_CENTER,
-            textColor=colors.grey
-        )
-        
-        footer_text = "Generated by RETS AI - Real Estate Transaction System"
-        footer = Paragraph(footer_text, footer_style)
-        story.append(footer)
+        story.append(_reuse(static["footer"]))
         
         # Build PDF
         doc.build(story)
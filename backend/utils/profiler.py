@@ -0,0 +1,144 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+MAX_STACK_DEPTH = 128
+
+# Caps the memory a long session can use on very varied stacks
+MAX_UNIQUE_STACKS = 50_000
+
+class ProfilerBusy(RuntimeError):
+    """Another profiling session is already running in this process."""
+
+# One session per process: a second sampler would double the overhead and skew both profiles
+_session_lock = threading.Lock()
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Wall-clock sampling profiler for every thread of this process.
+
+    A background thread reads all thread stacks via ``sys._current_frames`` every
+    ``interval`` seconds; no profiling hook is installed, so code that is not
+    being sampled runs at full speed. Overhead is one stack walk per thread per
+    sample. Stacks are counted in the collapsed format that flamegraph.pl and
+    speedscope read: ``thread;outer;...;inner count``.
+    """
+
+    def __init__(self, interval: float = 0.01, exclude: Tuple[int, ...] = ()):
+        self.interval = interval
+        self.exclude = set(exclude)
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self, thread_names: Dict[int, str]):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in self.exclude:
+                continue
+
+            labels = []
+            while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+
+            stack = ";".join(reversed(labels))
+            if stack in self.stacks or len(self.stacks) < MAX_UNIQUE_STACKS:
+                self.stacks[stack] += 1
+            else:
+                self.stacks["[other stacks]"] += 1
+        self.samples += 1
+
+    def _run(self):
+        self.exclude.add(threading.get_ident())
+        thread_names = {}
+        next_sample = time.perf_counter()
+        while not self._stop.is_set():
+            if self.samples % 100 == 0:
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self._sample(thread_names)
+            next_sample += self.interval
+            self._stop.wait(max(next_sample - time.perf_counter(), 0))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def _allocation_diff(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int) -> str:
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ]
+    changes = after.filter_traces(filters).compare_to(before.filter_traces(filters), "traceback")
+
+    lines = [f"Top {limit} allocation changes by traceback (size change, count change):", ""]
+    for change in changes[:limit]:
+        lines.append(
+            f"{change.size_diff / 1024:+.1f} KiB ({change.count_diff:+d} blocks), "
+            f"now {change.size / 1024:.1f} KiB in {change.count} blocks"
+        )
+        lines.extend(f"    {line}" for line in change.traceback.format())
+        lines.append("")
+    return "\n".join(lines)
+
+def profile(
+    seconds: float,
+    interval: float = 0.01,
+    memory: bool = False,
+    memory_frames: int = 10,
+    memory_limit: int = 50
+) -> Tuple[str, Optional[str], int]:
+    """Sample this process for ``seconds`` and return (collapsed stacks, allocation diff, samples).
+
+    With ``memory``, tracemalloc records allocations for the session (unless it
+    was already tracing) and the growth between the start and end snapshots is
+    reported. Blocks for the duration of the session; raises ProfilerBusy if one
+    is already running.
+    """
+    if not _session_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profiling session is already running")
+
+    try:
+        started_tracing = False
+        before = None
+        if memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(memory_frames)
+                started_tracing = True
+            before = tracemalloc.take_snapshot()
+
+        # The calling thread only waits for the session, so it is left out of the profile
+        sampler = StackSampler(interval, exclude=(threading.get_ident(),))
+        sampler.start()
+        try:
+            time.sleep(seconds)
+        finally:
+            sampler.stop()
+
+        allocations = None
+        if memory:
+            after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+            allocations = _allocation_diff(before, after, memory_limit)
+
+        return sampler.collapsed(), allocations, sampler.samples
+
+    finally:
+        _session_lock.release()
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+from utils.metrics import register_single_flight
+
+T = TypeVar("T")
+
+class _Call:
+    __slots__ = ("task", "waiters", "abandoned")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+class SingleFlight:
+    """Coalesces concurrent identical async calls into one execution.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await the same task instead of repeating it, and all of them
+    get its result or its exception. Nothing is cached: once the task finishes
+    the next call for the key starts afresh. Results are shared, so only use
+    this for work whose result callers don't mutate.
+
+    A caller that is cancelled stops waiting without disturbing the others; the
+    work itself is cancelled only when every caller has gone.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        # Executions started, and callers that joined one instead of starting their own
+        self.executed = 0
+        self.coalesced = 0
+        register_single_flight(name, self)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None or call.abandoned:
+            call = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda task, call=call: self._finished(key, call))
+            self._calls[key] = call
+            self.executed += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            # Shielded, so one caller's cancellation doesn't cancel the shared work
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                call.abandoned = True
+                call.task.cancel()
+
+    def _finished(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark the exception retrieved when nobody was left to await it
+        if not call.task.cancelled():
+            call.task.exception()
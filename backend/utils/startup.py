@@ -0,0 +1,108 @@
+import asyncio
+import inspect
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from utils.metrics import CallbackMetric
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Imported first thing by app/main.py, so this is when the app started importing
+_started = time.perf_counter()
+
+WarmUpStep = Callable[[], Union[Any, Awaitable[Any]]]
+
+class StartupReport:
+    """How long this worker took from starting to import the app to being ready.
+
+    ``imports`` covers loading the app's modules, ``warm_up`` the warm-up phase
+    as a whole and ``ready`` the total; each warm-up step's own duration is kept
+    too, and they overlap because the steps run concurrently. Steps left to run
+    after the worker is ready are recorded when they finish, with the others.
+    """
+
+    def __init__(self, started: float):
+        self.started = started
+        self.imports: Optional[float] = None
+        self.warm_up: Optional[float] = None
+        self.ready: Optional[float] = None
+        self.steps: Dict[str, float] = {}
+        self.failed: List[str] = []
+
+    def mark_imports_done(self):
+        self.imports = time.perf_counter() - self.started
+
+    def mark_ready(self):
+        self.ready = time.perf_counter() - self.started
+        logger.info(
+            f"Worker {os.getpid()} ready in {self.ready:.2f}s (imports {self.imports or 0:.2f}s, "
+            f"warm-up {self.warm_up or 0:.2f}s: "
+            + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.steps.items()) + ")"
+        )
+
+    def phase_seconds(self) -> Dict[Tuple[str, ...], float]:
+        phases = {"imports": self.imports, "warm_up": self.warm_up, "ready": self.ready}
+        phases.update({f"warm_up.{name}": seconds for name, seconds in self.steps.items()})
+        return {(phase,): seconds for phase, seconds in phases.items() if seconds is not None}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "imports": self.imports,
+            "warmUp": self.warm_up,
+            "ready": self.ready,
+            "steps": self.steps,
+            "failed": self.failed,
+        }
+
+startup_report = StartupReport(_started)
+
+CallbackMetric(
+    "rets_startup_seconds",
+    "Time this worker took to start, by phase (imports, warm_up and its steps, ready).",
+    ["phase"],
+    "gauge",
+    startup_report.phase_seconds
+)
+
+async def _timed(name: str, step: WarmUpStep):
+    started = time.perf_counter()
+    try:
+        if inspect.iscoroutinefunction(step):
+            await step()
+        else:
+            await asyncio.to_thread(step)
+    except Exception as e:
+        # A failed warm-up only costs the first request that needs it; it must not stop the worker
+        startup_report.failed.append(name)
+        logger.warning(f"Warm-up step {name} failed: {e}")
+    finally:
+        startup_report.steps[name] = time.perf_counter() - started
+
+async def warm_up(steps: Dict[str, WarmUpStep]):
+    """Run the warm-up steps concurrently and record how long each took.
+
+    Plain functions run in threads, so blocking work (imports, reading files,
+    building caches) overlaps with the other steps; coroutine functions run on
+    the event loop.
+    """
+    started = time.perf_counter()
+    await asyncio.gather(*(_timed(name, step) for name, step in steps.items()))
+    startup_report.warm_up = time.perf_counter() - started
+
+def warm_up_in_background(steps: Dict[str, WarmUpStep]) -> asyncio.Task:
+    """Start warm-up steps that shouldn't hold up readiness, recording them like the others.
+
+    For work the first requests can do themselves if they arrive first; the
+    caller cancels the returned task on shutdown.
+    """
+
+    async def run():
+        await asyncio.gather(*(_timed(name, step) for name, step in steps.items()))
+        logger.info(
+            "Background warm-up done: "
+            + ", ".join(f"{name} {startup_report.steps[name]:.2f}s" for name in steps)
+        )
+
+    return asyncio.create_task(run(), name="background-warm-up")
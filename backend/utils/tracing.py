@@ -0,0 +1,395 @@
+import atexit
+import functools
+import inspect
+import os
+import queue
+import random
+import re
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+import orjson
+import logging
+
+logger = logging.getLogger(__name__)
+
+# W3C trace context, as sent in the "traceparent" header: version-traceid-spanid-flags
+_TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_ERROR = 2
+
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "rets-backend")
+
+def _sample_rate() -> float:
+    return min(max(float(os.getenv("TRACE_SAMPLE_RATE", "0")), 0.0), 1.0)
+
+def _sampled() -> bool:
+    return _SAMPLE_RATE > 0 and random.random() < _SAMPLE_RATE
+
+class Span:
+    """A recorded span.
+
+    The first span of a trace in this process is its local root: spans below it
+    are held until it ends and then exported together with it, as one batch.
+    Spans that end after their root (e.g. in background tasks) go out on their own.
+    """
+
+    __slots__ = (
+        "trace_id", "span_id", "parent_span_id", "name", "kind", "attributes",
+        "start_ns", "end_ns", "status", "status_message", "root", "_pending"
+    )
+
+    recording = True
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: Optional[str],
+        root: Optional["Span"],
+        kind: int,
+        attributes: Dict[str, Any]
+    ):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = 0
+        self.status_message = ""
+        self.root = root or self
+        self._pending: Optional[List[Span]] = [] if root is None else None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        root = self.root
+        with _batch_lock:
+            if root is self:
+                batch, self._pending = self._pending, None
+                batch.append(self)
+            elif root._pending is None:
+                batch = [self]
+            else:
+                root._pending.append(self)
+                return
+        get_exporter().export(batch)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": self.status, "message": self.status_message} if self.status else {},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+# Spans may end on pool threads while their root ends on the event loop
+_batch_lock = threading.Lock()
+
+class NonRecordingSpan:
+    """Stands in for an unsampled span: records nothing but keeps the trace's
+    context so that descendants are not sampled either."""
+
+    recording = False
+
+    def __init__(self, trace_id: Optional[str] = None, span_id: Optional[str] = None):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    @property
+    def traceparent(self) -> Optional[str]:
+        return f"00-{self.trace_id}-{self.span_id}-00" if self.trace_id else None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_exception(self, error: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+_UNSAMPLED = NonRecordingSpan()
+
+_current_span: ContextVar[Optional[Any]] = ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Any]:
+    return _current_span.get()
+
+def current_traceparent() -> Optional[str]:
+    """The traceparent of the current span, to hand to work running outside this context."""
+    span = _current_span.get()
+    return span.traceparent if span is not None and span.recording else None
+
+def _parse_traceparent(traceparent: Optional[str]):
+    match = _TRACEPARENT_PATTERN.match(traceparent.strip().lower()) if traceparent else None
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    return trace_id, span_id, int(flags, 16) & 1
+
+def start_span(
+    name: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    kind: int = SPAN_KIND_INTERNAL,
+    parent: Optional[str] = None,
+    trust_parent: bool = True
+):
+    """Start a span under ``parent`` (a traceparent) or else the current span.
+
+    A span with neither starts a new trace, which is sampled at TRACE_SAMPLE_RATE.
+    Unsampled traces cost one context lookup per span and allocate nothing.
+    With ``trust_parent`` false (a traceparent from a client) the span joins the
+    parent's trace but makes its own sampling decision.
+    """
+    if parent is not None:
+        context = _parse_traceparent(parent)
+        if context is not None:
+            trace_id, parent_span_id, sampled = context
+            if not trust_parent:
+                sampled = _sampled()
+            if not sampled:
+                return NonRecordingSpan(trace_id, parent_span_id)
+            return Span(name, trace_id, parent_span_id, None, kind, attributes or {})
+
+    current = _current_span.get()
+    if current is not None:
+        if not current.recording:
+            return current
+        return Span(name, current.trace_id, current.span_id, current.root, kind, attributes or {})
+
+    if not _sampled():
+        return _UNSAMPLED
+    return Span(name, os.urandom(16).hex(), None, None, kind, attributes or {})
+
+class span:
+    """Run a block inside a span: ``with span("search", query=query): ...``.
+
+    Usable in sync and async code; the span is current for the block, including
+    any tasks or ``asyncio.to_thread`` calls started inside it.
+    """
+
+    __slots__ = ("_span", "_token")
+
+    def __init__(
+        self,
+        name: str,
+        parent: Optional[str] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        trust_parent: bool = True,
+        **attributes: Any
+    ):
+        self._span = start_span(name, attributes, kind, parent, trust_parent)
+
+    def __enter__(self):
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, traceback):
+        _current_span.reset(self._token)
+        if exc is not None:
+            self._span.record_exception(exc)
+        self._span.end()
+
+def traced(name: Optional[str] = None):
+    """Decorate a function or coroutine function to run inside a span named after it."""
+
+    def decorate(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+def run_with_parent(traceparent: Optional[str], name: str, fn: Callable, *args: Any) -> Any:
+    """Call fn(*args) in a span continuing ``traceparent``.
+
+    Used for work handed to thread or process pools, where the caller's context
+    does not follow; it is module-level so process pools can pickle it.
+    """
+    with span(name, parent=traceparent):
+        return fn(*args)
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _export_request(spans: List[Span]) -> bytes:
+    # One OTLP/JSON ExportTraceServiceRequest, the format of the collector's otlpjsonfile receiver
+    return orjson.dumps({
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "rets.tracing"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]
+    })
+
+class TraceExporter:
+    """Writes finished spans as OTLP/JSON lines to a local file, and optionally
+    posts them to an OTLP/HTTP collector.
+
+    ``export`` only queues the spans; a background thread serializes, writes and
+    posts them, so finishing a trace never blocks the event loop on I/O. The file
+    is opened for appending and each batch is a single write, so every process
+    (including pool workers) can share one trace file.
+    """
+
+    def __init__(self, path: Optional[str] = None, endpoint: Optional[str] = None):
+        self.path = path or os.getenv("TRACE_EXPORT_PATH", os.path.join(tempfile.gettempdir(), "rets-traces.jsonl"))
+        self.endpoint = endpoint or os.getenv("TRACE_OTLP_ENDPOINT")
+        self._fd: Optional[int] = None
+        self._outbox: "queue.SimpleQueue[Optional[List[Span]]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: List[Span]):
+        self._outbox.put(spans)
+
+    def _export_loop(self):
+        url = self.endpoint.rstrip("/") + "/v1/traces" if self.endpoint else None
+        while True:
+            spans = self._outbox.get()
+            if spans is None:
+                break
+            try:
+                payload = _export_request(spans)
+                if self.path:
+                    if self._fd is None:
+                        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                    os.write(self._fd, payload + b"\n")
+            except Exception as e:
+                # Tracing never fails the traced work
+                logger.warning(f"Could not export {len(spans)} spans: {e}")
+                continue
+
+            if url is not None:
+                import requests
+
+                try:
+                    requests.post(url, data=payload, headers={"Content-Type": "application/json"}, timeout=5)
+                except Exception as e:
+                    # Collector unavailable: the spans are still in the local file
+                    logger.debug(f"Could not post spans to {url}: {e}")
+
+    def close(self):
+        """Export what is still queued, then close the file."""
+        self._outbox.put(None)
+        self._thread.join(timeout=5)
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+
+_SAMPLE_RATE = _sample_rate()
+# Whether a client's traceparent may decide sampling; by default only this service's rate does
+_TRUST_PARENT = os.getenv("TRACE_TRUST_PARENT", "false").lower() in ("1", "true")
+_exporter: Optional[TraceExporter] = None
+_exporter_lock = threading.Lock()
+
+def get_exporter() -> TraceExporter:
+    """Return the process-wide trace exporter, creating it on first use."""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = TraceExporter()
+                atexit.register(_exporter.close)
+    return _exporter
+
+class TracingMiddleware:
+    """ASGI middleware running each HTTP request in a server span.
+
+    An incoming W3C ``traceparent`` header continues the caller's trace;
+    otherwise the request starts a new one. Either way the request is sampled at
+    TRACE_SAMPLE_RATE, so clients can't switch on tracing for themselves, unless
+    TRACE_TRUST_PARENT is set, when the caller's sampling decision is followed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for header, value in scope["headers"]:
+            if header == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with span(
+            f"{scope['method']} {scope['path']}",
+            parent=traceparent,
+            kind=SPAN_KIND_SERVER,
+            trust_parent=_TRUST_PARENT
+        ) as request_span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                if request_span.recording:
+                    route = scope.get("route")
+                    if route is not None:
+                        request_span.name = f"{scope['method']} {route.path}"
+                        request_span.set_attribute("http.route", route.path)
+                    request_span.set_attribute("http.request.method", scope["method"])
+                    request_span.set_attribute("url.path", scope["path"])
+                    request_span.set_attribute("http.response.status_code", status)
+                    if status >= 500 and not request_span.status:
+                        request_span.status = STATUS_ERROR
@@ -0,0 +1,39 @@
+import zipfile
+from typing import AsyncIterator, List, Tuple
+
+class _ChunkSink:
+    """A write-only, unseekable file that collects what zipfile writes to it.
+
+    Because it cannot seek, zipfile writes each entry's sizes and CRC in a data
+    descriptor after the entry, so entries can be sent as soon as they are added.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def stream_zip(entries: AsyncIterator[Tuple[str, bytes]]) -> AsyncIterator[bytes]:
+    """Build a ZIP archive incrementally, yielding its bytes as each entry is added.
+
+    Entries are stored uncompressed: they are typically PDFs or XLSX files, which
+    are already compressed.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        async for name, data in entries:
+            archive.writestr(name, data)
+            yield sink.drain()
+
+    # Central directory
+    yield sink.drain()